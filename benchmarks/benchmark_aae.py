@@ -0,0 +1,102 @@
+"""
+
+Benchmark of the training of the adversarial autoencoder on CPU, on random
+grids of the shape of the slug flow dataset. Times an epoch of the original
+training loop with `train_on_batch` calls against the compiled steps of an
+`AAE_engine`, with a reconstruction and a regularization pass and fused into
+a single pass. The first epoch, which includes tracing, is timed separately.
+
+Please execute from the root of the repository, e.g.:
+
+python benchmarks/benchmark_aae.py --samples 256 --batch_size 32
+
+"""
+
+import argparse
+import time
+import numpy as np
+import tensorflow as tf
+from ddganAE.models import AAE, AAE_engine
+from ddganAE.architectures.cae.D3 import build_omata_encoder_decoder
+from ddganAE.architectures.discriminators import build_custom_discriminator
+
+__author__ = "Zef Wolffs"
+__credits__ = []
+__license__ = "MIT"
+__version__ = "1.0.0"
+__maintainer__ = "Zef Wolffs"
+__email__ = "zefwolffs@gmail.com"
+__status__ = "Development"
+
+
+def main(samples=256, batch_size=32, epochs=3, latent_vars=10,
+         input_shape=(60, 20, 20, 4)):
+    """
+    Run the benchmark and print a table with the results
+
+    Args:
+        samples (int, optional): Number of grids. Defaults to 256.
+        batch_size (int, optional): Batch size. Defaults to 32.
+        epochs (int, optional): Timed epochs after the first one. Defaults to
+                                3.
+        latent_vars (int, optional): Latent variables. Defaults to 10.
+        input_shape (tuple, optional): Shape of the grids. Defaults to
+                                       (60, 20, 20, 4).
+    """
+    grids = np.random.default_rng(0).uniform(0, 1, (samples,) + input_shape)
+    dataset = tf.data.Dataset.from_tensor_slices(grids).\
+        shuffle(samples, seed=0).batch(batch_size, drop_remainder=True)
+    valid = np.ones((batch_size, 1))
+    fake = np.zeros((batch_size, 1))
+
+    print("%12s %14s %14s %12s %10s %10s" %
+          ("mode", "first [s]", "epoch [s]", "grids/s", "speedup",
+           "loss"))
+
+    reference = None
+    for mode in ["train_on_batch", "two-pass", "fused"]:
+        initializer = tf.keras.initializers.RandomNormal(stddev=0.05, seed=0)
+        encoder, decoder = build_omata_encoder_decoder(input_shape,
+                                                       latent_vars,
+                                                       initializer)
+        aae = AAE(encoder, decoder,
+                  build_custom_discriminator(latent_vars, initializer),
+                  tf.keras.optimizers.legacy.Adam(), seed=0)
+        aae.compile(input_shape)
+
+        if mode == "train_on_batch":
+            def epoch():
+                return aae._train_epoch(dataset, valid, fake)
+        else:
+            engine = AAE_engine(aae.encoder, aae.decoder, aae.discriminator,
+                                aae.optimizer, seed=0)
+
+            def epoch():
+                return engine.train_epoch(dataset, fused=mode == "fused")
+
+        start = time.perf_counter()
+        epoch()
+        first = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(epochs):
+            loss = epoch()[0]
+        duration = (time.perf_counter() - start) / epochs
+
+        reference = reference or duration
+        print("%12s %14.2f %14.2f %12.1f %10.2f %10.4f" %
+              (mode, first, duration,
+               samples // batch_size * batch_size / duration,
+               reference / duration, loss))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the compiled \
+training of adversarial autoencoders")
+    parser.add_argument("--samples", type=int, default=256)
+    parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument("--epochs", type=int, default=3)
+    parser.add_argument("--latent_vars", type=int, default=10)
+    args = parser.parse_args()
+
+    main(args.samples, args.batch_size, args.epochs, args.latent_vars)
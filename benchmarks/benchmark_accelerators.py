@@ -0,0 +1,124 @@
+"""
+
+Benchmark of the accelerators of the inner iterations of the predictive
+rollouts on the flow past cylinder POD coefficients. A predictive model is
+trained briefly, after which every accelerator predicts the same rollout up
+to a fixed tolerance. Reported are the inner iterations and network calls per
+timestep and the deviation from a tightly converged reference rollout.
+
+Please execute from the root of the repository, e.g.:
+
+python benchmarks/benchmark_accelerators.py --epochs 20 --timesteps 50
+
+"""
+
+import argparse
+import time
+import numpy as np
+import tensorflow as tf
+from sklearn.preprocessing import MinMaxScaler
+from ddganAE.models import Predictive, ACCELERATORS
+from ddganAE.architectures.svdae import build_slimmer_dense_encoder, \
+                                        build_slimmer_dense_decoder
+
+__author__ = "Zef Wolffs"
+__credits__ = []
+__license__ = "MIT"
+__version__ = "1.0.0"
+__maintainer__ = "Zef Wolffs"
+__email__ = "zefwolffs@gmail.com"
+__status__ = "Development"
+
+
+def count_calls(model):
+    """
+    Count the calls to the network of a predictive model
+
+    Args:
+        model (Predictive): Predictive model
+
+    Returns:
+        list: Single element list holding the number of calls so far
+    """
+    calls = [0]
+    forward = model._forward
+
+    def counted(x):
+        calls[0] += 1
+        return forward(x)
+
+    model._forward = counted
+
+    return calls
+
+
+def main(datafile, epochs=20, latent_vars=10, interval=5, timesteps=50,
+         iters=50, tol=1e-4, sweep="gauss-seidel"):
+    """
+    Run the benchmark and print a table with the results
+
+    Args:
+        datafile (str): POD coefficients in shape (ndomains, nvars, ntimes)
+        epochs (int, optional): Training epochs. Defaults to 20.
+        latent_vars (int, optional): Latent variables. Defaults to 10.
+        interval (int, optional): Timestep interval. Defaults to 5.
+        timesteps (int, optional): Timesteps per rollout. Defaults to 50.
+        iters (int, optional): Maximum inner iterations per timestep.
+                               Defaults to 50.
+        tol (float, optional): Tolerance of the inner iterations. Defaults to
+                               1e-4.
+        sweep (str, optional): Subdomain sweep ordering. Defaults to
+                               "gauss-seidel".
+    """
+    data = np.load(datafile)
+    scaler = MinMaxScaler((-1, 1))
+    data = scaler.fit_transform(data.reshape(-1, 1)).reshape(data.shape)
+    nvars = data.shape[1]
+
+    initializer = tf.keras.initializers.RandomNormal(stddev=0.05, seed=0)
+    model = Predictive(build_slimmer_dense_encoder(latent_vars, initializer),
+                       build_slimmer_dense_decoder(nvars, latent_vars,
+                                                   initializer),
+                       tf.keras.optimizers.Adam(), seed=0)
+    model.compile(nvars)
+    model.train(data, epochs, interval=interval, sinks=[])
+
+    boundaries = data[[0, -1]]
+    init_values = data[1:-1, :, 0]
+    calls = count_calls(model)
+
+    reference = model.predict(boundaries, init_values, timesteps,
+                              iters=10*iters, tol=tol*1e-3, sweep=sweep)
+
+    print("%10s %12s %12s %10s %12s" %
+          ("method", "iters/step", "calls/step", "time [s]", "max dev"))
+
+    for name in ACCELERATORS:
+        calls[0] = 0
+        start = time.perf_counter()
+        pred, info = model.predict(boundaries, init_values, timesteps,
+                                   iters=iters, tol=tol, sweep=sweep,
+                                   return_info=True, accelerator=name)
+        duration = time.perf_counter() - start
+
+        print("%10s %12.2f %12.1f %10.3f %12.2e" %
+              (name, info["iters"].mean(), calls[0] / timesteps, duration,
+               np.abs(pred - reference)[..., :timesteps+1].max()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark accelerators \
+of the inner iterations of predictive rollouts")
+    parser.add_argument("--datafile", type=str,
+                        default="tests/data/pod_coeffs_field_Velocity.npy")
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--latent_vars", type=int, default=10)
+    parser.add_argument("--interval", type=int, default=5)
+    parser.add_argument("--timesteps", type=int, default=50)
+    parser.add_argument("--iters", type=int, default=50)
+    parser.add_argument("--tol", type=float, default=1e-4)
+    parser.add_argument("--sweep", type=str, default="gauss-seidel")
+    args = parser.parse_args()
+
+    main(args.datafile, args.epochs, args.latent_vars, args.interval,
+         args.timesteps, args.iters, args.tol, args.sweep)
@@ -0,0 +1,156 @@
+"""
+
+Benchmark of gradient accumulation and activation recomputation, with the 3D
+convolutional autoencoder, or the adversarial autoencoder with it, on random
+grids of the shape of the slug flow dataset. The batch size stays the same,
+while every configuration splits it into micro-batches and/or recomputes the
+activations of the encoder and decoder in the backward pass.
+Reported are the peak resident memory of the process and the training
+throughput, and the deviation of the weights after training from those of
+the plain compiled training. Every configuration runs in a fresh process,
+and configurations that run out of memory are reported as such.
+
+Please execute from the root of the repository, e.g.:
+
+python benchmarks/benchmark_accumulation.py --samples 128 --batch_size 64
+
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import time
+import numpy as np
+
+__author__ = "Zef Wolffs"
+__credits__ = []
+__license__ = "MIT"
+__version__ = "1.0.0"
+__maintainer__ = "Zef Wolffs"
+__email__ = "zefwolffs@gmail.com"
+__status__ = "Development"
+
+MODELS = ("cae", "aae")
+
+# Accumulation factor and whether to recompute the activations
+CONFIGURATIONS = ((1, False), (4, False), (1, True), (4, True))
+
+
+def run(model, accumulate, recompute, samples, batch_size, epochs,
+        input_shape, queue):
+    """
+    Train a model in a configuration and report the results
+
+    Args:
+        model (str): Model, one of `MODELS`
+        accumulate (int): Accumulation factor
+        recompute (bool): Whether to recompute the activations
+        samples (int): Number of grids
+        batch_size (int): Batch size
+        epochs (int): Timed epochs after the first one
+        input_shape (tuple): Shape of the grids
+        queue (multiprocessing.Queue): Queue to put the results on
+    """
+    import tensorflow as tf
+    from ddganAE.models import CAE, AAE
+    from ddganAE.architectures.cae.D3 import build_omata_encoder_decoder
+    from ddganAE.architectures.discriminators import \
+        build_custom_discriminator
+
+    grids = np.random.default_rng(0).uniform(
+        0, 1, (samples,) + input_shape).astype(np.float32)
+
+    tf.keras.utils.set_random_seed(0)
+    initializer = tf.keras.initializers.RandomNormal(stddev=0.05, seed=0)
+    encoder, decoder = build_omata_encoder_decoder(input_shape, 10,
+                                                   initializer)
+    optimizer = tf.keras.optimizers.legacy.SGD(0.01)
+
+    if model == "cae":
+        network = CAE(encoder, decoder, optimizer, seed=0)
+    else:
+        network = AAE(encoder, decoder,
+                      build_custom_discriminator(10, initializer), optimizer,
+                      seed=0)
+    network.compile(input_shape)
+
+    kwargs = {"batch_size": batch_size, "compiled": True,
+              "accumulate": accumulate, "recompute": recompute, "sinks": []}
+
+    try:
+        # The first epoch includes tracing
+        network.train(grids, 1, **kwargs)
+        start = time.perf_counter()
+        network.train(grids, epochs, **kwargs)
+    except tf.errors.ResourceExhaustedError:
+        queue.put(None)
+        return
+    throughput = epochs * samples / (time.perf_counter() - start)
+
+    # Kilobytes on Linux
+    queue.put((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1e3,
+               throughput, network.autoencoder.get_weights()))
+
+
+def main(model="cae", samples=128, batch_size=64, epochs=2,
+         input_shape=(60, 20, 20, 4)):
+    """
+    Run the benchmark and print a table with the results
+
+    Args:
+        model (str, optional): Model, one of `MODELS`. Defaults to "cae".
+        samples (int, optional): Number of grids. Defaults to 128.
+        batch_size (int, optional): Batch size. Defaults to 64.
+        epochs (int, optional): Timed epochs after the first one. Defaults to
+                                2.
+        input_shape (tuple, optional): Shape of the grids. Defaults to
+                                       (60, 20, 20, 4).
+    """
+    print("%11s %10s %12s %14s %12s %10s" %
+          ("accumulate", "recompute", "micro-batch", "peak rss [MB]",
+           "samples/s", "max dev"))
+
+    context = multiprocessing.get_context("spawn")
+    reference = None
+    for accumulate, recompute in CONFIGURATIONS:
+        queue = context.Queue()
+        process = context.Process(target=run,
+                                  args=(model, accumulate, recompute,
+                                        samples, batch_size, epochs,
+                                        input_shape, queue))
+        process.start()
+        results = queue.get()
+        process.join()
+
+        if results is None:
+            print("%11d %10s %s" % (accumulate, recompute, "out of memory"))
+            continue
+
+        peak, throughput, weights = results
+        if reference is None:
+            reference = weights
+
+        deviation = max(np.abs(w - r).max()
+                        for w, r in zip(weights, reference))
+        print("%11d %10s %12d %14.1f %12.1f %10.2e" %
+              (accumulate, recompute, -(-batch_size // accumulate),
+               peak / 1e6, throughput, deviation))
+
+
+if __name__ == "__main__":
+    # Only measure on CPU
+    os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
+
+    parser = argparse.ArgumentParser(description="Benchmark gradient \
+accumulation and activation recomputation")
+    parser.add_argument("--model", default="cae", choices=MODELS)
+    parser.add_argument("--samples", type=int, default=128)
+    parser.add_argument("--batch_size", type=int, default=64)
+    parser.add_argument("--epochs", type=int, default=2)
+    parser.add_argument("--shape", type=int, nargs="+",
+                        default=[60, 20, 20, 4])
+    args = parser.parse_args()
+
+    main(args.model, args.samples, args.batch_size, args.epochs,
+         tuple(args.shape))
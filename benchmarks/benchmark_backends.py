@@ -0,0 +1,128 @@
+"""
+
+Benchmark of the NumPy inference backend of the dense autoencoders. For an
+increasing batch size this times a single call of `model.predict`, of the
+eager Keras model and of the frozen NumPy runtime, followed by a full
+predictive rollout with the TensorFlow and the NumPy backend.
+
+Please execute from the root of the repository, e.g.:
+
+python benchmarks/benchmark_backends.py --architecture dense --batch 1 8 64
+
+"""
+
+import argparse
+import time
+import numpy as np
+import tensorflow as tf
+from ddganAE.models import Predictive
+from ddganAE.backends import Numpy_mlp
+from ddganAE.architectures import svdae
+
+__author__ = "Zef Wolffs"
+__credits__ = []
+__license__ = "MIT"
+__version__ = "1.0.0"
+__maintainer__ = "Zef Wolffs"
+__email__ = "zefwolffs@gmail.com"
+__status__ = "Development"
+
+
+def time_call(function, x, repeats):
+    """
+    Median latency of a function call
+
+    Args:
+        function (callable): Function to time
+        x (np.ndarray): Input of the function
+        repeats (int): Number of calls
+
+    Returns:
+        float: Median wall-clock time per call in seconds
+    """
+    function(x)
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function(x)
+        times.append(time.perf_counter() - start)
+
+    return np.median(times)
+
+
+def main(architecture="dense", batches=(1, 8, 64), nvars=10, latent_vars=5,
+         repeats=100, domains=4, timesteps=20):
+    """
+    Run the benchmark and print tables with the results
+
+    Args:
+        architecture (str, optional): Dense architecture, i.e. the builder
+                                      `build_<architecture>_encoder`.
+                                      Defaults to "dense".
+        batches (tuple of int, optional): Batch sizes. Defaults to
+                                          (1, 8, 64).
+        nvars (int, optional): Variables per subdomain. Defaults to 10.
+        latent_vars (int, optional): Latent variables. Defaults to 5.
+        repeats (int, optional): Calls per timing. Defaults to 100.
+        domains (int, optional): Predicted subdomains of the rollout.
+                                 Defaults to 4.
+        timesteps (int, optional): Timesteps of the rollout. Defaults to 20.
+    """
+    initializer = tf.keras.initializers.RandomNormal(stddev=0.05, seed=0)
+    encoder = getattr(svdae, "build_" + architecture + "_encoder")(
+        latent_vars, initializer)
+    decoder = getattr(svdae, "build_" + architecture + "_decoder")(
+        nvars, latent_vars, initializer)
+
+    pred = Predictive(encoder, decoder, tf.keras.optimizers.Adam())
+    pred.compile(nvars)
+    pred.interval = 1
+
+    model = pred.autoencoder
+    runtime = Numpy_mlp.from_keras(encoder, decoder)
+    rng = np.random.default_rng(0)
+
+    print("%8s %14s %14s %14s %10s %12s" %
+          ("batch", "predict [ms]", "call [ms]", "numpy [ms]", "speedup",
+           "max dev"))
+
+    for batch in batches:
+        x = rng.uniform(-1, 1, (batch, 3 * nvars)).astype(np.float32)
+
+        t_predict = time_call(lambda x: model.predict(x, verbose=0), x,
+                              repeats)
+        t_call = time_call(lambda x: model(x, training=False), x, repeats)
+        t_numpy = time_call(runtime, x, repeats)
+        dev = np.abs(runtime(x) - model(x, training=False).numpy()).max()
+
+        print("%8d %14.3f %14.3f %14.3f %10.1f %12.2e" %
+              (batch, 1e3 * t_predict, 1e3 * t_call, 1e3 * t_numpy,
+               t_predict / t_numpy, dev))
+
+    boundaries = rng.uniform(-1, 1, (2, nvars, timesteps + 1))
+    init_values = rng.uniform(-1, 1, (domains, nvars))
+
+    print("%10s %12s" % ("backend", "rollout [s]"))
+    for backend in ["tensorflow", "numpy"]:
+        start = time.perf_counter()
+        pred.predict(boundaries, init_values, timesteps, backend=backend)
+        print("%10s %12.3f" % (backend, time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the NumPy \
+inference backend of dense autoencoders")
+    parser.add_argument("--architecture", type=str, default="dense",
+                        choices=["dense", "wider_dense", "slimmer_dense",
+                                 "deeper_dense"])
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 8, 64])
+    parser.add_argument("--nvars", type=int, default=10)
+    parser.add_argument("--latent_vars", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=100)
+    parser.add_argument("--domains", type=int, default=4)
+    parser.add_argument("--timesteps", type=int, default=20)
+    args = parser.parse_args()
+
+    main(args.architecture, args.batch, args.nvars, args.latent_vars,
+         args.repeats, args.domains, args.timesteps)
@@ -0,0 +1,140 @@
+"""
+
+Scaling benchmark of data-parallel training on the CPUs of a node, with 1, 2,
+4 and 8 worker processes of a `MultiWorkerMirroredStrategy`, see
+`ddganAE.models.distribute`. Trains the 2D convolutional autoencoder, or the
+adversarial autoencoder with combined loss whose discriminator updates are
+averaged over the workers as well, on random grids of the shape of the flow
+past cylinder dataset. Every worker keeps the batch size, i.e. the "linear"
+and "sqrt" scaling rules, such that an epoch takes fewer steps with more
+workers. Reported are the time per epoch, the throughput, the speedup and
+the parallel efficiency relative to a single worker. The CPUs are divided
+over the workers, so there is only a speedup on nodes with several cores.
+
+Please execute from the root of the repository, e.g.:
+
+python benchmarks/benchmark_distributed.py --samples 2048 --batch_size 32
+
+"""
+
+import argparse
+import os
+import time
+import numpy as np
+from ddganAE.models.distribute import launch
+
+__author__ = "Zef Wolffs"
+__credits__ = []
+__license__ = "MIT"
+__version__ = "1.0.0"
+__maintainer__ = "Zef Wolffs"
+__email__ = "zefwolffs@gmail.com"
+__status__ = "Development"
+
+MODELS = ("cae", "aae")
+WORKERS = (1, 2, 4, 8)
+
+
+def run(strategy, model, samples, batch_size, epochs, input_shape):
+    """
+    Train a model within the strategy and time its epochs
+
+    Args:
+        strategy (tf.distribute.Strategy): Strategy
+        model (str): Model, one of `MODELS`
+        samples (int): Number of grids
+        batch_size (int): Batch size of every worker
+        epochs (int): Timed epochs after the first one
+        input_shape (tuple): Shape of the grids
+
+    Returns:
+        float: Mean time per epoch in seconds
+    """
+    import tensorflow as tf
+    from ddganAE.models import CAE, AAE_combined_loss
+    from ddganAE.architectures.cae.D2 import \
+        build_wider_omata_encoder_decoder
+    from ddganAE.architectures.discriminators import \
+        build_custom_discriminator
+
+    grids = np.random.default_rng(0).uniform(
+        0, 1, (samples,) + input_shape).astype(np.float32)
+
+    with strategy.scope():
+        initializer = tf.keras.initializers.RandomNormal(stddev=0.05, seed=0)
+        encoder, decoder = build_wider_omata_encoder_decoder(
+            input_shape, 10, initializer)
+        optimizer = tf.keras.optimizers.legacy.Adam()
+
+        if model == "cae":
+            network = CAE(encoder, decoder, optimizer, seed=0)
+            kwargs = {}
+        else:
+            network = AAE_combined_loss(
+                encoder, decoder,
+                build_custom_discriminator(10, initializer), optimizer,
+                seed=0)
+            kwargs = {"compiled": True, "n_discriminator": 1}
+        network.compile(input_shape)
+
+    # The first epoch includes tracing
+    network.train(grids, 1, batch_size=batch_size, strategy=strategy,
+                  sinks=[], **kwargs)
+    start = time.perf_counter()
+    network.train(grids, epochs, batch_size=batch_size, strategy=strategy,
+                  sinks=[], **kwargs)
+
+    return (time.perf_counter() - start) / epochs
+
+
+def main(model="cae", samples=2048, batch_size=32, epochs=2,
+         input_shape=(55, 42, 2), workers=WORKERS):
+    """
+    Run the benchmark and print a table with the results
+
+    Args:
+        model (str, optional): Model, one of `MODELS`. Defaults to "cae".
+        samples (int, optional): Number of grids. Defaults to 2048.
+        batch_size (int, optional): Batch size of every worker. Defaults to
+                                    32.
+        epochs (int, optional): Timed epochs after the first one. Defaults to
+                                2.
+        input_shape (tuple, optional): Shape of the grids. Defaults to
+                                       (55, 42, 2).
+        workers (tuple, optional): Numbers of workers. Defaults to `WORKERS`.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        print("%d CPUs available" % len(os.sched_getaffinity(0)))
+
+    print("%8s %12s %12s %10s %12s" %
+          ("workers", "epoch [s]", "grids/s", "speedup", "efficiency"))
+
+    reference = None
+    for n in workers:
+        duration = launch(run, n, args=(model, samples, batch_size, epochs,
+                                        input_shape))
+        if reference is None:
+            reference = duration * workers[0]
+
+        print("%8d %12.2f %12.1f %10.2f %12.2f" %
+              (n, duration, samples / duration, reference / duration,
+               reference / duration / n))
+
+
+if __name__ == "__main__":
+    # Only measure on CPU
+    os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
+
+    parser = argparse.ArgumentParser(description="Benchmark data-parallel \
+training on CPU")
+    parser.add_argument("--model", default="cae", choices=MODELS)
+    parser.add_argument("--samples", type=int, default=2048)
+    parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument("--epochs", type=int, default=2)
+    parser.add_argument("--shape", type=int, nargs="+", default=[55, 42, 2])
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=list(WORKERS))
+    args = parser.parse_args()
+
+    main(args.model, args.samples, args.batch_size, args.epochs,
+         tuple(args.shape), tuple(args.workers))
@@ -0,0 +1,162 @@
+"""
+
+Benchmark of parareal (parallel-in-time) rollouts. A predictive model is
+trained briefly, after which a long rollout is predicted sequentially and
+with the parareal algorithm for an increasing number of time slices.
+Reported are the number of parareal iterations needed to match the
+sequential result up to the tolerance, the wall-clock speedup and the
+deviation from the sequential rollout.
+
+Works on the flow past cylinder POD coefficients and slug flow latent
+variables, see `benchmark_predictors.py`. Please execute from the root of
+the repository, e.g.:
+
+python benchmarks/benchmark_parareal.py --slices 4 8 16 32 --compiled
+"""
+
+import argparse
+import time
+import numpy as np
+import tensorflow as tf
+from sklearn.preprocessing import MinMaxScaler
+from ddganAE.models import Predictive
+from ddganAE.architectures.svdae import build_slimmer_dense_encoder, \
+                                        build_slimmer_dense_decoder
+
+__author__ = "Zef Wolffs"
+__credits__ = []
+__license__ = "MIT"
+__version__ = "1.0.0"
+__maintainer__ = "Zef Wolffs"
+__email__ = "zefwolffs@gmail.com"
+__status__ = "Development"
+
+
+def load_data(datafile, domains=None):
+    """
+    Load and scale the data
+
+    Args:
+        datafile (str): POD coefficients or latent variables, see
+                        `load_data`
+        domains (int, optional): Number of subdomains of latent variables.
+                                 Defaults to None.
+                        or latent variables in shape (ntimes * ndomains,
+                        nvars)
+        domains (int, optional): Number of subdomains of latent variables.
+                                 Defaults to None.
+
+    Returns:
+        np.ndarray: Data in shape (ndomains, nvars, ntimes) scaled to [-1, 1]
+    """
+    data = np.load(datafile)
+
+    if data.ndim == 2:
+        nfiles = int(data.shape[0]/domains)
+        data = np.moveaxis(data.reshape(nfiles, domains, data.shape[1]),
+                           0, 2)
+
+    scaler = MinMaxScaler((-1, 1))
+
+    return scaler.fit_transform(data.reshape(-1, 1)).reshape(data.shape)
+
+
+def main(datafile, domains=None, epochs=20, batch_size=128, latent_vars=10,
+         interval=5, timesteps=390, iters=5, slices=(4, 8, 16, 32),
+         coarse_iters=1, parareal_tol=1e-6, workers=None, compiled=False):
+    """
+    Run the benchmark and print a table with the results
+
+    Args:
+        datafile (str): POD coefficients or latent variables, see
+                        `load_data`
+        domains (int, optional): Number of subdomains of latent variables.
+                                 Defaults to None.
+        epochs (int, optional): Training epochs. Defaults to 20.
+        batch_size (int, optional): Training batch size. Defaults to 128.
+        latent_vars (int, optional): Latent variables. Defaults to 10.
+        interval (int, optional): Timestep interval. Defaults to 5.
+        timesteps (int, optional): Timesteps per rollout. Defaults to 390.
+        iters (int, optional): Inner iterations per timestep. Defaults to 5.
+        slices (tuple of int, optional): Numbers of time slices. Defaults
+                                         to (4, 8, 16, 32).
+        coarse_iters (int, optional): Inner iterations per timestep of the
+                                      coarse propagator. Defaults to 1.
+        parareal_tol (float, optional): Parareal tolerance. Defaults to
+                                        1e-6.
+        workers (int, optional): Number of threads. Defaults to None, i.e.
+                                 one per slice.
+        compiled (bool, optional): Whether to use compiled rollouts.
+                                   Defaults to False.
+    """
+    data = load_data(datafile, domains)
+    nvars = data.shape[1]
+
+    initializer = tf.keras.initializers.RandomNormal(stddev=0.05, seed=0)
+    model = Predictive(build_slimmer_dense_encoder(latent_vars, initializer),
+                       build_slimmer_dense_decoder(nvars, latent_vars,
+                                                   initializer),
+                       tf.keras.optimizers.Adam(), seed=0)
+    model.compile(nvars)
+    model.train(data, epochs, interval=interval, batch_size=batch_size,
+                sinks=[])
+
+    boundaries = data[[0, -1]]
+    init_values = data[1:-1, :, 0]
+    timesteps = min(timesteps, data.shape[2] // interval - 1)
+
+    # Warm up such that tracing is not included in the timings
+    model.predict(boundaries, init_values, 2, iters=iters,
+                  compiled=compiled)
+    model.predict(boundaries, init_values, 2, iters=iters,
+                  compiled=compiled, parareal_slices=2,
+                  coarse_iters=coarse_iters)
+
+    start = time.perf_counter()
+    reference = model.predict(boundaries, init_values, timesteps,
+                              iters=iters, compiled=compiled)
+    t_seq = time.perf_counter() - start
+
+    print("sequential: %.3f s for %d timesteps" % (t_seq, timesteps))
+    print("%8s %16s %10s %10s %12s" %
+          ("slices", "parareal iters", "time [s]", "speedup", "max dev"))
+
+    for n in slices:
+        start = time.perf_counter()
+        pred, info = model.predict(boundaries, init_values, timesteps,
+                                   iters=iters, compiled=compiled,
+                                   parareal_slices=n,
+                                   coarse_iters=coarse_iters,
+                                   parareal_tol=parareal_tol,
+                                   workers=workers, return_info=True)
+        duration = time.perf_counter() - start
+
+        print("%8d %16d %10.3f %10.2f %12.2e" %
+              (n, info["parareal_iters"], duration, t_seq / duration,
+               np.abs(pred - reference)[..., :timesteps+1].max()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark parareal \
+predictive rollouts")
+    parser.add_argument("--datafile", type=str,
+                        default="tests/data/pod_coeffs_field_Velocity.npy")
+    parser.add_argument("--domains", type=int, default=None)
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--batch_size", type=int, default=128)
+    parser.add_argument("--latent_vars", type=int, default=10)
+    parser.add_argument("--interval", type=int, default=5)
+    parser.add_argument("--timesteps", type=int, default=390)
+    parser.add_argument("--iters", type=int, default=5)
+    parser.add_argument("--slices", type=int, nargs="+",
+                        default=[4, 8, 16, 32])
+    parser.add_argument("--coarse_iters", type=int, default=1)
+    parser.add_argument("--parareal_tol", type=float, default=1e-6)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--compiled", action="store_true")
+    args = parser.parse_args()
+
+    main(args.datafile, args.domains, args.epochs, args.batch_size,
+         args.latent_vars, args.interval, args.timesteps, args.iters,
+         args.slices, args.coarse_iters, args.parareal_tol, args.workers,
+         args.compiled)
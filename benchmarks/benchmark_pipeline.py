@@ -0,0 +1,115 @@
+"""
+
+Benchmark of the input pipeline of the autoencoders. Compares the former
+shuffle buffer pipeline, which holds a second copy of the dataset, with the
+index permutation pipeline of `Sample_batches` on an in-memory array and on a
+memory-mapped `.npy` file. Every pipeline runs in a fresh process, which
+reports its peak resident memory and the throughput of two epochs.
+
+Please execute from the root of the repository, e.g.:
+
+python benchmarks/benchmark_pipeline.py --samples 8000 --batch_size 64
+
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+import numpy as np
+
+__author__ = "Zef Wolffs"
+__credits__ = []
+__license__ = "MIT"
+__version__ = "1.0.0"
+__maintainer__ = "Zef Wolffs"
+__email__ = "zefwolffs@gmail.com"
+__status__ = "Development"
+
+MODES = ("buffer", "permutation", "memmap")
+
+
+def run(mode, path, batch_size, queue):
+    """
+    Iterate over two epochs of a pipeline and report the results
+
+    Args:
+        mode (str): Pipeline, one of `MODES`
+        path (str): Path of the `.npy` file with the grids
+        batch_size (int): Batch size
+        queue (multiprocessing.Queue): Queue to put the results on
+    """
+    import tensorflow as tf
+    from ddganAE.preprocessing import Sample_batches
+
+    if mode == "memmap":
+        data = path
+        n = len(np.load(path, mmap_mode="r"))
+    else:
+        data = np.load(path)
+        n = len(data)
+
+    if mode == "buffer":
+        dataset = tf.data.Dataset.from_tensor_slices(data).shuffle(
+            buffer_size=n, reshuffle_each_iteration=True, seed=0).\
+            batch(batch_size)
+    else:
+        dataset = Sample_batches(data, seed=0).dataset(batch_size)
+
+    start = time.perf_counter()
+    for _ in range(2):
+        for batch in dataset:
+            pass
+    duration = time.perf_counter() - start
+
+    # Kilobytes on Linux
+    queue.put((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1e3,
+               2 * n / duration))
+
+
+def main(samples=8000, shape=(55, 42, 2), batch_size=64):
+    """
+    Run the benchmark and print a table with the results
+
+    Args:
+        samples (int, optional): Number of grids. Defaults to 8000.
+        shape (tuple, optional): Shape of a grid. Defaults to (55, 42, 2).
+        batch_size (int, optional): Batch size. Defaults to 64.
+    """
+    grids = np.random.default_rng(0).uniform(
+        size=(samples,) + tuple(shape)).astype(np.float32)
+
+    print("Dataset of %.1f MB" % (grids.nbytes / 1e6))
+    print("%12s %14s %16s" % ("pipeline", "peak rss [MB]", "grids per s"))
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "grids.npy")
+        np.save(path, grids)
+        del grids
+
+        context = multiprocessing.get_context("spawn")
+        for mode in MODES:
+            queue = context.Queue()
+            process = context.Process(target=run,
+                                      args=(mode, path, batch_size, queue))
+            process.start()
+            peak, throughput = queue.get()
+            process.join()
+
+            print("%12s %14.1f %16.1f" % (mode, peak / 1e6, throughput))
+
+
+if __name__ == "__main__":
+    # Only measure on CPU
+    os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
+
+    parser = argparse.ArgumentParser(description="Benchmark the input \
+pipeline of the autoencoders")
+    parser.add_argument("--samples", type=int, default=8000)
+    parser.add_argument("--shape", type=int, nargs="+", default=[55, 42, 2])
+    parser.add_argument("--batch_size", type=int, default=64)
+    args = parser.parse_args()
+
+    main(args.samples, tuple(args.shape), args.batch_size)
@@ -0,0 +1,141 @@
+"""
+
+Benchmark of mixed precision training and inference on CPU, with the 3D
+convolutional autoencoder on random grids of the shape of the slug flow
+dataset. For float32 and the bfloat16 and float16 mixed precision, reported
+are the size of a batch on the host, the peak resident memory of the process,
+the training and inference throughput and the deviation of the untrained
+reconstruction from the float32 one. Every precision runs in a fresh process.
+Note that only CPUs with bfloat16 or float16 instructions, e.g. AVX512_BF16 or
+AMX, speed up the computations themselves, and that some 3D operations, such
+as the pooling, have no float16 CPU kernels.
+
+Please execute from the root of the repository, e.g.:
+
+python benchmarks/benchmark_precision.py --samples 128 --batch_size 16
+
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import time
+import numpy as np
+
+__author__ = "Zef Wolffs"
+__credits__ = []
+__license__ = "MIT"
+__version__ = "1.0.0"
+__maintainer__ = "Zef Wolffs"
+__email__ = "zefwolffs@gmail.com"
+__status__ = "Development"
+
+PRECISIONS = (None, "bfloat16", "float16")
+
+
+def run(precision, samples, batch_size, epochs, input_shape, queue):
+    """
+    Train and evaluate the autoencoder at a precision and report the results
+
+    Args:
+        precision (str): Precision, one of `PRECISIONS`
+        samples (int): Number of grids
+        batch_size (int): Batch size
+        epochs (int): Timed epochs after the first one
+        input_shape (tuple): Shape of the grids
+        queue (multiprocessing.Queue): Queue to put the results on
+    """
+    import tensorflow as tf
+    from ddganAE.models import CAE
+    from ddganAE.models.precision import host_dtype
+    from ddganAE.architectures.cae.D3 import build_omata_encoder_decoder
+
+    grids = np.random.default_rng(0).uniform(
+        0, 1, (samples,) + input_shape).astype(np.float32)
+
+    initializer = tf.keras.initializers.RandomNormal(stddev=0.05, seed=0)
+    encoder, decoder = build_omata_encoder_decoder(input_shape, 10,
+                                                   initializer)
+    reference = decoder(encoder(grids[:batch_size])).numpy()
+
+    cae = CAE(encoder, decoder, tf.keras.optimizers.legacy.Adam(), seed=0,
+              precision=precision)
+    cae.compile(input_shape)
+
+    try:
+        deviation = np.abs(cae.predict(grids[:batch_size]) -
+                           reference).max()
+    except tf.errors.InvalidArgumentError:
+        # Some operations have no CPU kernels at this precision
+        queue.put(None)
+        return
+
+    cae.train(grids, 1, batch_size=batch_size, sinks=[])
+    start = time.perf_counter()
+    cae.train(grids, epochs, batch_size=batch_size, sinks=[])
+    train = epochs * samples / (time.perf_counter() - start)
+
+    cae.predict(grids[:batch_size])
+    start = time.perf_counter()
+    cae.predict(grids)
+    inference = samples / (time.perf_counter() - start)
+
+    batch = batch_size * np.prod(input_shape) * \
+        np.dtype(host_dtype(precision, np.float32)).itemsize
+
+    # Kilobytes on Linux
+    queue.put((batch, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss *
+               1e3, train, inference, deviation))
+
+
+def main(samples=128, batch_size=16, epochs=2, input_shape=(60, 20, 20, 4)):
+    """
+    Run the benchmark and print a table with the results
+
+    Args:
+        samples (int, optional): Number of grids. Defaults to 128.
+        batch_size (int, optional): Batch size. Defaults to 16.
+        epochs (int, optional): Timed epochs after the first one. Defaults to
+                                2.
+        input_shape (tuple, optional): Shape of the grids. Defaults to
+                                       (60, 20, 20, 4).
+    """
+    print("%10s %12s %14s %12s %14s %10s" %
+          ("precision", "batch [MB]", "peak rss [MB]", "train/s",
+           "inference/s", "max dev"))
+
+    context = multiprocessing.get_context("spawn")
+    for precision in PRECISIONS:
+        queue = context.Queue()
+        process = context.Process(target=run,
+                                  args=(precision, samples, batch_size,
+                                        epochs, input_shape, queue))
+        process.start()
+        results = queue.get()
+        process.join()
+
+        if results is None:
+            print("%10s %s" % (precision, "not supported on this device"))
+            continue
+
+        batch, peak, train, inference, deviation = results
+        print("%10s %12.2f %14.1f %12.1f %14.1f %10.2e" %
+              (precision or "float32", batch / 1e6, peak / 1e6, train,
+               inference, deviation))
+
+
+if __name__ == "__main__":
+    # Only measure on CPU
+    os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
+
+    parser = argparse.ArgumentParser(description="Benchmark mixed precision \
+training and inference on CPU")
+    parser.add_argument("--samples", type=int, default=128)
+    parser.add_argument("--batch_size", type=int, default=16)
+    parser.add_argument("--epochs", type=int, default=2)
+    parser.add_argument("--shape", type=int, nargs="+",
+                        default=[60, 20, 20, 4])
+    args = parser.parse_args()
+
+    main(args.samples, args.batch_size, args.epochs, tuple(args.shape))
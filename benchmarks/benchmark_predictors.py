@@ -0,0 +1,142 @@
+"""
+
+Benchmark of the predictors of the initial guess of every timestep of the
+predictive rollouts. A predictive model is trained briefly, after which every
+predictor predicts the same rollout up to a fixed tolerance. Reported are the
+inner iterations per timestep, the iterations saved relative to the linear
+extrapolation and the deviation from the linear extrapolation rollout.
+
+Works on the flow past cylinder POD coefficients in shape (ndomains, nvars,
+ntimes) as well as on slug flow latent variables in shape (ntimes * ndomains,
+nvars), which are reshaped with `--domains` like in the wandb scripts. Please
+execute from the root of the repository, e.g.:
+
+python benchmarks/benchmark_predictors.py --epochs 20 --timesteps 50
+python benchmarks/benchmark_predictors.py --datafile latent_sf.npy \
+    --domains 10 --interval 1
+
+"""
+
+import argparse
+import time
+import numpy as np
+import tensorflow as tf
+from sklearn.preprocessing import MinMaxScaler
+from ddganAE.models import Predictive, PREDICTORS
+from ddganAE.architectures.svdae import build_slimmer_dense_encoder, \
+                                        build_slimmer_dense_decoder
+
+__author__ = "Zef Wolffs"
+__credits__ = []
+__license__ = "MIT"
+__version__ = "1.0.0"
+__maintainer__ = "Zef Wolffs"
+__email__ = "zefwolffs@gmail.com"
+__status__ = "Development"
+
+
+def load_data(datafile, domains=None):
+    """
+    Load and scale the data
+
+    Args:
+        datafile (str): POD coefficients or latent variables, see
+                        `load_data`
+        domains (int, optional): Number of subdomains of latent variables.
+                                 Defaults to None.
+                        or latent variables in shape (ntimes * ndomains,
+                        nvars)
+        domains (int, optional): Number of subdomains of latent variables.
+                                 Defaults to None.
+
+    Returns:
+        np.ndarray: Data in shape (ndomains, nvars, ntimes) scaled to [-1, 1]
+    """
+    data = np.load(datafile)
+
+    if data.ndim == 2:
+        nfiles = int(data.shape[0]/domains)
+        data = np.moveaxis(data.reshape(nfiles, domains, data.shape[1]),
+                           0, 2)
+
+    scaler = MinMaxScaler((-1, 1))
+
+    return scaler.fit_transform(data.reshape(-1, 1)).reshape(data.shape)
+
+
+def main(datafile, domains=None, epochs=20, batch_size=128, latent_vars=10,
+         interval=5, timesteps=50, iters=50, tol=1e-4, sweep="gauss-seidel"):
+    """
+    Run the benchmark and print a table with the results
+
+    Args:
+        datafile (str): POD coefficients or latent variables, see
+                        `load_data`
+        domains (int, optional): Number of subdomains of latent variables.
+                                 Defaults to None.
+        epochs (int, optional): Training epochs. Defaults to 20.
+        batch_size (int, optional): Training batch size. Defaults to 128.
+        latent_vars (int, optional): Latent variables. Defaults to 10.
+        interval (int, optional): Timestep interval. Defaults to 5.
+        timesteps (int, optional): Timesteps per rollout. Defaults to 50.
+        iters (int, optional): Maximum inner iterations per timestep.
+                               Defaults to 50.
+        tol (float, optional): Tolerance of the inner iterations. Defaults to
+                               1e-4.
+        sweep (str, optional): Subdomain sweep ordering. Defaults to
+                               "gauss-seidel".
+    """
+    data = load_data(datafile, domains)
+    nvars = data.shape[1]
+
+    initializer = tf.keras.initializers.RandomNormal(stddev=0.05, seed=0)
+    model = Predictive(build_slimmer_dense_encoder(latent_vars, initializer),
+                       build_slimmer_dense_decoder(nvars, latent_vars,
+                                                   initializer),
+                       tf.keras.optimizers.Adam(), seed=0)
+    model.compile(nvars)
+    model.train(data, epochs, interval=interval, batch_size=batch_size,
+                sinks=[])
+
+    boundaries = data[[0, -1]]
+    init_values = data[1:-1, :, 0]
+    timesteps = min(timesteps, data.shape[2] // interval - 1)
+
+    print("%16s %12s %12s %10s %12s" %
+          ("predictor", "iters/step", "saved/step", "time [s]", "max dev"))
+
+    for name in PREDICTORS:
+        start = time.perf_counter()
+        pred, info = model.predict(boundaries, init_values, timesteps,
+                                   iters=iters, tol=tol, sweep=sweep,
+                                   return_info=True, predictor=name)
+        duration = time.perf_counter() - start
+
+        if name == "linear":
+            reference, reference_iters = pred, info["iters"].mean()
+
+        print("%16s %12.2f %12.2f %10.3f %12.2e" %
+              (name, info["iters"].mean(),
+               reference_iters - info["iters"].mean(), duration,
+               np.abs(pred - reference)[..., :timesteps+1].max()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark predictors of \
+the initial guess of predictive rollouts")
+    parser.add_argument("--datafile", type=str,
+                        default="tests/data/pod_coeffs_field_Velocity.npy")
+    parser.add_argument("--domains", type=int, default=None)
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--batch_size", type=int, default=128)
+    parser.add_argument("--latent_vars", type=int, default=10)
+    parser.add_argument("--interval", type=int, default=5)
+    parser.add_argument("--timesteps", type=int, default=50)
+    parser.add_argument("--iters", type=int, default=50)
+    parser.add_argument("--tol", type=float, default=1e-4)
+    parser.add_argument("--sweep", type=str, default="gauss-seidel")
+    args = parser.parse_args()
+
+    main(args.datafile, args.domains, args.epochs, args.batch_size,
+         args.latent_vars, args.interval, args.timesteps, args.iters,
+         args.tol, args.sweep)
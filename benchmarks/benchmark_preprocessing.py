@@ -0,0 +1,145 @@
+"""
+
+Benchmark of the preprocessing of the predictive models. Times the former
+per-phase loop implementation against the vectorised `stencil_dataset` on
+random data, checks that both give identical samples and targets, and
+reports the peak memory of both.
+
+Please execute from the root of the repository, e.g.:
+
+python benchmarks/benchmark_preprocessing.py --shape 10 500 2000 --interval 5
+
+"""
+
+import argparse
+import time
+import tracemalloc
+import numpy as np
+from ddganAE.preprocessing import stencil_dataset
+
+__author__ = "Zef Wolffs"
+__credits__ = []
+__license__ = "MIT"
+__version__ = "1.0.0"
+__maintainer__ = "Zef Wolffs"
+__email__ = "zefwolffs@gmail.com"
+__status__ = "Development"
+
+
+def loop_dataset(input_data, interval=5, increment=False):
+    """
+    Former implementation of `Predictive.preprocess`, kept as reference
+
+    Args:
+        input_data (np.ndarray): Input data in shape (<number of domains>,
+                                 <number of variables>, <number of timesteps>)
+        interval (int, optional): Timestep interval. Defaults to 5.
+        increment (bool, optional): Whether the targets are the increments
+                                    of the subdomain. Defaults to False.
+
+    Returns:
+        tuple: Tuple containing x (samples) and y (targets) datasets
+    """
+    nvars = input_data.shape[1]
+
+    for k in range(interval):
+        grid_coeffs = np.array(input_data)[:, :, k::interval]
+        train_data = np.zeros((grid_coeffs.shape[0] - 2,
+                               grid_coeffs.shape[1] * 3,
+                               grid_coeffs.shape[2]))
+
+        for i in range(1, grid_coeffs.shape[0]-1):
+            for j in range(3):
+                train_data[i-1, j*nvars:(j+1)*nvars, :] = \
+                    grid_coeffs[i+j-1, :, :]
+
+        train_data_swap = train_data.swapaxes(1, 2)
+
+        step = train_data_swap[:, :-1, :]
+        step_forward = train_data_swap[:, 1:, :]
+
+        step[:, :, :nvars] = step_forward[:, :, :nvars]
+        step[:, :, nvars*2:] = step_forward[:, :, nvars*2:]
+
+        x_train = step
+
+        if increment:
+            y_train = np.diff(step, axis=1)
+            x_train = x_train[:, :-1, :]
+        else:
+            y_train = step_forward
+
+        x_train = np.concatenate(x_train, 0)
+        y_train = np.concatenate(y_train, 0)[:, nvars:nvars*2]
+
+        if k == 0:
+            x_train_full = x_train
+            y_train_full = y_train
+        else:
+            x_train_full = np.concatenate([x_train_full, x_train])
+            y_train_full = np.concatenate([y_train_full, y_train])
+
+    return x_train_full, y_train_full
+
+
+def measure(function, *args):
+    """
+    Wall-clock time and peak traced memory of a function call
+
+    Args:
+        function (callable): Function to measure
+        *args: Arguments of the function
+
+    Returns:
+        tuple: Output, time in seconds and peak memory in bytes
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    out = function(*args)
+    duration = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return out, duration, peak
+
+
+def main(shape=(10, 500, 2000), intervals=(1, 5, 10), increment=False):
+    """
+    Run the benchmark and print a table with the results
+
+    Args:
+        shape (tuple, optional): Shape of the random input data. Defaults to
+                                 (10, 500, 2000).
+        intervals (tuple of int, optional): Timestep intervals. Defaults to
+                                            (1, 5, 10).
+        increment (bool, optional): Whether the targets are increments.
+                                    Defaults to False.
+    """
+    data = np.random.default_rng(0).normal(size=shape).astype(np.float32)
+
+    print("%9s %10s %10s %12s %12s %8s %10s" %
+          ("interval", "loop [s]", "new [s]", "loop [MB]", "new [MB]",
+           "speedup", "identical"))
+
+    for interval in intervals:
+        old, t_old, m_old = measure(loop_dataset, data, interval, increment)
+        new, t_new, m_new = measure(stencil_dataset, data, interval,
+                                    increment)
+        identical = all(np.array_equal(a, b) for a, b in zip(old, new))
+        del old, new
+
+        print("%9d %10.3f %10.3f %12.1f %12.1f %8.1f %10s" %
+              (interval, t_old, t_new, m_old / 1e6, m_new / 1e6,
+               t_old / t_new, identical))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the \
+preprocessing of predictive models")
+    parser.add_argument("--shape", type=int, nargs=3, default=[10, 500, 2000])
+    parser.add_argument("--interval", type=int, nargs="+",
+                        default=[1, 5, 10])
+    parser.add_argument("--increment", action="store_true")
+    args = parser.parse_args()
+
+    main(tuple(args.shape), args.interval, args.increment)
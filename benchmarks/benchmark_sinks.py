@@ -0,0 +1,141 @@
+"""
+
+Benchmark of the time that logging the metrics of an epoch takes on the
+training thread, when TensorBoard, a JSON lines file and a remote service
+with a latency per call, which stands in for wandb, are written to directly
+as before, and through an `Async_sink`. The epochs are simulated by matrix
+products of a given duration. Reported are the mean and maximum time spent
+logging per epoch on the training thread, and the total time including the
+final flush.
+
+Please execute from the root of the repository, e.g.:
+
+python benchmarks/benchmark_sinks.py --epochs 50 --latency 0.05
+
+"""
+
+import argparse
+import tempfile
+import time
+import os
+import numpy as np
+from ddganAE.models.sinks import Metric_sink, Async_sink, Tensorboard_sink, \
+    File_sink
+
+__author__ = "Zef Wolffs"
+__credits__ = []
+__license__ = "MIT"
+__version__ = "1.0.0"
+__maintainer__ = "Zef Wolffs"
+__email__ = "zefwolffs@gmail.com"
+__status__ = "Development"
+
+
+class Remote_sink(Metric_sink):
+    """
+    Sink with a latency per write, like a call to a remote service
+    """
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def write(self, step, split, metrics):
+        time.sleep(self.latency)
+
+
+class _Sequential_sink(Metric_sink):
+    """
+    Sinks written to on the calling thread, as the models did before
+    """
+
+    def __init__(self, sinks):
+        self.sinks = sinks
+
+    def write(self, step, split, metrics):
+        for sink in self.sinks:
+            sink.write(step, split, metrics)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+def run(sink, epochs, epoch_time):
+    """
+    Simulate training and log the metrics of every epoch
+
+    Args:
+        sink (Metric_sink): Sink
+        epochs (int): Number of epochs
+        epoch_time (float): Duration of the computations of an epoch in
+                            seconds
+
+    Returns:
+        tuple: Times spent logging per epoch, total time
+    """
+    a = np.random.default_rng(0).normal(size=(256, 256))
+
+    times = []
+    start = time.perf_counter()
+    for epoch in range(epochs):
+        end = time.perf_counter() + epoch_time
+        while time.perf_counter() < end:
+            a = np.tanh(a @ a / 256)
+
+        before = time.perf_counter()
+        sink.write(epoch, "train", {"loss": a[0, 0], "accuracy": a[0, 1]})
+        sink.write(epoch, "val", {"loss": a[1, 0], "accuracy": a[1, 1]})
+        times.append(time.perf_counter() - before)
+
+    sink.close()
+
+    return np.array(times), time.perf_counter() - start
+
+
+def main(epochs=50, epoch_time=0.05, latency=0.05):
+    """
+    Run the benchmark and print a table with the results
+
+    Args:
+        epochs (int, optional): Number of epochs. Defaults to 50.
+        epoch_time (float, optional): Duration of an epoch in seconds.
+                                      Defaults to 0.05.
+        latency (float, optional): Latency of the remote service in seconds.
+                                   Defaults to 0.05.
+    """
+    print("%12s %8s %16s %15s %11s" %
+          ("sinks", "mode", "mean write [ms]", "max write [ms]",
+           "total [s]"))
+
+    with tempfile.TemporaryDirectory() as directory:
+        for remote in (False, True):
+            for asynchronous in (False, True):
+                name = "%d_%d" % (remote, asynchronous)
+                sinks = [Tensorboard_sink(os.path.join(directory, name)),
+                         File_sink(os.path.join(directory, name + ".jsonl"))]
+                if remote:
+                    sinks.append(Remote_sink(latency))
+
+                # Synchronous writes go to the sinks one after another
+                sink = Async_sink(sinks) if asynchronous else \
+                    _Sequential_sink(sinks)
+
+                times, total = run(sink, epochs, epoch_time)
+                print("%12s %8s %16.3f %15.3f %11.2f" %
+                      ("+remote" if remote else "local",
+                       "async" if asynchronous else "sync",
+                       times.mean() * 1e3, times.max() * 1e3, total))
+
+
+if __name__ == "__main__":
+    # Only measure on CPU
+    os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
+
+    parser = argparse.ArgumentParser(description="Benchmark the time spent \
+logging on the training thread")
+    parser.add_argument("--epochs", type=int, default=50)
+    parser.add_argument("--epoch_time", type=float, default=0.05)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    main(args.epochs, args.epoch_time, args.latency)
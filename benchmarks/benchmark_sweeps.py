@@ -0,0 +1,128 @@
+"""
+
+Benchmark of the subdomain sweep orderings of the predictive rollouts. For an
+increasing number of subdomains this times `Predictive.predict` with the
+Gauss-Seidel, Jacobi and red-black sweeps and reports the speedup of the
+batched sweeps and their deviation from the Gauss-Seidel result.
+
+Please execute from the root of the repository, e.g.:
+
+python benchmarks/benchmark_sweeps.py --domains 2 4 8 16 32
+
+"""
+
+import argparse
+import time
+import numpy as np
+import tensorflow as tf
+from ddganAE.models import Predictive
+from ddganAE.architectures.svdae import build_slimmer_dense_encoder, \
+                                        build_slimmer_dense_decoder
+
+__author__ = "Zef Wolffs"
+__credits__ = []
+__license__ = "MIT"
+__version__ = "1.0.0"
+__maintainer__ = "Zef Wolffs"
+__email__ = "zefwolffs@gmail.com"
+__status__ = "Development"
+
+
+def build_model(nvars, latent_vars, seed=0):
+    """
+    Build a small untrained predictive model. Weights are kept small such that
+    the inner iterations are contractive and all sweeps converge.
+
+    Args:
+        nvars (int): Number of variables per subdomain
+        latent_vars (int): Number of latent variables
+        seed (int, optional): Seed of the weights initializer. Defaults to 0.
+
+    Returns:
+        Predictive: Compiled predictive model
+    """
+    initializer = tf.keras.initializers.RandomNormal(stddev=0.05, seed=seed)
+    encoder = build_slimmer_dense_encoder(latent_vars, initializer)
+    decoder = build_slimmer_dense_decoder(nvars, latent_vars, initializer)
+
+    model = Predictive(encoder, decoder, tf.keras.optimizers.Adam())
+    model.compile(nvars)
+    model.interval = 1
+
+    return model
+
+
+def time_sweep(model, boundaries, init_values, timesteps, iters, sweep):
+    """
+    Time a single rollout
+
+    Args:
+        model (Predictive): Predictive model
+        boundaries (np.ndarray): Boundaries in shape (2, nvars, ntimesteps)
+        init_values (np.ndarray): Initial values in shape (ngrids, nvars)
+        timesteps (int): Number of timesteps to predict
+        iters (int): Number of inner iterations per timestep
+        sweep (str): Subdomain sweep ordering
+
+    Returns:
+        tuple: Wall-clock time in seconds and predicted values
+    """
+    start = time.perf_counter()
+    pred = model.predict(boundaries, init_values, timesteps, iters=iters,
+                         sweep=sweep)
+
+    return time.perf_counter() - start, pred
+
+
+def main(domains, nvars=10, latent_vars=5, timesteps=10, iters=5):
+    """
+    Run the benchmark and print a table with the results
+
+    Args:
+        domains (list of int): Numbers of predicted subdomains to benchmark
+        nvars (int, optional): Variables per subdomain. Defaults to 10.
+        latent_vars (int, optional): Latent variables. Defaults to 5.
+        timesteps (int, optional): Timesteps per rollout. Defaults to 10.
+        iters (int, optional): Inner iterations per timestep. Defaults to 5.
+    """
+    model = build_model(nvars, latent_vars)
+    rng = np.random.default_rng(0)
+
+    print("%8s %12s %12s %12s %10s %10s %12s" %
+          ("domains", "gs [s]", "jacobi [s]", "rb [s]", "jacobi x",
+           "rb x", "max dev"))
+
+    for n in domains:
+        boundaries = rng.uniform(-1, 1, (2, nvars, timesteps + 1))
+        init_values = rng.uniform(-1, 1, (n, nvars))
+
+        # Warm up such that tracing is not included in the timings
+        model.predict(boundaries, init_values, 1, iters=1, sweep="jacobi")
+
+        t_gs, pred_gs = time_sweep(model, boundaries, init_values, timesteps,
+                                   iters, "gauss-seidel")
+        t_j, pred_j = time_sweep(model, boundaries, init_values, timesteps,
+                                 2*iters, "jacobi")
+        t_rb, pred_rb = time_sweep(model, boundaries, init_values, timesteps,
+                                   iters, "red-black")
+
+        dev = max(np.abs(pred_j - pred_gs).max(),
+                  np.abs(pred_rb - pred_gs).max())
+
+        print("%8d %12.3f %12.3f %12.3f %10.1f %10.1f %12.2e" %
+              (n, t_gs, t_j, t_rb, t_gs/t_j, t_gs/t_rb, dev))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark subdomain \
+sweeps of predictive rollouts")
+    parser.add_argument("--domains", type=int, nargs="+",
+                        default=[2, 4, 8, 16, 32])
+    parser.add_argument("--nvars", type=int, default=10)
+    parser.add_argument("--latent_vars", type=int, default=5)
+    parser.add_argument("--timesteps", type=int, default=10)
+    parser.add_argument("--iters", type=int, default=5)
+    args = parser.parse_args()
+
+    main(args.domains, args.nvars, args.latent_vars, args.timesteps,
+         args.iters)
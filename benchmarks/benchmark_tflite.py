@@ -0,0 +1,187 @@
+"""
+
+Benchmark of the TFLite inference backend on CPU. A dense predictive model is
+trained briefly on the flow past cylinder POD coefficients and exported to
+TFLite without quantization and with float16 and int8 quantization, where the
+int8 ranges are calibrated on the training samples. Reported are the model
+size, the latency per call, the error with respect to the Keras model and the
+prediction error on the targets and of a rollout. Optionally the same is done
+for a 2D convolutional autoencoder on random grids.
+
+Please execute from the root of the repository, e.g.:
+
+python benchmarks/benchmark_tflite.py --epochs 20 --cae
+
+"""
+
+import argparse
+import os
+import time
+import numpy as np
+import tensorflow as tf
+from sklearn.preprocessing import MinMaxScaler
+from ddganAE.models import Predictive
+from ddganAE.backends import Tflite_model, export_tflite
+from ddganAE.architectures.svdae import build_dense_encoder, \
+                                        build_dense_decoder
+from ddganAE.architectures.cae.D2 import build_omata_encoder_decoder
+
+__author__ = "Zef Wolffs"
+__credits__ = []
+__license__ = "MIT"
+__version__ = "1.0.0"
+__maintainer__ = "Zef Wolffs"
+__email__ = "zefwolffs@gmail.com"
+__status__ = "Development"
+
+
+def time_call(function, x, repeats):
+    """
+    Median latency of a function call
+
+    Args:
+        function (callable): Function to time
+        x (np.ndarray): Input of the function
+        repeats (int): Number of calls
+
+    Returns:
+        float: Median wall-clock time per call in seconds
+    """
+    function(x)
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function(x)
+        times.append(time.perf_counter() - start)
+
+    return np.median(times)
+
+
+def compare(encoder, decoder, input_shape, x, repeats, y=None):
+    """
+    Export an encoder and decoder pair with every quantization and print a
+    table with the results
+
+    Args:
+        encoder (tf.keras.Model): Encoder
+        decoder (tf.keras.Model): Decoder
+        input_shape (tuple): Shape of a single input sample
+        x (np.ndarray): Samples used for calibration and evaluation
+        repeats (int): Calls per timing
+        y (np.ndarray, optional): Targets of the samples. Defaults to None.
+
+    Returns:
+        dict: TFLite runtimes by quantization
+    """
+    x = x.astype(np.float32)
+    model = tf.keras.Sequential([encoder, decoder])
+    reference = model(x, training=False).numpy()
+    size = 4 * model.count_params()
+
+    print("%10s %12s %12s %12s %12s %12s" %
+          ("model", "size [kB]", "batch 1 [ms]", "batch n [ms]", "max dev",
+           "target mse"))
+
+    def report(name, function, size):
+        out = function(x)
+        mse = np.nan if y is None else \
+            np.mean((out.reshape(y.shape) - y) ** 2)
+        print("%10s %12.1f %12.3f %12.3f %12.2e %12.2e" %
+              (name, size / 1e3, 1e3 * time_call(function, x[:1], repeats),
+               1e3 * time_call(function, x, repeats),
+               np.abs(out - reference).max(), mse))
+
+    report("keras", lambda x: model(x, training=False).numpy(), size)
+
+    runtimes = {}
+    for quantization in [None, "float16", "int8"]:
+        runtime = Tflite_model(export_tflite(
+            encoder, decoder, input_shape, quantization=quantization,
+            calibration_data=x))
+        runtimes[quantization] = runtime
+        report("tflite" if quantization is None else quantization, runtime,
+               len(runtime.flatbuffer))
+
+    return runtimes
+
+
+def main(datafile, epochs=20, interval=5, latent_vars=10, samples=256,
+         repeats=50, timesteps=50, cae=False):
+    """
+    Run the benchmark and print tables with the results
+
+    Args:
+        datafile (str): POD coefficients in shape (ndomains, nvars, ntimes)
+        epochs (int, optional): Training epochs. Defaults to 20.
+        interval (int, optional): Timestep interval. Defaults to 5.
+        latent_vars (int, optional): Latent variables. Defaults to 10.
+        samples (int, optional): Number of samples to evaluate on. Defaults
+                                 to 256.
+        repeats (int, optional): Calls per timing. Defaults to 50.
+        timesteps (int, optional): Timesteps of the rollout. Defaults to 50.
+        cae (bool, optional): Whether to also benchmark a 2D convolutional
+                              autoencoder. Defaults to False.
+    """
+    data = np.load(datafile)
+    scaler = MinMaxScaler((-1, 1))
+    data = scaler.fit_transform(data.reshape(-1, 1)).reshape(data.shape)
+    nvars = data.shape[1]
+
+    initializer = tf.keras.initializers.RandomNormal(stddev=0.05, seed=0)
+    model = Predictive(build_dense_encoder(latent_vars, initializer),
+                       build_dense_decoder(nvars, latent_vars, initializer),
+                       tf.keras.optimizers.Adam(), seed=0)
+    model.compile(nvars)
+    model.train(data, epochs, interval=interval, sinks=[])
+
+    x, y = model.preprocess(data)
+    idx = np.random.default_rng(0).choice(len(x), samples, replace=False)
+
+    print("Dense predictive model, %d samples" % samples)
+    runtimes = compare(model.encoder, model.decoder, model.input_shape,
+                       x[idx], repeats, y[idx])
+
+    boundaries = data[[0, -1]]
+    init_values = data[1:-1, :, 0]
+    reference = model.predict(boundaries, init_values, timesteps)
+
+    print("%10s %14s %16s" % ("backend", "rollout [s]", "rollout max dev"))
+    for quantization, runtime in runtimes.items():
+        start = time.perf_counter()
+        pred = model.predict(boundaries, init_values, timesteps,
+                             backend=runtime)
+        print("%10s %14.3f %16.2e" %
+              ("tflite" if quantization is None else quantization,
+               time.perf_counter() - start,
+               np.abs(pred - reference)[..., :timesteps+1].max()))
+
+    if cae:
+        input_shape = (55, 42, 2)
+        encoder, decoder = build_omata_encoder_decoder(input_shape, 10,
+                                                       initializer)
+        grids = np.random.default_rng(0).uniform(0, 1, (64,) + input_shape)
+
+        print("\n2D convolutional autoencoder, random grids")
+        compare(encoder, decoder, input_shape, grids, repeats)
+
+
+if __name__ == "__main__":
+    # Only measure on CPU
+    os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
+
+    parser = argparse.ArgumentParser(description="Benchmark the TFLite \
+inference backend on CPU")
+    parser.add_argument("--datafile", type=str,
+                        default="tests/data/pod_coeffs_field_Velocity.npy")
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--interval", type=int, default=5)
+    parser.add_argument("--latent_vars", type=int, default=10)
+    parser.add_argument("--samples", type=int, default=256)
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--timesteps", type=int, default=50)
+    parser.add_argument("--cae", action="store_true")
+    args = parser.parse_args()
+
+    main(args.datafile, args.epochs, args.interval, args.latent_vars,
+         args.samples, args.repeats, args.timesteps, args.cae)
@@ -0,0 +1,2 @@
+from .numpy_mlp import *  # noqa: F403, F401
+from .tflite import *  # noqa: F403, F401
@@ -0,0 +1,193 @@
+"""
+
+Pure NumPy inference runtime for the dense encoders and decoders. These are
+small multilayer perceptrons, for which at small batch sizes the dispatch
+overhead of Keras and TensorFlow is far larger than the matrix products
+themselves. The runtime freezes the weights, activations and batch
+normalization statistics of a model in inference mode and evaluates them
+with plain NumPy.
+
+"""
+
+import numpy as np
+from keras.layers import Dense, Dropout, BatchNormalization, Activation, \
+    LeakyReLU, Flatten, Reshape, GaussianNoise, InputLayer
+from keras.models import Model
+
+__author__ = "Zef Wolffs"
+__credits__ = []
+__license__ = "MIT"
+__version__ = "1.0.0"
+__maintainer__ = "Zef Wolffs"
+__email__ = "zefwolffs@gmail.com"
+__status__ = "Development"
+
+
+def sigmoid(x):
+    """
+    Numerically stable logistic sigmoid
+    """
+    return 0.5 * (np.tanh(0.5 * x) + 1)
+
+
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0),
+    "elu": lambda x: np.where(x > 0, x, np.expm1(np.minimum(x, 0))),
+    "selu": lambda x: 1.0507009873554805 *
+    np.where(x > 0, x, 1.6732632423543772 * np.expm1(np.minimum(x, 0))),
+    "sigmoid": sigmoid,
+    "tanh": np.tanh,
+    "softplus": lambda x: np.logaddexp(x, 0),
+    "swish": lambda x: x * sigmoid(x),
+    "silu": lambda x: x * sigmoid(x),
+}
+
+
+class Numpy_mlp:
+    """
+    Frozen dense model that is evaluated with NumPy. Every layer is stored as
+    a pair of an operation name and its frozen parameters.
+    """
+
+    def __init__(self, layers, dtype=np.float32):
+        """
+        Constructor
+
+        Args:
+            layers (list of tuple): Operations as (name, parameters) pairs,
+                                    see `from_keras`
+            dtype (np.dtype, optional): Data type of the computations.
+                                        Defaults to np.float32.
+        """
+        self.layers = layers
+        self.dtype = dtype
+
+    @classmethod
+    def from_keras(cls, *models, dtype=np.float32):
+        """
+        Freeze one or more Keras models, that are applied one after another,
+        e.g. an encoder and a decoder. Dropout and Gaussian noise are
+        dropped as in inference mode and batch normalization is reduced to
+        an affine transformation with the moving statistics.
+
+        Args:
+            *models (tf.keras.Model): Models built of dense, dropout, batch
+                                      normalization, activation, flatten and
+                                      reshape layers
+            dtype (np.dtype, optional): Data type of the computations.
+                                        Defaults to np.float32.
+
+        Returns:
+            Numpy_mlp: Frozen model
+        """
+        layers = []
+        for model in models:
+            layers += _freeze(model, dtype)
+
+        return cls(layers, dtype)
+
+    def __call__(self, x):
+        """
+        Evaluate the model
+
+        Args:
+            x (np.ndarray): Batch of inputs
+
+        Returns:
+            np.ndarray: Batch of outputs
+        """
+        x = np.asarray(x, dtype=self.dtype)
+        x = x.reshape(len(x), -1)
+
+        for op, params in self.layers:
+            if op == "dense":
+                kernel, bias, act = params
+                x = ACTIVATIONS[act](x @ kernel + bias)
+            elif op == "affine":
+                scale, shift = params
+                x = x * scale + shift
+            elif op == "activation":
+                x = ACTIVATIONS[params](x)
+            elif op == "leaky_relu":
+                x = np.where(x > 0, x, params * x)
+            elif op == "reshape":
+                x = x.reshape((len(x),) + params)
+
+        return x
+
+    predict = __call__
+
+
+def _activation(layer):
+    """
+    Name of the activation function of a layer
+
+    Args:
+        layer (tf.keras.layers.Layer): Dense or activation layer
+
+    Returns:
+        str: Name of the activation function
+    """
+    act = layer.activation.__name__
+    if act not in ACTIVATIONS:
+        raise NotImplementedError("Activation " + act + " is not supported \
+by the NumPy backend")
+
+    return act
+
+
+def _freeze(model, dtype):
+    """
+    Convert the layers of a Keras model into frozen operations
+
+    Args:
+        model (tf.keras.Model): Keras model or layer
+        dtype (np.dtype): Data type of the parameters
+
+    Returns:
+        list of tuple: Operations as (name, parameters) pairs
+    """
+    if isinstance(model, Model):
+        return [op for layer in model.layers for op in _freeze(layer, dtype)]
+
+    if isinstance(model, Dense):
+        act = _activation(model)
+        kernel = model.kernel.numpy().astype(dtype)
+        bias = model.bias.numpy().astype(dtype) if model.use_bias else \
+            np.zeros(kernel.shape[1], dtype=dtype)
+
+        return [("dense", (kernel, bias, act))]
+
+    if isinstance(model, BatchNormalization):
+        if len(model.axis) != 1 or \
+           model.axis[0] not in (-1, len(model.input_shape) - 1):
+            raise NotImplementedError("Batch normalization is only \
+supported along the last axis by the NumPy backend")
+
+        scale = 1 / np.sqrt(model.moving_variance.numpy() + model.epsilon)
+        if model.scale:
+            scale = scale * model.gamma.numpy()
+        shift = -model.moving_mean.numpy() * scale
+        if model.center:
+            shift = shift + model.beta.numpy()
+
+        return [("affine", (scale.astype(dtype), shift.astype(dtype)))]
+
+    if isinstance(model, Activation):
+        return [("activation", _activation(model))]
+
+    if isinstance(model, LeakyReLU):
+        return [("leaky_relu", float(model.alpha))]
+
+    if isinstance(model, Flatten):
+        return [("reshape", (-1,))]
+
+    if isinstance(model, Reshape):
+        return [("reshape", tuple(model.target_shape))]
+
+    if isinstance(model, (Dropout, GaussianNoise, InputLayer)):
+        return []
+
+    raise NotImplementedError("Layer " + type(model).__name__ + " is not \
+supported by the NumPy backend")
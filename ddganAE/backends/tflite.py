@@ -0,0 +1,175 @@
+"""
+
+TensorFlow Lite inference backend. Encoder and decoder pairs, i.e. the 2D and
+3D convolutional autoencoders as well as the dense predictive models, are
+converted into a single TFLite flatbuffer, optionally with post-training
+float16 or int8 quantization. The int8 quantization is calibrated on a slice
+of the training data. The resulting runtime can be passed as backend to the
+`predict` methods of the models.
+
+"""
+
+import threading
+import numpy as np
+import tensorflow as tf
+from keras.layers import Input
+from keras.models import Model
+import keras
+
+__author__ = "Zef Wolffs"
+__credits__ = []
+__license__ = "MIT"
+__version__ = "1.0.0"
+__maintainer__ = "Zef Wolffs"
+__email__ = "zefwolffs@gmail.com"
+__status__ = "Development"
+
+QUANTIZATIONS = (None, "float16", "int8")
+
+
+def export_tflite(encoder, decoder, input_shape, path=None,
+                  quantization=None, calibration_data=None,
+                  n_calibration=200):
+    """
+    Convert an encoder and decoder pair into a TFLite flatbuffer
+
+    Args:
+        encoder (tf.keras.Model or str): Encoder or directory of the
+                                         SavedModel it was saved to, e.g.
+                                         "model/encoder"
+        decoder (tf.keras.Model or str): Decoder or directory of the
+                                         SavedModel it was saved to
+        input_shape (tuple): Shape of a single input sample, e.g.
+                             `model.input_shape`
+        path (str, optional): Path to write the flatbuffer to. Defaults to
+                              None.
+        quantization (str, optional): Post-training quantization, "float16"
+                                      for float16 weights or "int8" for
+                                      integer weights and activations.
+                                      Defaults to None, i.e. float32.
+        calibration_data (np.ndarray, optional): Training samples to
+                                                 calibrate the int8
+                                                 activation ranges on.
+                                                 Defaults to None.
+        n_calibration (int, optional): Number of samples, evenly spread over
+                                       `calibration_data`, to calibrate on.
+                                       Defaults to 200.
+
+    Returns:
+        bytes: TFLite flatbuffer
+    """
+    if quantization not in QUANTIZATIONS:
+        raise ValueError("Unknown quantization '%s', choose one of %s" %
+                         (quantization, ", ".join(map(str, QUANTIZATIONS))))
+
+    if quantization == "int8" and calibration_data is None:
+        raise ValueError("int8 quantization requires calibration_data")
+
+    if isinstance(encoder, str):
+        encoder = keras.models.load_model(encoder)
+    if isinstance(decoder, str):
+        decoder = keras.models.load_model(decoder)
+
+    grid = Input(shape=input_shape)
+    model = Model(grid, decoder(encoder(grid)))
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+
+    if quantization == "float16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == "int8":
+        samples = np.asarray(calibration_data, dtype=np.float32).reshape(
+            (-1,) + tuple(input_shape))
+        samples = samples[np.linspace(0, len(samples) - 1,
+                                      min(n_calibration, len(samples))
+                                      ).astype(int)]
+
+        def representative_dataset():
+            for sample in samples:
+                yield [sample[None]]
+
+        # Inputs and outputs stay float32 such that the runtime is a drop-in
+        # replacement of the Keras model
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = \
+            [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    flatbuffer = converter.convert()
+
+    if path is not None:
+        with open(path, "wb") as f:
+            f.write(flatbuffer)
+
+    return flatbuffer
+
+
+class Tflite_model:
+    """
+    Callable TFLite runtime with the same batched interface as a Keras model
+    """
+
+    def __init__(self, flatbuffer, num_threads=None):
+        """
+        Constructor
+
+        Args:
+            flatbuffer (bytes): TFLite flatbuffer, see `export_tflite`
+            num_threads (int, optional): Number of threads of the
+                                         interpreter. Defaults to None.
+        """
+        self.flatbuffer = flatbuffer
+        self.interpreter = tf.lite.Interpreter(model_content=flatbuffer,
+                                               num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.input_shape = tuple(self.input["shape"][1:])
+        self.batch_size = self.input["shape"][0]
+
+        # The interpreter is not thread safe, e.g. for parareal rollouts
+        self.lock = threading.Lock()
+
+    def __call__(self, x):
+        """
+        Evaluate the model
+
+        Args:
+            x (np.ndarray): Batch of inputs
+
+        Returns:
+            np.ndarray: Batch of outputs
+        """
+        x = np.asarray(x, dtype=np.float32).reshape((-1,) + self.input_shape)
+
+        with self.lock:
+            if len(x) != self.batch_size:
+                self.interpreter.resize_tensor_input(self.input["index"],
+                                                     x.shape)
+                self.interpreter.allocate_tensors()
+                self.batch_size = len(x)
+
+            self.interpreter.set_tensor(self.input["index"], x)
+            self.interpreter.invoke()
+
+            return self.interpreter.get_tensor(self.output["index"]).copy()
+
+    predict = __call__
+
+
+def from_tflite(path, num_threads=None):
+    """
+    Load a TFLite flatbuffer written by `export_tflite`
+
+    Args:
+        path (str): Path of the flatbuffer
+        num_threads (int, optional): Number of threads of the interpreter.
+                                     Defaults to None.
+
+    Returns:
+        Tflite_model: Callable runtime
+    """
+    with open(path, "rb") as f:
+        return Tflite_model(f.read(), num_threads=num_threads)
@@ -2,3 +2,11 @@ from .aae import *  # noqa: F403, F401
 from .cae import *  # noqa: F403, F401
 from .svdae import *  # noqa: F403, F401
 from .predictive import *  # noqa: F403, F401
+from .accelerators import *  # noqa: F403, F401
+from .predictors import *  # noqa: F403, F401
+from .engine import *  # noqa: F403, F401
+from .precision import *  # noqa: F403, F401
+from .distribute import *  # noqa: F403, F401
+from .checkpoint import *  # noqa: F403, F401
+from .sinks import *  # noqa: F403, F401
+from .timing import *  # noqa: F403, F401
@@ -15,9 +15,14 @@ https://arxiv.org/abs/2104.06297
 from keras.layers import Input
 from keras.models import Model
 import numpy as np
-import tensorflow as tf
-import datetime
-import wandb
+from ddganAE.models.engine import AAE_engine, Combined_loss_engine
+from ddganAE.models.distribute import check_strategy, worker_shard, \
+    strategy_scope
+from ddganAE.models.sinks import training_sink, AAE_TENSORBOARD_TAGS
+from ddganAE.models.timing import phase_timer
+from ddganAE.preprocessing import Sample_batches
+from ddganAE.models.precision import mixed_model, mixed_optimizer, \
+    host_dtype
 
 __author__ = "Zef Wolffs"
 __credits__ = []
@@ -33,7 +38,8 @@ class AAE:
     Adversarial autoencoder class
     """
 
-    def __init__(self, encoder, decoder, discriminator, optimizer, seed=None):
+    def __init__(self, encoder, decoder, discriminator, optimizer, seed=None,
+                 precision=None):
         """
         Constructor of adversarial autoencoder class
 
@@ -44,14 +50,21 @@ class AAE:
             optimizer (tf.keras.optimizers.Optimizer): Optimization method
             seed (int, optional): Seed that will be used wherever possible.
                                   Defaults to None.
+            precision (str, optional): Mixed precision of the networks and
+                                       the data fed to them, "float16" or
+                                       "bfloat16", see
+                                       `ddganAE.models.precision`. Defaults
+                                       to None, i.e. float32.
         """
-        self.encoder = encoder
-        self.decoder = decoder
-        self.discriminator = discriminator
+        self.encoder = mixed_model(encoder, precision)
+        self.decoder = mixed_model(decoder, precision)
+        self.discriminator = mixed_model(discriminator, precision)
         self.seed = seed
         self.latent_dim = self.decoder.layers[0].input_shape[1]
 
-        self.optimizer = optimizer
+        self.precision = precision
+        self.optimizer = mixed_optimizer(optimizer, precision)
+        self.engine = None
 
     def compile(self, input_shape):
         """
@@ -87,15 +100,22 @@ class AAE:
                                            metrics=['accuracy'])
 
     def train(self, train_data, epochs, val_data=None, batch_size=128,
-              val_batch_size=128, wandb_log=False):
+              val_batch_size=128, wandb_log=False, compiled=False,
+              fused=False, jit_compile=False, strategy=None, accumulate=1,
+              recompute=False, checkpoint=None, resume=False, sinks=None,
+              timer=None):
         """
         Training model according to original paper on adversarial autoencoders
 
         Args:
-            train_data (np.ndarray): Train dataset
+            train_data (np.ndarray or str): Train dataset, or the path of a
+                                            `.npy` file with it which is read
+                                            memory-mapped
             epochs (int): Number of training epochs to execute
-            val_data (np.ndarray, optional): Validation dataset. Defaults to
-                                             None.
+            val_data (np.ndarray or str, optional): Validation dataset, or
+                                                    the path of a `.npy` file
+                                                    with it. Defaults to
+                                                    None.
             batch_size (int, optional): Training batch size. Defaults to 128.
             val_batch_size (int, optional): Validation batch size. Defaults to
                                             128.
@@ -103,58 +123,189 @@ class AAE:
                                         function needs to be called in
                                         wandb.init() scope for this to work.
                                         Defaults to False.
+            compiled (bool, optional): Whether to train with the compiled
+                                       steps of an `AAE_engine`, which
+                                       samples the prior in-graph and updates
+                                       the discriminator on one batch of real
+                                       and fake latent variables. Defaults to
+                                       False.
+            fused (bool, optional): Whether the compiled training does the
+                                    reconstruction and regularization updates
+                                    of a batch at once, in a single pass over
+                                    the data per epoch. Defaults to False.
+            jit_compile (bool, optional): Whether to compile the steps with
+                                          XLA. Defaults to False.
+            strategy (tf.distribute.Strategy, optional): Strategy of
+                                                         data-parallel
+                                                         training, in whose
+                                                         scope the model is
+                                                         constructed and
+                                                         compiled, see
+                                                         `distribute`. The
+                                                         batch sizes are
+                                                         per worker,
+                                                         requires
+                                                         compiled=True.
+                                                         Defaults to None.
+            accumulate (int, optional): Number of micro-batches every batch
+                                        is split into, whose gradients are
+                                        accumulated before a single update,
+                                        such that only batch_size /
+                                        accumulate grids pass through the
+                                        networks at once, requires
+                                        compiled=True. Defaults to 1.
+            recompute (bool, optional): Whether to recompute the activations
+                                        of the encoder and decoder in the
+                                        backward pass instead of storing
+                                        them, requires compiled=True.
+                                        Defaults to False.
+            checkpoint (Training_checkpoint, optional): Checkpoints of
+                                                        the training
+                                                        state, see
+                                                        `checkpoint`.
+                                                        Defaults to None.
+            resume (bool, optional): Whether to resume from the latest
+                                     checkpoint, if any, until `epochs`
+                                     epochs are done in total. Defaults to
+                                     False.
+            sinks (list, optional): Sinks of the metrics of every epoch,
+                                    which are written in the background, see
+                                    `sinks`. Defaults to None, i.e.
+                                    TensorBoard logs in a timestamped
+                                    directory under "logs/", with the tags
+                                    of `AAE_TENSORBOARD_TAGS`.
+            timer (Phase_timer, optional): Instrumentation of the epochs,
+                                           whose metrics are written to the
+                                           sinks, see `timing`. Defaults to
+                                           None.
         """
+        if fused and not compiled:
+            raise NotImplementedError("Fused training requires compiled=True")
+        if (accumulate > 1 or recompute) and not compiled:
+            raise NotImplementedError("Gradient accumulation and "
+                                      "recomputation require compiled=True")
+
+        check_strategy(strategy, self.seed, compiled, jit_compile)
+
+        if compiled:
+            if self.engine is None:
+                with strategy_scope(strategy):
+                    self.engine = AAE_engine(self.encoder, self.decoder,
+                                             self.discriminator,
+                                             self.optimizer, seed=self.seed)
+            self.engine.accumulate = accumulate
+            self.engine.recompute = recompute
+
         d_loss_val = g_loss_val = None
+        shard = worker_shard(strategy)
 
-        train_dataset = tf.data.Dataset.from_tensor_slices(train_data)
-        train_dataset = train_dataset.shuffle(buffer_size=train_data.shape[0],
-                                              reshuffle_each_iteration=True,
-                                              seed=self.seed).\
-            batch(batch_size, drop_remainder=True)
+        dtype = host_dtype(self.precision)
+        train_batches = Sample_batches(train_data, self.seed, dtype)
+        train_dataset = train_batches.dataset(batch_size, drop_remainder=True,
+                                              shard=shard)
 
+        val_batches = None
         if val_data is not None:
-            val_dataset = tf.data.Dataset.from_tensor_slices(val_data)
-            val_dataset = val_dataset.shuffle(
-                buffer_size=val_data.shape[0],
-                reshuffle_each_iteration=True,
-                seed=self.seed).\
-                batch(val_batch_size, drop_remainder=True)
-
-        # Set up tensorboard logging
-        current_time = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
-        train_log_dir = 'logs/' + current_time + '/train'
-        val_log_dir = 'logs/' + current_time + '/val'
-        train_summary_writer = tf.summary.create_file_writer(train_log_dir)
-        val_summary_writer = tf.summary.create_file_writer(val_log_dir)
+            val_batches = Sample_batches(val_data, self.seed, dtype)
+            val_dataset = val_batches.dataset(
+                val_batch_size, drop_remainder=True, shard=shard)
+
+        sink = training_sink(sinks, wandb_log, strategy,
+                             AAE_TENSORBOARD_TAGS)
+
+        timer = phase_timer(timer)
+        timer.start()
+        train_dataset = timer.count(train_dataset)
 
         # Adversarial ground truths
         valid = np.ones((batch_size, 1))
         fake = np.zeros((batch_size, 1))
 
-        for epoch in range(epochs):
+        start = 0
+        if checkpoint is not None:
+            start = checkpoint.bind(self, [train_batches, val_batches],
+                                    strategy, resume)
+
+        for epoch in range(start, epochs):
+
+            with timer.phase("train"):
+                if compiled:
+                    loss, acc, d_loss, g_loss = self.engine.train_epoch(
+                        train_dataset, fused=fused, jit_compile=jit_compile)
+                else:
+                    loss, acc, d_loss, g_loss = self._train_epoch(
+                        train_dataset, valid, fake, timer)
+
+            sink.write(epoch, "train", {"loss": loss, "accuracy": acc,
+                                        "g_loss": g_loss, "d_loss": d_loss})
+
+            # Calculate the accuracies on the validation set
+            if val_data is not None:
+                with timer.phase("validation"):
+                    if compiled:
+                        loss_val, acc_val, d_loss_val, g_loss_val = \
+                            self.engine.validate(val_dataset,
+                                                 jit_compile=jit_compile)
+                    else:
+                        loss_val, acc_val, d_loss_val, g_loss_val = \
+                            self.validate(val_dataset, val_batch_size)
+
+                sink.write(epoch, "val", {"loss": loss_val,
+                                          "accuracy": acc_val,
+                                          "g_loss": g_loss_val,
+                                          "d_loss": d_loss_val})
+
+            if checkpoint is not None:
+                with timer.phase("checkpoint"):
+                    checkpoint.save(epoch + 1, epochs)
+
+            timer.write(sink, epoch)
+
+        timer.stop()
+        sink.close()
+
+    def _train_epoch(self, train_dataset, valid, fake, timer=None):
+        """
+        Train for one epoch with a reconstruction and a regularization pass
+        over the data
+
+        Args:
+            train_dataset (tf.data.Dataset): Batches of grids
+            valid (np.ndarray): Labels of real latent variables
+            fake (np.ndarray): Labels of fake latent variables
+            timer (Phase_timer, optional): Timer of the input and the
+                                           phases. Defaults to None.
 
-            # Reconstruction phase
-            loss_cum = 0
-            acc_cum = 0
-            for step, grids in enumerate(train_dataset):
-                # Train the autoencoder reconstruction
+        Returns:
+            tuple: Mean reconstruction loss and accuracy, discriminator loss
+                   and generator loss
+        """
+        timer = phase_timer(timer)
+
+        # Reconstruction phase
+        loss_cum = 0
+        acc_cum = 0
+        for step, grids in enumerate(timer.batches(train_dataset)):
+            # Train the autoencoder reconstruction
+            with timer.phase("reconstruction"):
                 loss, acc = self.autoencoder.train_on_batch(grids, grids)
-                loss_cum += loss
-                acc_cum += acc
+            loss_cum += loss
+            acc_cum += acc
 
-            # Average the loss and accuracy over the entire dataset
-            loss = loss_cum/(step+1)
-            acc = acc_cum/(step+1)
+        # Average the loss and accuracy over the entire dataset
+        loss = loss_cum/(step+1)
+        acc = acc_cum/(step+1)
 
-            # Regularization phase
-            d_loss_cum = 0
-            g_loss_cum = 0
-            for step, grids in enumerate(train_dataset):
+        # Regularization phase
+        d_loss_cum = 0
+        g_loss_cum = 0
+        for step, grids in enumerate(timer.batches(train_dataset)):
 
+            with timer.phase("regularization"):
                 # Generate real and fake latent space. Fake latent space is
                 # the normal distribution
                 latent_fake = self.encoder.predict(grids)
-                latent_real = np.random.normal(size=(batch_size,
+                latent_real = np.random.normal(size=(len(valid),
                                                      self.latent_dim))
 
                 # Train the discriminator
@@ -166,45 +317,13 @@ class AAE:
 
                 # Train generator
                 g_loss_cum += \
-                    self.encoder_discriminator.train_on_batch(grids, valid)[0]
-
-            d_loss = d_loss_cum/(step+1)
-            g_loss = g_loss_cum/(step+1)
+                    self.encoder_discriminator.train_on_batch(grids,
+                                                              valid)[0]
 
-            with train_summary_writer.as_default():
-                tf.summary.scalar('loss - ae', loss, step=epoch)
-                tf.summary.scalar('accuracy - ae', acc, step=epoch)
-                tf.summary.scalar('loss - g', g_loss, step=epoch)
-                tf.summary.scalar('loss - d', d_loss, step=epoch)
-
-            # Calculate the accuracies on the validation set
-            if val_data is not None:
-                loss_val, acc_val, d_loss_val, g_loss_val = \
-                    self.validate(val_dataset, val_batch_size)
-
-                with val_summary_writer.as_default():
-                    tf.summary.scalar('loss - ae', loss_val, step=epoch)
-                    tf.summary.scalar('accuracy - ae', acc_val, step=epoch)
-                    tf.summary.scalar('loss - g', g_loss_val, step=epoch)
-                    tf.summary.scalar('loss - d', d_loss_val, step=epoch)
-
-            if wandb_log:
-                if val_data is not None:
-                    log = {"epoch": epoch, "train_loss": loss,
-                           "train_accuracy": acc,
-                           "g_train_loss": g_loss,
-                           "d_train_loss": d_loss,
-                           "g_valid_loss": g_loss_val,
-                           "d_valid_loss": d_loss_val,
-                           "valid_loss": loss_val,
-                           "valid_accuracy": acc_val}
-                else:
-                    log = {"epoch": epoch, "train_loss": loss,
-                           "train_accuracy": acc,
-                           "g_train_loss": g_loss,
-                           "d_train_loss": d_loss}
+        d_loss = d_loss_cum/(step+1)
+        g_loss = g_loss_cum/(step+1)
 
-                wandb.log(log)
+        return loss, acc, d_loss, g_loss
 
     def validate(self, val_dataset, val_batch_size=128):
         """
@@ -262,7 +381,8 @@ class AAE_combined_loss:
     Adversarial autoencoder with combined loss class
     """
 
-    def __init__(self, encoder, decoder, discriminator, optimizer, seed=None):
+    def __init__(self, encoder, decoder, discriminator, optimizer, seed=None,
+                 precision=None):
         """
         Constructor of adversarial autoencoder class
 
@@ -273,14 +393,21 @@ class AAE_combined_loss:
             optimizer (tf.keras.optimizers.Optimizer): Optimization method
             seed (int, optional): Seed that will be used wherever possible.
                                   Defaults to None.
+            precision (str, optional): Mixed precision of the networks and
+                                       the data fed to them, "float16" or
+                                       "bfloat16", see
+                                       `ddganAE.models.precision`. Defaults
+                                       to None, i.e. float32.
         """
-        self.encoder = encoder
-        self.decoder = decoder
-        self.discriminator = discriminator
+        self.encoder = mixed_model(encoder, precision)
+        self.decoder = mixed_model(decoder, precision)
+        self.discriminator = mixed_model(discriminator, precision)
         self.seed = seed
         self.latent_dim = self.decoder.layers[0].input_shape[1]
 
-        self.optimizer = optimizer
+        self.precision = precision
+        self.optimizer = mixed_optimizer(optimizer, precision)
+        self.engine = None
 
     def compile(self, input_shape):
         """
@@ -315,15 +442,21 @@ class AAE_combined_loss:
 
     def train(self, train_data, epochs, val_data=None,
               batch_size=128, val_batch_size=128, wandb_log=False,
-              n_discriminator=5):
+              n_discriminator=5, compiled=False, jit_compile=False,
+              strategy=None, checkpoint=None, resume=False, sinks=None,
+              timer=None):
         """
         Training model with combined loss strategy
 
         Args:
-            train_data (np.ndarray): Train dataset
+            train_data (np.ndarray or str): Train dataset, or the path of a
+                                            `.npy` file with it which is read
+                                            memory-mapped
             epochs (int): Number of training epochs to execute
-            val_data (np.ndarray, optional): Validation dataset. Defaults to
-                                             None.
+            val_data (np.ndarray or str, optional): Validation dataset, or
+                                                    the path of a `.npy` file
+                                                    with it. Defaults to
+                                                    None.
             batch_size (int, optional): Training batch size. Defaults to 128.
             val_batch_size (int, optional): Validation batch size. Defaults to
                                             128.
@@ -331,92 +464,175 @@ class AAE_combined_loss:
                                         function needs to be called in
                                         wandb.init() scope for this to work.
                                         Defaults to False.
+            n_discriminator (int, optional): Interval at which the encoder
+                                             and decoder are trained, i.e.
+                                             every `n_discriminator` batches.
+                                             Defaults to 5.
+            compiled (bool, optional): Whether to train and validate with the
+                                       compiled steps of a
+                                       `Combined_loss_engine`. Defaults to
+                                       False.
+            jit_compile (bool, optional): Whether to compile the steps with
+                                          XLA, requires compiled=True.
+                                          Defaults to False.
+            strategy (tf.distribute.Strategy, optional): Strategy of
+                                                         data-parallel
+                                                         training, in whose
+                                                         scope the model is
+                                                         constructed and
+                                                         compiled, see
+                                                         `distribute`. The
+                                                         batch sizes are
+                                                         per worker,
+                                                         requires
+                                                         compiled=True.
+                                                         Defaults to None.
+            checkpoint (Training_checkpoint, optional): Checkpoints of
+                                                        the training
+                                                        state, see
+                                                        `checkpoint`.
+                                                        Defaults to None.
+            resume (bool, optional): Whether to resume from the latest
+                                     checkpoint, if any, until `epochs`
+                                     epochs are done in total. Defaults to
+                                     False.
+            sinks (list, optional): Sinks of the metrics of every epoch,
+                                    which are written in the background, see
+                                    `sinks`. Defaults to None, i.e.
+                                    TensorBoard logs in a timestamped
+                                    directory under "logs/".
+            timer (Phase_timer, optional): Instrumentation of the epochs,
+                                           whose metrics are written to the
+                                           sinks, see `timing`. Defaults to
+                                           None.
         """
 
+        if jit_compile and not compiled:
+            raise NotImplementedError("XLA compilation requires "
+                                      "compiled=True")
+
+        check_strategy(strategy, self.seed, compiled, jit_compile)
+
+        if compiled and self.engine is None:
+            with strategy_scope(strategy):
+                self.engine = Combined_loss_engine(
+                    self.encoder, self.decoder, self.discriminator,
+                    self.optimizer, seed=self.seed)
+
         d_loss_val = g_loss_val = None
+        shard = worker_shard(strategy)
 
-        train_dataset = tf.data.Dataset.from_tensor_slices(train_data)
-        train_dataset = train_dataset.shuffle(buffer_size=train_data.shape[0],
-                                              reshuffle_each_iteration=True,
-                                              seed=self.seed).\
-            batch(batch_size, drop_remainder=True)
+        dtype = host_dtype(self.precision)
+        train_batches = Sample_batches(train_data, self.seed, dtype)
+        train_dataset = train_batches.dataset(batch_size, drop_remainder=True,
+                                              shard=shard)
 
+        val_batches = None
         if val_data is not None:
-            val_dataset = tf.data.Dataset.from_tensor_slices(val_data)
-            val_dataset = val_dataset.shuffle(
-                buffer_size=val_data.shape[0],
-                reshuffle_each_iteration=True,
-                seed=self.seed).\
-                batch(val_batch_size, drop_remainder=True)
-
-        # Set up tensorboard logging
-        current_time = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
-        train_log_dir = 'logs/' + current_time + '/train'
-        val_log_dir = 'logs/' + current_time + '/val'
-        train_summary_writer = tf.summary.create_file_writer(train_log_dir)
-        val_summary_writer = tf.summary.create_file_writer(val_log_dir)
+            val_batches = Sample_batches(val_data, self.seed, dtype)
+            val_dataset = val_batches.dataset(
+                val_batch_size, drop_remainder=True, shard=shard)
+
+        sink = training_sink(sinks, wandb_log, strategy)
+
+        timer = phase_timer(timer)
+        timer.start()
+        train_dataset = timer.count(train_dataset)
 
         # Adversarial ground truths
         valid = np.ones((batch_size, 1))
         fake = np.zeros((batch_size, 1))
 
-        for epoch in range(epochs):
+        start = 0
+        if checkpoint is not None:
+            start = checkpoint.bind(self, [train_batches, val_batches],
+                                    strategy, resume)
+
+        for epoch in range(start, epochs):
+
+            with timer.phase("train"):
+                if compiled:
+                    d_loss, g_loss = self.engine.train_epoch(
+                        train_dataset, n_discriminator=n_discriminator,
+                        n_gradient_ascent=None, jit_compile=jit_compile)
+                else:
+                    d_loss, g_loss = self._train_epoch(
+                        train_dataset, valid, fake, n_discriminator, timer)
+
+            sink.write(epoch, "train", {"g_loss": g_loss, "d_loss": d_loss})
+
+            # Calculate the accuracies on the validation set
+            if val_data is not None:
+                with timer.phase("validation"):
+                    if compiled:
+                        d_loss_val, g_loss_val = self.engine.validate(
+                            val_dataset, jit_compile=jit_compile)
+                    else:
+                        d_loss_val, g_loss_val = self.validate(
+                            val_dataset, val_batch_size)
+
+                sink.write(epoch, "val", {"g_loss": g_loss_val,
+                                          "d_loss": d_loss_val})
+
+            if checkpoint is not None:
+                with timer.phase("checkpoint"):
+                    checkpoint.save(epoch + 1, epochs)
+
+            timer.write(sink, epoch)
+
+        timer.stop()
+        sink.close()
+
+    def _train_epoch(self, train_dataset, valid, fake, n_discriminator,
+                     timer=None):
+        """
+        Train for one epoch with separate discriminator updates on the real
+        and fake latent variables
+
+        Args:
+            train_dataset (tf.data.Dataset): Batches of grids
+            valid (np.ndarray): Labels of real latent variables
+            fake (np.ndarray): Labels of fake latent variables
+            n_discriminator (int): Interval of the generator updates
+            timer (Phase_timer, optional): Timer of the input and the
+                                           phases. Defaults to None.
+
+        Returns:
+            tuple: Mean discriminator and generator loss
+        """
+        timer = phase_timer(timer)
 
-            # Regularization phase
-            d_loss_cum = 0
-            g_loss_cum = 0
-            g_step = 0
-            step = 0
-            for step, grids in enumerate(train_dataset):
+        # Regularization phase
+        d_loss_cum = 0
+        g_loss_cum = 0
+        g_step = 0
+        step = 0
+        for step, grids in enumerate(timer.batches(train_dataset)):
 
+            with timer.phase("encoder"):
                 latent_fake = self.encoder.predict(grids)
-                latent_real = np.random.normal(size=(batch_size,
-                                                     self.latent_dim))
+            latent_real = np.random.normal(size=(len(valid),
+                                                 self.latent_dim))
 
-                # Train the discriminator
+            # Train the discriminator
+            with timer.phase("discriminator"):
                 d_loss_real = self.discriminator.train_on_batch(latent_real,
                                                                 valid)[0]
                 d_loss_fake = self.discriminator.train_on_batch(latent_fake,
                                                                 fake)[0]
-                d_loss_cum += 0.5 * np.add(d_loss_real, d_loss_fake)
-
-                if step % n_discriminator == 0:
-
-                    g_loss_cum += \
-                        self.adversarial_autoencoder.train_on_batch(grids,
-                                                                    [grids,
-                                                                     valid])[0]
-                    g_step += 1
+            d_loss_cum += 0.5 * np.add(d_loss_real, d_loss_fake)
 
-            d_loss = d_loss_cum/(step+1)
-            g_loss = g_loss_cum/(g_step+1)
+            if step % n_discriminator == 0:
 
-            with train_summary_writer.as_default():
-                tf.summary.scalar('loss - g', g_loss, step=epoch)
-                tf.summary.scalar('loss - d', d_loss, step=epoch)
+                with timer.phase("generator"):
+                    g_loss_cum += self.adversarial_autoencoder.train_on_batch(
+                        grids, [grids, valid])[0]
+                g_step += 1
 
-            # Calculate the accuracies on the validation set
-            if val_data is not None:
-                d_loss_val, g_loss_val = self.validate(val_dataset,
-                                                       val_batch_size)
-
-                with val_summary_writer.as_default():
-                    tf.summary.scalar('loss - g', g_loss_val, step=epoch)
-                    tf.summary.scalar('loss - d', d_loss_val, step=epoch)
-
-            if wandb_log:
-                if val_data is not None:
-                    log = {"epoch": epoch,
-                           "g_train_loss": g_loss,
-                           "d_train_loss": d_loss,
-                           "g_valid_loss": g_loss_val,
-                           "d_valid_loss": d_loss_val}
-                else:
-                    log = {"epoch": epoch,
-                           "g_train_loss": g_loss,
-                           "d_train_loss": d_loss}
+        d_loss = d_loss_cum/(step+1)
+        g_loss = g_loss_cum/(g_step+1)
 
-                wandb.log(log)
+        return d_loss, g_loss
 
     def validate(self, val_dataset, val_batch_size=128):
         """
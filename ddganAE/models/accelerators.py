@@ -0,0 +1,210 @@
+"""
+
+Accelerators for the inner (Schwarz) iterations of the predictive rollouts.
+Within a timestep the rollout is a fixed-point iteration x = G(x) over the
+predicted subdomains, where G is one sweep over all subdomains. An
+accelerator maps the current iterate and the result of the sweep to the next
+iterate, such that the converged state is reached in fewer sweeps and hence
+fewer network evaluations.
+
+All accelerators act on states of shape (nscenarios, ndomains, nvars) and
+treat every scenario independently.
+
+"""
+
+import numpy as np
+
+__author__ = "Zef Wolffs"
+__credits__ = []
+__license__ = "MIT"
+__version__ = "1.0.0"
+__maintainer__ = "Zef Wolffs"
+__email__ = "zefwolffs@gmail.com"
+__status__ = "Development"
+
+
+class SOR:
+    """
+    Successive overrelaxation between two iterates with a fixed factor. With
+    the default factor of 1 the result of the sweep is taken as is, which is
+    the plain fixed-point iteration.
+    """
+
+    def __init__(self, omega=1):
+        """
+        Constructor
+
+        Args:
+            omega (float, optional): Relaxation factor. Defaults to 1.
+        """
+        self.omega = omega
+
+    def reset(self):
+        """
+        Start a new timestep
+        """
+
+    def __call__(self, x, gx):
+        """
+        Compute the next iterate
+
+        Args:
+            x (np.ndarray): Current iterate
+            gx (np.ndarray): Result of a sweep starting from `x`
+
+        Returns:
+            np.ndarray: Next iterate
+        """
+        if self.omega == 1:
+            return gx
+
+        return x + self.omega * (gx - x)
+
+
+class Aitken:
+    """
+    Adaptive relaxation with Aitken's delta-squared method, where the
+    relaxation factor is updated every iteration from the last two residuals
+    r = G(x) - x.
+    """
+
+    def __init__(self, omega=1, omega_max=2):
+        """
+        Constructor
+
+        Args:
+            omega (float, optional): Relaxation factor of the first iteration
+                                     in a timestep. Defaults to 1.
+            omega_max (float, optional): Largest absolute relaxation factor.
+                                         Defaults to 2.
+        """
+        self.omega_init = omega
+        self.omega_max = omega_max
+        self.reset()
+
+    def reset(self):
+        """
+        Start a new timestep
+        """
+        self.omega = None
+        self.residual = None
+
+    def __call__(self, x, gx):
+        """
+        Compute the next iterate
+
+        Args:
+            x (np.ndarray): Current iterate
+            gx (np.ndarray): Result of a sweep starting from `x`
+
+        Returns:
+            np.ndarray: Next iterate
+        """
+        residual = (gx - x).reshape(len(x), -1)
+
+        if self.residual is None:
+            self.omega = np.full(len(x), float(self.omega_init))
+        else:
+            diff = residual - self.residual
+            norm = np.sum(diff ** 2, axis=1)
+            # Keep the factor where the residual did not change
+            update = norm > 0
+            self.omega[update] = -self.omega[update] * \
+                np.sum(self.residual * diff, axis=1)[update] / norm[update]
+            self.omega = np.clip(self.omega, -self.omega_max, self.omega_max)
+
+        self.residual = residual
+
+        return x + self.omega[:, None, None] * (gx - x)
+
+
+class Anderson:
+    """
+    Anderson mixing over the last `m` iterates of the full subdomain state.
+    The next iterate is the combination of the previous iterates and sweeps
+    that minimizes the linearized residual in a least-squares sense.
+    """
+
+    def __init__(self, m=5, beta=1):
+        """
+        Constructor
+
+        Args:
+            m (int, optional): Number of previous iterates to mix. Defaults to
+                               5.
+            beta (float, optional): Mixing (relaxation) factor. Defaults to 1.
+        """
+        self.m = m
+        self.beta = beta
+        self.reset()
+
+    def reset(self):
+        """
+        Start a new timestep
+        """
+        self.x = None
+        self.residual = None
+        self.dx = []
+        self.dr = []
+
+    def __call__(self, x, gx):
+        """
+        Compute the next iterate
+
+        Args:
+            x (np.ndarray): Current iterate
+            gx (np.ndarray): Result of a sweep starting from `x`
+
+        Returns:
+            np.ndarray: Next iterate
+        """
+        x_flat = x.reshape(len(x), -1)
+        residual = (gx - x).reshape(len(x), -1)
+
+        if self.x is not None:
+            self.dx = (self.dx + [x_flat - self.x])[-self.m:]
+            self.dr = (self.dr + [residual - self.residual])[-self.m:]
+
+        self.x = x_flat
+        self.residual = residual
+
+        out = x_flat + self.beta * residual
+        if self.dx:
+            dx = np.stack(self.dx, axis=-1)
+            dr = np.stack(self.dr, axis=-1)
+
+            for s in range(len(x)):
+                gamma = np.linalg.lstsq(dr[s], residual[s], rcond=None)[0]
+                out[s] -= (dx[s] + self.beta * dr[s]) @ gamma
+
+        return out.reshape(x.shape)
+
+
+ACCELERATORS = {"sor": SOR, "aitken": Aitken, "anderson": Anderson}
+
+
+def get_accelerator(accelerator=None):
+    """
+    Get an accelerator by name
+
+    Args:
+        accelerator (str or object, optional): One of "sor", "aitken" or
+                                               "anderson", in which case the
+                                               accelerator is created with
+                                               default settings, or an
+                                               accelerator instance. Defaults
+                                               to None, i.e. plain SOR.
+
+    Returns:
+        object: Accelerator
+    """
+    if accelerator is None:
+        return SOR()
+
+    if isinstance(accelerator, str):
+        if accelerator not in ACCELERATORS:
+            raise ValueError("Unknown accelerator '%s', choose one of %s" %
+                             (accelerator, ", ".join(ACCELERATORS)))
+        return ACCELERATORS[accelerator]()
+
+    return accelerator
@@ -7,9 +7,14 @@ Convolutional autoencoder model.
 from keras.layers import Input
 from keras.models import Model
 from ddganAE.utils import mse_PI
-import tensorflow as tf
-import datetime
-import wandb
+from ddganAE.preprocessing import Sample_batches
+from ddganAE.models.precision import mixed_model, mixed_optimizer, \
+    host_dtype, cast_data
+from ddganAE.models.engine import Autoencoder_engine
+from ddganAE.models.distribute import check_strategy, worker_shard, \
+    run_epoch, strategy_scope
+from ddganAE.models.sinks import training_sink
+from ddganAE.models.timing import phase_timer
 
 # Import get snapshots for "infinite" training with data generation for every n
 # training steps
@@ -31,7 +36,8 @@ class CAE:
     Convolutional autoencoder class
     """
 
-    def __init__(self, encoder, decoder, optimizer, seed=None):
+    def __init__(self, encoder, decoder, optimizer, seed=None,
+                 precision=None):
         """
         Constructor of convolutional autoencoder class
 
@@ -41,13 +47,20 @@ class CAE:
             optimizer (tf.keras.optimizers.Optimizer): Optimization method
             seed (int, optional): Seed that will be used wherever possible.
                                   Defaults to None.
+            precision (str, optional): Mixed precision of the networks and
+                                       the data fed to them, "float16" or
+                                       "bfloat16", see
+                                       `ddganAE.models.precision`. Defaults
+                                       to None, i.e. float32.
         """
-        self.encoder = encoder
-        self.decoder = decoder
+        self.encoder = mixed_model(encoder, precision)
+        self.decoder = mixed_model(decoder, precision)
         self.seed = seed
         self.latent_dim = self.decoder.layers[0].input_shape[1]
 
-        self.optimizer = optimizer
+        self.precision = precision
+        self.optimizer = mixed_optimizer(optimizer, precision)
+        self.engine = None
 
     def compile(self, input_shape, pi_loss=False):
         """
@@ -77,15 +90,22 @@ class CAE:
                                  metrics=['accuracy'])
 
     def train(self, train_data, epochs, val_data=None, batch_size=128,
-              val_batch_size=128, wandb_log=False):
+              val_batch_size=128, wandb_log=False, strategy=None,
+              compiled=False, jit_compile=False, accumulate=1,
+              recompute=False, checkpoint=None, resume=False, sinks=None,
+              timer=None):
         """
         Training convolutional autoencoder model
 
         Args:
-            train_data (np.ndarray): Train dataset
+            train_data (np.ndarray or str): Train dataset, or the path of a
+                                            `.npy` file with it which is read
+                                            memory-mapped
             epochs (int): Number of training epochs to execute
-            val_data (np.ndarray, optional): Validation dataset. Defaults to
-                                             None.
+            val_data (np.ndarray or str, optional): Validation dataset, or
+                                                    the path of a `.npy` file
+                                                    with it. Defaults to
+                                                    None.
             batch_size (int, optional): Training batch size. Defaults to 128.
             val_batch_size (int, optional): Validation batch size. Defaults to
                                             128.
@@ -93,67 +113,159 @@ class CAE:
                                         function needs to be called in
                                         wandb.init() scope for this to work.
                                         Defaults to False.
+            strategy (tf.distribute.Strategy, optional): Strategy of
+                                                         data-parallel
+                                                         training, in whose
+                                                         scope the model is
+                                                         constructed and
+                                                         compiled, see
+                                                         `distribute`. The
+                                                         batch sizes are
+                                                         per worker.
+                                                         Defaults to None.
+            compiled (bool, optional): Whether to train and validate with the
+                                       compiled steps of an
+                                       `Autoencoder_engine`. Defaults to
+                                       False.
+            jit_compile (bool, optional): Whether to compile the steps with
+                                          XLA, requires compiled=True.
+                                          Defaults to False.
+            accumulate (int, optional): Number of micro-batches every batch
+                                        is split into, whose gradients are
+                                        accumulated before a single update,
+                                        such that only batch_size /
+                                        accumulate grids pass through the
+                                        networks at once, requires
+                                        compiled=True. Defaults to 1.
+            recompute (bool, optional): Whether to recompute the activations
+                                        of the encoder and decoder in the
+                                        backward pass instead of storing
+                                        them, requires compiled=True.
+                                        Defaults to False.
+            checkpoint (Training_checkpoint, optional): Checkpoints of
+                                                        the training
+                                                        state, see
+                                                        `checkpoint`.
+                                                        Defaults to None.
+            resume (bool, optional): Whether to resume from the latest
+                                     checkpoint, if any, until `epochs`
+                                     epochs are done in total. Defaults to
+                                     False.
+            sinks (list, optional): Sinks of the metrics of every epoch,
+                                    which are written in the background, see
+                                    `sinks`. Defaults to None, i.e.
+                                    TensorBoard logs in a timestamped
+                                    directory under "logs/".
+            timer (Phase_timer, optional): Instrumentation of the epochs,
+                                           whose metrics are written to the
+                                           sinks, see `timing`. Defaults to
+                                           None.
         """
+        if (jit_compile or accumulate > 1 or recompute) and not compiled:
+            raise NotImplementedError("XLA compilation, gradient "
+                                      "accumulation and recomputation "
+                                      "require compiled=True")
+
+        check_strategy(strategy, self.seed, jit_compile=jit_compile)
+
+        if compiled:
+            if self.engine is None:
+                with strategy_scope(strategy):
+                    self.engine = Autoencoder_engine(
+                        self.encoder, self.decoder, self.optimizer,
+                        loss=self.autoencoder.loss)
+            self.engine.accumulate = accumulate
+            self.engine.recompute = recompute
+
         loss_val = None
+        shard = worker_shard(strategy)
 
-        train_dataset = tf.data.Dataset.from_tensor_slices(train_data)
-        train_dataset = train_dataset.shuffle(buffer_size=train_data.shape[0],
-                                              reshuffle_each_iteration=True,
-                                              seed=self.seed).\
-            batch(batch_size)
+        dtype = host_dtype(self.precision)
+        train_batches = Sample_batches(train_data, self.seed, dtype)
+        train_dataset = train_batches.dataset(batch_size, shard=shard)
 
+        val_batches = None
         if val_data is not None:
-            val_dataset = tf.data.Dataset.from_tensor_slices(val_data)
-            val_dataset = val_dataset.shuffle(
-                buffer_size=val_data.shape[0],
-                reshuffle_each_iteration=True,
-                seed=self.seed).\
-                batch(val_batch_size)
-
-        # Set up tensorboard logging
-        current_time = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
-        train_log_dir = 'logs/' + current_time + '/train'
-        val_log_dir = 'logs/' + current_time + '/val'
-        train_summary_writer = tf.summary.create_file_writer(train_log_dir)
-        val_summary_writer = tf.summary.create_file_writer(val_log_dir)
-
-        for epoch in range(epochs):
-            loss_cum = 0
-            acc_cum = 0
-            for step, grids in enumerate(train_dataset):
-
-                # Train the autoencoder reconstruction
-                loss, acc = self.autoencoder.train_on_batch(grids, grids)
-                loss_cum += loss
-                acc_cum += acc
-
-            # Average the loss and accuracy over the entire dataset
-            loss = loss_cum/(step+1)
-            acc = acc_cum/step
-
-            with train_summary_writer.as_default():
-                tf.summary.scalar('loss', loss, step=epoch)
-                tf.summary.scalar('accuracy', acc, step=epoch)
+            val_batches = Sample_batches(val_data, self.seed, dtype)
+            val_dataset = val_batches.dataset(val_batch_size, shard=shard)
+
+        sink = training_sink(sinks, wandb_log, strategy)
+
+        timer = phase_timer(timer)
+        timer.start()
+        train_dataset = timer.count(train_dataset)
+
+        start = 0
+        if checkpoint is not None:
+            start = checkpoint.bind(self, [train_batches, val_batches],
+                                    strategy, resume)
+
+        for epoch in range(start, epochs):
+            with timer.phase("train"):
+                if compiled:
+                    loss, acc = self.engine.train_epoch(
+                        train_dataset, jit_compile=jit_compile)
+                elif strategy is not None:
+                    loss, acc = run_epoch(self.autoencoder, train_dataset.map(
+                        lambda grids: (grids, grids)))
+                else:
+                    loss, acc = self._train_epoch(train_dataset, timer)
+
+            sink.write(epoch, "train", {"loss": loss, "accuracy": acc})
 
             # Calculate the accuracies on the validation set
             if val_data is not None:
-                loss_val, acc_val = self.validate(val_dataset)
-
-                with val_summary_writer.as_default():
-                    tf.summary.scalar('loss', loss_val, step=epoch)
-                    tf.summary.scalar('accuracy', acc_val, step=epoch)
-
-            if wandb_log:
-                if val_data is not None:
-                    log = {"epoch": epoch, "train_loss": loss,
-                           "train_accuracy": acc,
-                           "valid_loss": loss_val,
-                           "valid_accuracy": acc_val}
-                else:
-                    log = {"epoch": epoch, "train_loss": loss,
-                           "train_accuracy": acc}
+                with timer.phase("validation"):
+                    if compiled:
+                        loss_val, acc_val = self.engine.validate(
+                            val_dataset, jit_compile=jit_compile)
+                    elif strategy is not None:
+                        loss_val, acc_val = run_epoch(
+                            self.autoencoder,
+                            val_dataset.map(lambda grids: (grids, grids)),
+                            training=False)
+                    else:
+                        loss_val, acc_val = self.validate(val_dataset)
+
+                sink.write(epoch, "val", {"loss": loss_val,
+                                          "accuracy": acc_val})
+
+            if checkpoint is not None:
+                with timer.phase("checkpoint"):
+                    checkpoint.save(epoch + 1, epochs)
+
+            timer.write(sink, epoch)
+
+        timer.stop()
+        sink.close()
+
+    def _train_epoch(self, train_dataset, timer=None):
+        """
+        Train for one epoch with a `train_on_batch` call per batch
+
+        Args:
+            train_dataset (tf.data.Dataset): Batches of grids
+            timer (Phase_timer, optional): Timer of the input. Defaults to
+                                           None.
+
+        Returns:
+            tuple: Mean loss and accuracy
+        """
+        loss_cum = 0
+        acc_cum = 0
+        for step, grids in enumerate(phase_timer(timer).batches(
+                train_dataset)):
 
-                wandb.log(log)
+            # Train the autoencoder reconstruction
+            loss, acc = self.autoencoder.train_on_batch(grids, grids)
+            loss_cum += loss
+            acc_cum += acc
+
+        # Average the loss and accuracy over the entire dataset
+        loss = loss_cum/(step+1)
+        acc = acc_cum/step
+
+        return loss, acc
 
     def validate(self, val_dataset):
         """
@@ -199,7 +311,7 @@ class CAE:
         """
         pass
 
-    def predict(self, data):
+    def predict(self, data, backend=None):
         """
         Convenience function that gives class predict method that just does
         forward pass through model.
@@ -207,9 +319,16 @@ class CAE:
         Args:
             data (np.ndarray): Input grids that are to be reconstructed by this
                                model
+            backend (callable, optional): Callable that replaces the Keras
+                                          model, e.g. a TFLite runtime from
+                                          `ddganAE.backends.from_tflite`.
+                                          Defaults to None.
 
         Returns:
             np.ndarray: Reconstructed grids
         """
 
-        return self.autoencoder.predict(data)
+        if backend is not None:
+            return backend(data)
+
+        return self.autoencoder.predict(cast_data(data, self.precision))
@@ -0,0 +1,171 @@
+"""
+
+Checkpoints of the full training state of the models, such that preempted
+training jobs continue where they stopped rather than restart. Besides the
+weights of the networks, a checkpoint holds the state of the optimizers and
+of the compiled engines, including the random number generators of their
+priors, the epoch counters of the input pipelines, which seed the order and
+augmentation of every epoch, the global NumPy random state, the number of
+completed epochs, the POD basis of `SVDAE` and optionally a scaler of the
+data.
+
+Checkpoints are written by a `tf.train.CheckpointManager`, which only points
+to a checkpoint once it is completely written, such that a job that is killed
+while checkpointing resumes from the previous one. Every `train` method takes
+a checkpoint and whether to resume from it:
+
+    checkpoint = Training_checkpoint("checkpoints", interval=5)
+    model.train(data, 1000, checkpoint=checkpoint, resume=True)
+
+The same call starts from scratch if there is no checkpoint yet, and
+otherwise continues until 1000 epochs are done in total. The stateful random
+operations of Keras layers, such as dropout and Gaussian noise, are not part
+of the state, unlike the noise of a `Stencil_augmentation`.
+
+"""
+
+import pickle
+import shutil
+import os
+import numpy as np
+import tensorflow as tf
+from ddganAE.models.distribute import is_chief, worker_shard
+
+__author__ = "Zef Wolffs"
+__credits__ = []
+__license__ = "MIT"
+__version__ = "1.0.0"
+__maintainer__ = "Zef Wolffs"
+__email__ = "zefwolffs@gmail.com"
+__status__ = "Development"
+
+# Attributes of the models that are checkpointed as TensorFlow objects
+TRACKED_ATTRIBUTES = ("encoder", "decoder", "discriminator", "optimizer",
+                      "engine")
+
+# Attributes of the models that are pickled, if present
+PICKLED_ATTRIBUTES = ("R", "S")
+
+
+class Training_checkpoint:
+    """
+    Periodic checkpoints of the training state of a model in a directory
+    """
+
+    def __init__(self, directory, interval=1, max_to_keep=2, scaler=None):
+        """
+        Constructor
+
+        Args:
+            directory (str): Directory of the checkpoints
+            interval (int, optional): Interval in epochs at which to write a
+                                      checkpoint, the last epoch of a `train`
+                                      call is always written. Defaults to 1.
+            max_to_keep (int, optional): Number of checkpoints to keep.
+                                         Defaults to 2.
+            scaler (object, optional): Picklable scaler of the data, e.g. a
+                                       fitted `MinMaxScaler`, which is stored
+                                       with the checkpoints and restored into
+                                       this attribute. Defaults to None.
+        """
+        self.directory = directory
+        self.interval = interval
+        self.max_to_keep = max_to_keep
+        self.scaler = scaler
+
+        # Pickled Python state, such that it is written along atomically
+        self._state = tf.Variable(b"", trainable=False)
+
+        self._model = None
+        self._manager = None
+        self._strategy = None
+
+    def bind(self, model, pipelines=(), strategy=None, resume=False):
+        """
+        Bind to the training state of a model and optionally restore it from
+        the latest checkpoint. Call after the engines of the model are
+        constructed, the state of the optimizers is restored as soon as it
+        is created.
+
+        Args:
+            model (object): Model, e.g. a `CAE`
+            pipelines (list, optional): Input pipelines with an epoch counter,
+                                        e.g. `Sample_batches`, in a fixed
+                                        order, None for absent ones. Defaults
+                                        to ().
+            strategy (tf.distribute.Strategy, optional): Strategy of
+                                                         data-parallel
+                                                         training, all
+                                                         workers read the
+                                                         checkpoints and the
+                                                         chief writes them.
+                                                         Defaults to None.
+            resume (bool, optional): Whether to restore the latest
+                                     checkpoint, if any. Defaults to False.
+
+        Returns:
+            int: Number of completed epochs of the restored checkpoint, 0 if
+                 none was restored
+        """
+        objects = {name: getattr(model, name) for name in TRACKED_ATTRIBUTES
+                   if getattr(model, name, None) is not None}
+        objects.update({"pipeline_%d" % i: pipeline.epoch
+                        for i, pipeline in enumerate(pipelines)
+                        if pipeline is not None})
+
+        checkpoint = tf.train.Checkpoint(state=self._state, **objects)
+
+        directory = self.directory
+        if not is_chief(strategy):
+            # Saving may involve all workers, the others write elsewhere
+            directory = os.path.join(directory,
+                                     "worker_%d" % worker_shard(strategy)[0])
+
+        self._model = model
+        self._strategy = strategy
+        self._manager = tf.train.CheckpointManager(checkpoint, directory,
+                                                   self.max_to_keep)
+
+        path = tf.train.latest_checkpoint(self.directory)
+        if not resume or path is None:
+            return 0
+
+        # The engines of models that train without them are absent
+        checkpoint.restore(path).expect_partial()
+
+        state = pickle.loads(self._state.numpy())
+        for name, value in state["attributes"].items():
+            setattr(model, name, value)
+        np.random.set_state(state["numpy_random_state"])
+        self.scaler = state["scaler"]
+
+        return state["epoch"]
+
+    def save(self, epoch, epochs=None):
+        """
+        Write a checkpoint after an epoch, if it is due
+
+        Args:
+            epoch (int): Number of completed epochs
+            epochs (int, optional): Number of epochs of the training, whose
+                                    last one is always written. Defaults to
+                                    None.
+        """
+        if self._manager is None:
+            raise RuntimeError("Bind the checkpoint to a model first")
+
+        if epoch % self.interval != 0 and epoch != epochs:
+            return
+
+        self._state.assign(pickle.dumps({
+            "epoch": epoch,
+            "attributes": {name: getattr(self._model, name)
+                           for name in PICKLED_ATTRIBUTES
+                           if hasattr(self._model, name)},
+            "numpy_random_state": np.random.get_state(),
+            "scaler": self.scaler}))
+
+        self._manager.save(checkpoint_number=epoch)
+
+        if not is_chief(self._strategy):
+            shutil.rmtree(self._manager.directory, ignore_errors=True)
@@ -0,0 +1,310 @@
+"""
+
+Data-parallel training in multiple processes, e.g. on the CPUs of a node.
+Every worker trains a replica of the networks on its own shard of the data,
+and the gradients of every update, also of the discriminator updates, are
+averaged over all workers by a `tf.distribute.MultiWorkerMirroredStrategy`
+before they are applied. `launch` starts the workers as local processes,
+while on a cluster the workers are described by the `TF_CONFIG` environment
+variable of every process as usual.
+
+The networks are built, and the models constructed and compiled, within the
+scope of the strategy, after which the models train with it:
+
+    def worker(strategy, data):
+        batch_size, learning_rate = scale_hyperparameters(
+            128, 1e-4, strategy.num_replicas_in_sync, "sqrt")
+
+        with strategy.scope():
+            encoder, decoder = build_dense_encoder_decoder(...)
+            model = CAE(encoder, decoder, Adam(learning_rate), seed=42)
+            model.compile(input_shape)
+
+        model.train(data, 100, batch_size=batch_size, strategy=strategy)
+
+    launch(worker, 4, args=(data,))
+
+The batch size passed to `train` is that of every worker. All workers shuffle
+alike and take disjoint parts of equal size of every epoch, such that the
+models require a seed, and the adversarial models train distributed with
+their compiled engines only.
+
+"""
+
+import multiprocessing
+import contextlib
+import traceback
+import weakref
+import socket
+import json
+import os
+import numpy as np
+import tensorflow as tf
+
+__author__ = "Zef Wolffs"
+__credits__ = []
+__license__ = "MIT"
+__version__ = "1.0.0"
+__maintainer__ = "Zef Wolffs"
+__email__ = "zefwolffs@gmail.com"
+__status__ = "Development"
+
+SCALING_RULES = ("linear", "sqrt", "constant")
+
+# Compiled epochs of the Keras models, see `run_epoch`
+_epoch_functions = weakref.WeakKeyDictionary()
+
+
+def scale_hyperparameters(batch_size, learning_rate, workers, rule="linear"):
+    """
+    Batch size of every worker and learning rate of data-parallel training,
+    from those of training in a single process
+
+    Args:
+        batch_size (int): Batch size in a single process
+        learning_rate (float): Learning rate in a single process
+        workers (int): Number of workers
+        rule (str, optional): Scaling rule, "linear" keeps the batch size of
+                              every worker and scales the learning rate with
+                              the number of workers as the global batch size
+                              grows, "sqrt" does the same but scales the
+                              learning rate with the square root, which tends
+                              to suit Adam better, and "constant" splits the
+                              batch over the workers and keeps the learning
+                              rate. Defaults to "linear".
+
+    Returns:
+        tuple: Batch size of every worker and learning rate
+    """
+    if rule == "linear":
+        return batch_size, learning_rate * workers
+    if rule == "sqrt":
+        return batch_size, learning_rate * np.sqrt(workers)
+    if rule == "constant":
+        return max(1, batch_size // workers), learning_rate
+
+    raise ValueError("Unknown scaling rule '%s', choose one of %s" %
+                     (rule, ", ".join(SCALING_RULES)))
+
+
+def _free_ports(n):
+    """
+    Ports on the local host that are free at the moment
+    """
+    sockets = [socket.socket() for _ in range(n)]
+    for s in sockets:
+        s.bind(("localhost", 0))
+    ports = [s.getsockname()[1] for s in sockets]
+    for s in sockets:
+        s.close()
+
+    return ports
+
+
+def _worker(target, args, cluster, index, threads, queue):
+    """
+    Entry point of a worker process started by `launch`
+    """
+    os.environ["TF_CONFIG"] = json.dumps(
+        {"cluster": cluster, "task": {"type": "worker", "index": index}})
+
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(threads)
+
+        strategy = tf.distribute.MultiWorkerMirroredStrategy()
+        queue.put((index, target(strategy, *args), None))
+    except Exception:
+        # The other workers wait for this one in their collectives, so the
+        # launching process has to know
+        queue.put((index, None, traceback.format_exc()))
+
+
+def launch(target, workers, args=(), threads=None):
+    """
+    Run a function in local worker processes with a
+    `MultiWorkerMirroredStrategy` over all of them. The function, its
+    arguments and its return value are pickled, so the function has to be
+    defined at module level.
+
+    Args:
+        target (callable): Function that takes the strategy and the
+                           arguments, builds and trains the model within the
+                           strategy
+        workers (int): Number of worker processes
+        args (tuple, optional): Further arguments of the function. Defaults
+                                to ().
+        threads (int, optional): Threads of the operations of every worker.
+                                 Defaults to None, i.e. the available CPUs
+                                 divided over the workers.
+
+    Returns:
+        object: Return value of the function in the first worker
+    """
+    if threads is None:
+        if hasattr(os, "sched_getaffinity"):
+            cpus = len(os.sched_getaffinity(0))
+        else:
+            cpus = os.cpu_count()
+        threads = max(1, cpus // workers)
+
+    cluster = {"worker": ["localhost:%d" % port
+                          for port in _free_ports(workers)]}
+
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    processes = [context.Process(target=_worker,
+                                 args=(target, args, cluster, index, threads,
+                                       queue))
+                 for index in range(workers)]
+
+    for process in processes:
+        process.start()
+
+    results = {}
+    try:
+        for _ in processes:
+            index, result, error = queue.get()
+            if error is not None:
+                raise RuntimeError("Worker %d failed:\n%s" % (index, error))
+            results[index] = result
+    finally:
+        for process in processes:
+            if len(results) < workers:
+                process.terminate()
+            process.join()
+
+    return results[0]
+
+
+def worker_shard(strategy=None):
+    """
+    Shard of the data of the worker of a strategy
+
+    Args:
+        strategy (tf.distribute.Strategy, optional): Strategy. Defaults to
+                                                     None, i.e. training in
+                                                     a single process.
+
+    Returns:
+        tuple: Index of the worker and number of workers, or None without
+               strategy
+    """
+    if strategy is None:
+        return None
+
+    resolver = strategy.cluster_resolver
+    workers = resolver.cluster_spec().as_dict().get("worker", [None])
+
+    return resolver.task_id or 0, len(workers)
+
+
+def is_chief(strategy=None):
+    """
+    Whether this process logs the results, i.e. trains without strategy or
+    is the first worker
+
+    Args:
+        strategy (tf.distribute.Strategy, optional): Strategy. Defaults to
+                                                     None.
+
+    Returns:
+        bool: Whether chief
+    """
+    return strategy is None or worker_shard(strategy)[0] == 0
+
+
+def check_strategy(strategy, seed, compiled=True, jit_compile=False):
+    """
+    Raise an error for training settings that do not distribute
+
+    Args:
+        strategy (tf.distribute.Strategy): Strategy, or None
+        seed (int): Seed of the model
+        compiled (bool, optional): Whether the training is compiled. Defaults
+                                   to True.
+        jit_compile (bool, optional): Whether the steps are compiled with XLA.
+                                      Defaults to False.
+    """
+    if strategy is None:
+        return
+
+    if seed is None:
+        raise ValueError("Distributed training requires a seed, such that "
+                         "all workers shuffle the data alike")
+    if not compiled:
+        raise NotImplementedError("Distributed training requires "
+                                  "compiled=True")
+    if jit_compile:
+        raise NotImplementedError("XLA compilation of distributed training "
+                                  "is not supported")
+
+
+def strategy_scope(strategy=None):
+    """
+    Scope of a strategy, to construct the engines of the models in
+
+    Args:
+        strategy (tf.distribute.Strategy, optional): Strategy. Defaults to
+                                                     None.
+
+    Returns:
+        object: Context manager, which does nothing without strategy
+    """
+    if strategy is None:
+        return contextlib.nullcontext()
+
+    return strategy.scope()
+
+
+def distribute_dataset(strategy, dataset):
+    """
+    Distributed dataset with the batches of a worker as they are, i.e.
+    without the splitting and sharding of `experimental_distribute_dataset`
+
+    Args:
+        strategy (tf.distribute.Strategy): Strategy
+        dataset (tf.data.Dataset): Batches of the shard of the worker
+
+    Returns:
+        tf.distribute.DistributedDataset: Dataset
+    """
+    return strategy.distribute_datasets_from_function(lambda _: dataset)
+
+
+def run_epoch(model, dataset, training=True):
+    """
+    Run the training or test steps of a compiled Keras model over the
+    batches of the worker, for the models that train with `train_on_batch`
+    in a single process. The gradients are averaged over the workers by the
+    optimizer and the metrics over the workers when they are read.
+
+    Args:
+        model (tf.keras.Model): Model compiled within the scope of a strategy
+        dataset (tf.data.Dataset): Batches of samples and targets of the
+                                   shard of the worker
+        training (bool, optional): Whether to train, otherwise only
+                                   evaluate. Defaults to True.
+
+    Returns:
+        tuple: Mean loss and metrics
+    """
+    functions = _epoch_functions.setdefault(model, {})
+
+    if training not in functions:
+        strategy = model.distribute_strategy
+        step = model.train_step if training else model.test_step
+
+        @tf.function
+        def epoch(dataset):
+            for data in dataset:
+                strategy.run(step, args=(data,))
+
+        functions[training] = epoch
+
+    model.reset_metrics()
+    functions[training](distribute_dataset(model.distribute_strategy,
+                                           dataset))
+
+    return tuple(float(value)
+                 for value in model.get_metrics_result().values())
@@ -0,0 +1,1038 @@
+"""
+
+Compiled training engines of the autoencoder models. Instead of separate
+`train_on_batch` calls per update, with the latent variables and the samples
+of the Gaussian prior passing through the host in between, an engine runs the
+updates of a batch in one graph. The prior is sampled with a TensorFlow random
+number generator, real and fake latent variables are classified as one
+batch by the discriminator, and the losses are accumulated in metric
+trackers such that nothing leaves the device until the end of an epoch.
+
+For batches of large grids, the engines of `CAE` and `AAE` can accumulate the
+gradients of a batch over micro-batches and recompute the activations of the
+networks in the backward pass, which lowers the peak memory at the cost of
+time.
+
+Engines that are constructed within the scope of a distribution strategy
+run every step on the replicas of the strategy, see
+`ddganAE.models.distribute`.
+
+"""
+
+import numpy as np
+import tensorflow as tf
+from ddganAE.models.distribute import distribute_dataset
+
+__author__ = "Zef Wolffs"
+__credits__ = []
+__license__ = "MIT"
+__version__ = "1.0.0"
+__maintainer__ = "Zef Wolffs"
+__email__ = "zefwolffs@gmail.com"
+__status__ = "Development"
+
+
+def clone_optimizer(optimizer):
+    """
+    Fresh optimizer with the configuration of another one. Every update of an
+    engine has its own optimizer, as the optimizers of Keras are bound to the
+    variables they were first applied to.
+
+    Args:
+        optimizer (tf.keras.optimizers.Optimizer): Optimizer to clone
+
+    Returns:
+        tf.keras.optimizers.Optimizer: Optimizer without state
+    """
+    return optimizer.__class__.from_config(optimizer.get_config())
+
+
+def build_optimizer(optimizer, variables):
+    """
+    Create the state of an optimizer for a set of variables in advance, such
+    that the optimizer can be applied within a conditional branch of a graph
+
+    Args:
+        optimizer (tf.keras.optimizers.Optimizer): Optimizer
+        variables (list of tf.Variable): Variables it will be applied to
+    """
+    if isinstance(optimizer, tf.keras.optimizers.legacy.Optimizer):
+        optimizer._create_all_weights(variables)
+    else:
+        optimizer.build(variables)
+
+
+def compute_gradients(optimizer, tape, loss, variables):
+    """
+    Gradients of a loss, scaled if the optimizer does loss scaling for mixed
+    precision. Within the replicas of a distribution strategy, the optimizer
+    sums the gradients over the replicas, such that the loss is divided by
+    their number to average them.
+
+    Args:
+        optimizer (tf.keras.optimizers.Optimizer): Optimizer
+        tape (tf.GradientTape): Tape that recorded the loss
+        loss (tf.Tensor): Loss
+        variables (list of tf.Variable): Variables to differentiate to
+
+    Returns:
+        list of tf.Tensor: Unscaled gradients
+    """
+    replicas = tf.distribute.get_replica_context().num_replicas_in_sync
+    if replicas > 1:
+        with tape:
+            loss = loss / replicas
+
+    if hasattr(optimizer, "get_scaled_loss"):
+        # Record the scaling on the same tape
+        with tape:
+            scaled_loss = optimizer.get_scaled_loss(loss)
+        return optimizer.get_unscaled_gradients(
+            tape.gradient(scaled_loss, variables))
+
+    return tape.gradient(loss, variables)
+
+
+def apply_gradients(optimizer, tape, loss, variables):
+    """
+    Apply the gradients of a loss, see `compute_gradients`
+
+    Args:
+        optimizer (tf.keras.optimizers.Optimizer): Optimizer
+        tape (tf.GradientTape): Tape that recorded the loss
+        loss (tf.Tensor): Loss
+        variables (list of tf.Variable): Variables to update
+    """
+    optimizer.apply_gradients(zip(
+        compute_gradients(optimizer, tape, loss, variables), variables))
+
+
+def recompute_segments(model, segments=None):
+    """
+    Forward pass of a network in training mode that keeps only the inputs of
+    a few segments of consecutive layers for the backward pass, in which the
+    activations within every segment are recomputed. This trades about one
+    extra forward pass for the memory of the activations, of which only those
+    of one segment are held at a time.
+
+    Args:
+        model (tf.keras.Model): Sequential model, other models form a single
+                                segment
+        segments (int, optional): Number of segments. Defaults to None, i.e.
+                                  the square root of the number of layers.
+
+    Returns:
+        callable: Function of the input that returns the output
+    """
+    if isinstance(model, tf.keras.Sequential):
+        layers = model.layers
+    else:
+        layers = [model]
+
+    if segments is None:
+        segments = int(np.sqrt(len(layers)))
+    size = -(-len(layers) // max(1, segments))
+
+    def segment(layers):
+        @tf.recompute_grad
+        def forward(x):
+            for layer in layers:
+                x = layer(x, training=True)
+            return x
+
+        return forward
+
+    forwards = [segment(layers[i:i + size])
+                for i in range(0, len(layers), size)]
+
+    def call(x):
+        for forward in forwards:
+            x = forward(x)
+        return x
+
+    return call
+
+
+def prior_generator(seed=None):
+    """
+    Random number generator of the samples of the Gaussian prior
+
+    Args:
+        seed (int, optional): Seed. Defaults to None.
+
+    Returns:
+        tf.random.Generator: Generator
+    """
+    if seed is None:
+        return tf.random.Generator.from_non_deterministic_state()
+    return tf.random.Generator.from_seed(seed)
+
+
+def accuracy(y_true, y_pred):
+    """
+    The "accuracy" metric that Keras selects for targets of the same shape as
+    the predictions
+
+    Args:
+        y_true (tf.Tensor): Targets
+        y_pred (tf.Tensor): Predictions
+
+    Returns:
+        tf.Tensor: Mean accuracy
+    """
+    if y_pred.shape[-1] == 1:
+        return tf.reduce_mean(tf.keras.metrics.binary_accuracy(y_true,
+                                                               y_pred))
+    return tf.reduce_mean(tf.keras.metrics.categorical_accuracy(y_true,
+                                                                y_pred))
+
+
+@tf.__internal__.tracking.no_automatic_dependency_tracking
+def _reset_functions(engine):
+    """
+    Empty the cache of compiled functions of an engine, which is not tracked,
+    such that it is not part of the checkpointed state
+    """
+    engine._functions = {}
+
+
+class Autoencoder_engine(tf.keras.Model):
+    """
+    Compiled reconstruction training of an autoencoder, see `CAE`. The
+    gradients of a batch can be accumulated over micro-batches before the
+    update, such that only a micro-batch passes through the networks at once,
+    and the activations of the networks can be recomputed in the backward
+    pass instead of being stored, see `recompute_segments`. Both trade time
+    for memory, for batches of large grids.
+    """
+
+    def __init__(self, encoder, decoder, optimizer, loss="mse", accumulate=1,
+                 recompute=False):
+        """
+        Constructor
+
+        Args:
+            encoder (tf.keras.Model): Encoder model
+            decoder (tf.keras.Model): Decoder model
+            optimizer (tf.keras.optimizers.Optimizer): Optimization method,
+                                                       cloned for every
+                                                       update
+            loss (str or callable, optional): Reconstruction loss. Defaults
+                                              to "mse".
+            accumulate (int, optional): Number of micro-batches a batch is
+                                        split into. Defaults to 1.
+            recompute (bool, optional): Whether to recompute the activations
+                                        in the backward pass. Defaults to
+                                        False.
+        """
+        super().__init__()
+
+        self.encoder = encoder
+        self.decoder = decoder
+        self.latent_dim = self.decoder.layers[0].input_shape[1]
+        self.loss_function = tf.keras.losses.get(loss)
+
+        self.accumulate = accumulate
+        self.recompute = recompute
+        self._recomputed_encoder = recompute_segments(self.encoder)
+        self._recomputed_decoder = recompute_segments(self.decoder)
+
+        self.ae_optimizer = clone_optimizer(optimizer)
+
+        # Whether constructed within the scope of a distribution strategy
+        self.distributed = tf.distribute.has_strategy()
+
+        self.loss_tracker = tf.keras.metrics.Mean("loss")
+        self.acc_tracker = tf.keras.metrics.Mean("accuracy")
+
+        _reset_functions(self)
+
+    @property
+    def metrics(self):
+        return [self.loss_tracker, self.acc_tracker]
+
+    def encode(self, x, training=False):
+        """
+        Forward pass of the encoder, with recomputation in training mode if
+        enabled
+
+        Args:
+            x (tf.Tensor): Batch of samples
+            training (bool, optional): Whether in training mode. Defaults to
+                                       False.
+
+        Returns:
+            tf.Tensor: Latent variables
+        """
+        if training and self.recompute:
+            return self._recomputed_encoder(x)
+        return self.encoder(x, training=training)
+
+    def decode(self, latent, training=False):
+        """
+        Forward pass of the decoder, with recomputation in training mode if
+        enabled
+
+        Args:
+            latent (tf.Tensor): Batch of latent variables
+            training (bool, optional): Whether in training mode. Defaults to
+                                       False.
+
+        Returns:
+            tf.Tensor: Output
+        """
+        if training and self.recompute:
+            return self._recomputed_decoder(latent)
+        return self.decoder(latent, training=training)
+
+    def call(self, grids, training=False):
+        return self.decode(self.encode(grids, training=training),
+                           training=training)
+
+    def accumulate_gradients(self, optimizer, loss_function, x, variables):
+        """
+        Update variables on the mean of a loss over a batch. With
+        accumulation the batch is split into `accumulate` micro-batches, and
+        the gradients of their losses, weighted by their sizes, are summed
+        before a single update. Only the given variables are watched, such
+        that the activations of other networks are not kept.
+
+        Args:
+            optimizer (tf.keras.optimizers.Optimizer): Optimizer
+            loss_function (callable): Mean loss of a (micro-)batch
+            x (tf.Tensor): Batch
+            variables (list of tf.Variable): Variables to update
+
+        Returns:
+            tf.Tensor: Mean loss of the batch
+        """
+        if self.accumulate == 1:
+            with tf.GradientTape(watch_accessed_variables=False) as tape:
+                tape.watch(variables)
+                loss = loss_function(x)
+
+            apply_gradients(optimizer, tape, loss, variables)
+            return loss
+
+        batch_size = tf.shape(x)[0]
+        size = -(-batch_size // self.accumulate)
+
+        loss = tf.constant(0.)
+        gradients = [tf.zeros_like(v) for v in variables]
+        for start in tf.range(0, batch_size, size):
+            micro = x[start:start + size]
+            weight = tf.cast(tf.shape(micro)[0] / batch_size, tf.float32)
+
+            with tf.GradientTape(watch_accessed_variables=False) as tape:
+                tape.watch(variables)
+                micro_loss = tf.cast(loss_function(micro), tf.float32) * \
+                    weight
+
+            gradients = [g if mg is None else g + mg for g, mg in
+                         zip(gradients, compute_gradients(
+                             optimizer, tape, micro_loss, variables))]
+            loss += micro_loss
+
+        optimizer.apply_gradients(zip(gradients, variables))
+
+        return loss
+
+    def reconstruction_loss(self, grids, training=False):
+        """
+        Reconstruction loss of a batch, which also updates the accuracy
+
+        Args:
+            grids (tf.Tensor): Batch of grids
+            training (bool, optional): Whether in training mode. Defaults to
+                                       False.
+
+        Returns:
+            tf.Tensor: Loss
+        """
+        reconstructed = self(grids, training=training)
+        self.acc_tracker.update_state(accuracy(grids, reconstructed))
+
+        return tf.reduce_mean(self.loss_function(grids, reconstructed))
+
+    def reconstruction_step(self, grids):
+        """
+        Update the encoder and decoder on the reconstruction loss
+
+        Args:
+            grids (tf.Tensor): Batch of grids
+        """
+        grids = tf.cast(grids, self.compute_dtype)
+        variables = self.encoder.trainable_variables + \
+            self.decoder.trainable_variables
+
+        loss = self.accumulate_gradients(
+            self.ae_optimizer,
+            lambda x: self.reconstruction_loss(x, training=True), grids,
+            variables)
+
+        self.loss_tracker.update_state(loss)
+
+    def train_step(self, grids):
+        """
+        Reconstruction update of one batch, also used by `fit`
+
+        Args:
+            grids (tf.Tensor): Batch of grids
+
+        Returns:
+            dict: Current values of the metrics
+        """
+        self.reconstruction_step(grids)
+
+        return {m.name: m.result() for m in self.metrics}
+
+    def test_step(self, grids):
+        """
+        Reconstruction loss of a batch, without updates
+
+        Args:
+            grids (tf.Tensor): Batch of grids
+
+        Returns:
+            dict: Current values of the metrics
+        """
+        grids = tf.cast(grids, self.compute_dtype)
+        self.loss_tracker.update_state(self.reconstruction_loss(grids))
+
+        return {m.name: m.result() for m in self.metrics}
+
+    def _epoch_function(self, steps, jit_compile):
+        """
+        Compiled function that runs steps one after the other over a dataset
+        """
+        key = tuple(step.__name__ for step in steps), jit_compile, \
+            self.accumulate, self.recompute
+
+        if key not in self._functions:
+            if self.distributed:
+                # Steps that synchronise the replicas can not be nested
+                # functions
+                run = self.distribute_strategy.run
+                steps = [lambda grids, step=step: run(step, args=(grids,))
+                         for step in steps]
+            else:
+                steps = [tf.function(step, jit_compile=jit_compile)
+                         for step in steps]
+
+            @tf.function
+            def epoch(dataset):
+                for step in steps:
+                    for grids in dataset:
+                        step(grids)
+
+            self._functions[key] = epoch
+
+        return self._functions[key]
+
+    def _run_epoch(self, steps, dataset, jit_compile):
+        """
+        Run steps over a dataset and return the means of the metrics
+        """
+        for metric in self.metrics:
+            metric.reset_state()
+
+        if self.distributed:
+            dataset = distribute_dataset(self.distribute_strategy, dataset)
+
+        self._epoch_function(steps, jit_compile)(dataset)
+
+        return tuple(float(metric.result()) for metric in self.metrics)
+
+    def train_epoch(self, dataset, jit_compile=False):
+        """
+        Train for one epoch
+
+        Args:
+            dataset (tf.data.Dataset): Batches of grids
+            jit_compile (bool, optional): Whether to compile the steps with
+                                          XLA. Defaults to False.
+
+        Returns:
+            tuple: Mean loss and accuracy
+        """
+        return self._run_epoch([self.train_step], dataset, jit_compile)
+
+    def validate(self, dataset, jit_compile=False):
+        """
+        Validate on a dataset, with the losses accumulated in the graph
+
+        Args:
+            dataset (tf.data.Dataset): Batches of grids
+            jit_compile (bool, optional): Whether to compile the steps with
+                                          XLA. Defaults to False.
+
+        Returns:
+            tuple: Mean loss and accuracy
+        """
+        return self._run_epoch([self.test_step], dataset, jit_compile)
+
+
+class AAE_engine(Autoencoder_engine):
+    """
+    Compiled training steps of the adversarial autoencoder of the original
+    paper, see `AAE`. The reconstruction, discriminator and generator updates
+    either run in two passes over the data per epoch, as in `AAE.train`, or
+    fused into a single pass. Every update supports the accumulation and
+    recomputation of `Autoencoder_engine`.
+    """
+
+    def __init__(self, encoder, decoder, discriminator, optimizer, seed=None,
+                 accumulate=1, recompute=False):
+        """
+        Constructor
+
+        Args:
+            encoder (tf.keras.Model): Encoder model
+            decoder (tf.keras.Model): Decoder model
+            discriminator (tf.keras.Model): Discriminator model
+            optimizer (tf.keras.optimizers.Optimizer): Optimization method,
+                                                       cloned for every
+                                                       update
+            seed (int, optional): Seed of the prior samples. Defaults to None.
+            accumulate (int, optional): Number of micro-batches a batch is
+                                        split into. Defaults to 1.
+            recompute (bool, optional): Whether to recompute the activations
+                                        in the backward pass. Defaults to
+                                        False.
+        """
+        super().__init__(encoder, decoder, optimizer, accumulate=accumulate,
+                         recompute=recompute)
+
+        self.discriminator = discriminator
+
+        self.d_optimizer = clone_optimizer(optimizer)
+        self.g_optimizer = clone_optimizer(optimizer)
+
+        self.prior = prior_generator(seed)
+
+        # The discriminator is frozen for the models compiled by `AAE`, such
+        # that its trainable weights are empty
+        self.d_variables = [v for v in self.discriminator.weights
+                            if v.trainable]
+
+        self.d_loss_tracker = tf.keras.metrics.Mean("d_loss")
+        self.g_loss_tracker = tf.keras.metrics.Mean("g_loss")
+
+    @property
+    def metrics(self):
+        return [self.loss_tracker, self.acc_tracker, self.d_loss_tracker,
+                self.g_loss_tracker]
+
+    def discriminator_loss(self, grids, training=False):
+        """
+        Discriminator loss on one batch of real and fake latent variables
+
+        Args:
+            grids (tf.Tensor): Batch of grids
+            training (bool, optional): Whether in training mode. Defaults to
+                                       False.
+
+        Returns:
+            tf.Tensor: Loss
+        """
+        batch_size = tf.shape(grids)[0]
+
+        latent_fake = self.encoder(grids, training=False)
+        latent_real = self.prior.normal((batch_size, self.latent_dim),
+                                        dtype=latent_fake.dtype)
+        latents = tf.concat([latent_real, latent_fake], 0)
+        labels = tf.concat([tf.ones((batch_size, 1)),
+                            tf.zeros((batch_size, 1))], 0)
+
+        return tf.reduce_mean(tf.keras.losses.binary_crossentropy(
+            labels, self.discriminator(latents, training=training)))
+
+    def generator_loss(self, grids, training=False):
+        """
+        Loss of the encoder on fooling the discriminator
+
+        Args:
+            grids (tf.Tensor): Batch of grids
+            training (bool, optional): Whether in training mode. Defaults to
+                                       False.
+
+        Returns:
+            tf.Tensor: Loss
+        """
+        valid = self.discriminator(self.encode(grids, training=training),
+                                   training=False)
+
+        return tf.reduce_mean(tf.keras.losses.binary_crossentropy(
+            tf.ones_like(valid), valid))
+
+    def regularization_step(self, grids):
+        """
+        Update the discriminator on one batch of real and fake latent
+        variables, followed by the encoder on fooling the discriminator
+
+        Args:
+            grids (tf.Tensor): Batch of grids
+        """
+        grids = tf.cast(grids, self.compute_dtype)
+
+        d_loss = self.accumulate_gradients(
+            self.d_optimizer,
+            lambda x: self.discriminator_loss(x, training=True), grids,
+            self.d_variables)
+
+        g_loss = self.accumulate_gradients(
+            self.g_optimizer,
+            lambda x: self.generator_loss(x, training=True), grids,
+            self.encoder.trainable_variables)
+
+        self.d_loss_tracker.update_state(d_loss)
+        self.g_loss_tracker.update_state(g_loss)
+
+    def train_step(self, grids):
+        """
+        Fused reconstruction and regularization updates of one batch, also
+        used by `fit`
+
+        Args:
+            grids (tf.Tensor): Batch of grids
+
+        Returns:
+            dict: Current values of the metrics
+        """
+        self.reconstruction_step(grids)
+        self.regularization_step(grids)
+
+        return {m.name: m.result() for m in self.metrics}
+
+    def test_step(self, grids):
+        """
+        Reconstruction, discriminator and generator loss of a batch, without
+        updates
+
+        Args:
+            grids (tf.Tensor): Batch of grids
+
+        Returns:
+            dict: Current values of the metrics
+        """
+        grids = tf.cast(grids, self.compute_dtype)
+        batch_size = tf.shape(grids)[0]
+
+        latent_fake = self.encoder(grids, training=False)
+        reconstructed = self.decoder(latent_fake, training=False)
+        latent_real = self.prior.normal((batch_size, self.latent_dim),
+                                        dtype=latent_fake.dtype)
+        labels = tf.concat([tf.ones((batch_size, 1)),
+                            tf.zeros((batch_size, 1))], 0)
+        valid = self.discriminator(latent_fake, training=False)
+
+        self.loss_tracker.update_state(
+            tf.reduce_mean(self.loss_function(grids, reconstructed)))
+        self.acc_tracker.update_state(accuracy(grids, reconstructed))
+        self.d_loss_tracker.update_state(tf.reduce_mean(
+            tf.keras.losses.binary_crossentropy(
+                labels, self.discriminator(tf.concat([latent_real,
+                                                      latent_fake], 0),
+                                           training=False))))
+        self.g_loss_tracker.update_state(tf.reduce_mean(
+            tf.keras.losses.binary_crossentropy(tf.ones_like(valid), valid)))
+
+        return {m.name: m.result() for m in self.metrics}
+
+    def train_epoch(self, dataset, fused=False, jit_compile=False):
+        """
+        Train for one epoch
+
+        Args:
+            dataset (tf.data.Dataset): Batches of grids
+            fused (bool, optional): Whether to do all updates of a batch at
+                                    once, in a single pass over the data.
+                                    Defaults to False, i.e. a reconstruction
+                                    pass followed by a regularization pass.
+            jit_compile (bool, optional): Whether to compile the steps with
+                                          XLA. Defaults to False.
+
+        Returns:
+            tuple: Mean reconstruction loss and accuracy, discriminator loss
+                   and generator loss
+        """
+        if fused:
+            steps = [self.train_step]
+        else:
+            steps = [self.reconstruction_step, self.regularization_step]
+
+        return self._run_epoch(steps, dataset, jit_compile)
+
+    def validate(self, dataset, jit_compile=False):
+        """
+        Validate on a dataset, with the losses accumulated in the graph
+
+        Args:
+            dataset (tf.data.Dataset): Batches of grids
+            jit_compile (bool, optional): Whether to compile the steps with
+                                          XLA. Defaults to False.
+
+        Returns:
+            tuple: Mean reconstruction loss and accuracy, discriminator loss
+                   and generator loss
+        """
+        return self._run_epoch([self.test_step], dataset, jit_compile)
+
+
+class Combined_loss_engine(tf.keras.Model):
+    """
+    Compiled training and validation steps of the adversarial models that
+    train the encoder and decoder on a weighted sum of the reconstruction or
+    prediction loss and the adversarial loss, see `AAE_combined_loss` and
+    `Predictive_adversarial`. The discriminator is updated on every batch,
+    optionally with swapped labels every `n_gradient_ascent` batches, and the
+    encoder and decoder every `n_discriminator` batches. This scheduling
+    happens in the graph, based on the step counter. Batches are either grids,
+    which are then also the targets, or tuples of samples and targets.
+    """
+
+    def __init__(self, encoder, decoder, discriminator, optimizer, seed=None,
+                 loss_weights=(0.999, 0.001)):
+        """
+        Constructor
+
+        Args:
+            encoder (tf.keras.Model): Encoder model
+            decoder (tf.keras.Model): Decoder model
+            discriminator (tf.keras.Model): Discriminator model
+            optimizer (tf.keras.optimizers.Optimizer): Optimization method,
+                                                       cloned for every
+                                                       update
+            seed (int, optional): Seed of the prior samples. Defaults to None.
+            loss_weights (tuple, optional): Weights of the reconstruction and
+                                            adversarial loss. Defaults to
+                                            (0.999, 0.001).
+        """
+        super().__init__()
+
+        self.encoder = encoder
+        self.decoder = decoder
+        self.discriminator = discriminator
+        self.latent_dim = self.decoder.layers[0].input_shape[1]
+        self.loss_weights = loss_weights
+
+        self.prior = prior_generator(seed)
+
+        # Whether constructed within the scope of a distribution strategy
+        self.distributed = tf.distribute.has_strategy()
+
+        # The discriminator is frozen for the combined model, such that its
+        # trainable weights are empty
+        self.d_variables = [v for v in self.discriminator.weights
+                            if v.trainable]
+        self.g_variables = self.encoder.trainable_variables + \
+            self.decoder.trainable_variables
+
+        self.d_optimizer = clone_optimizer(optimizer)
+        self.g_optimizer = clone_optimizer(optimizer)
+        build_optimizer(self.g_optimizer, self.g_variables)
+
+        self.d_loss_tracker = tf.keras.metrics.Mean("d_loss")
+        self.g_loss_tracker = tf.keras.metrics.Mean("g_loss")
+
+        _reset_functions(self)
+
+    @property
+    def metrics(self):
+        return [self.d_loss_tracker, self.g_loss_tracker]
+
+    def call(self, x, training=False):
+        return self.decoder(self.encoder(x, training=training),
+                            training=training)
+
+    def unpack(self, data):
+        """
+        Samples and targets of a batch, cast to the compute data type
+
+        Args:
+            data (tf.Tensor or tuple): Batch of grids or of samples and
+                                       targets
+
+        Returns:
+            tuple: Samples and targets
+        """
+        if not isinstance(data, (tuple, list)):
+            data = (data, data)
+
+        return tuple(tf.cast(tensor, self.compute_dtype) for tensor in data)
+
+    def discriminator_loss(self, x, ascent=False, training=False):
+        """
+        Discriminator loss on one batch of real and fake latent variables
+
+        Args:
+            x (tf.Tensor): Batch of samples
+            ascent (tf.Tensor, optional): Whether to swap the labels, i.e. do
+                                          a step of gradient ascent. Defaults
+                                          to False.
+            training (bool, optional): Whether in training mode. Defaults to
+                                       False.
+
+        Returns:
+            tf.Tensor: Loss
+        """
+        batch_size = tf.shape(x)[0]
+
+        latent_fake = self.encoder(x, training=False)
+        latent_real = self.prior.normal((batch_size, self.latent_dim),
+                                        dtype=latent_fake.dtype)
+
+        real = tf.where(ascent, 0., 1.)
+        labels = tf.concat([tf.fill((batch_size, 1), real),
+                            tf.fill((batch_size, 1), 1 - real)], 0)
+
+        return tf.reduce_mean(tf.keras.losses.binary_crossentropy(
+            labels, self.discriminator(tf.concat([latent_real, latent_fake],
+                                                 0), training=training)))
+
+    def generator_loss(self, x, y, training=False):
+        """
+        Weighted sum of the reconstruction or prediction loss and the
+        adversarial loss
+
+        Args:
+            x (tf.Tensor): Batch of samples
+            y (tf.Tensor): Batch of targets
+            training (bool, optional): Whether in training mode. Defaults to
+                                       False.
+
+        Returns:
+            tf.Tensor: Loss
+        """
+        latent = self.encoder(x, training=training)
+        out = tf.reshape(self.decoder(latent, training=training), tf.shape(y))
+        valid = self.discriminator(latent, training=False)
+
+        return self.loss_weights[0] * tf.reduce_mean(tf.square(y - out)) + \
+            self.loss_weights[1] * tf.reduce_mean(
+                tf.keras.losses.binary_crossentropy(tf.ones_like(valid),
+                                                    valid))
+
+    def discriminator_step(self, data, ascent=False):
+        """
+        Update the discriminator on one batch of real and fake latent
+        variables
+
+        Args:
+            data (tf.Tensor or tuple): Batch of grids or of samples and
+                                       targets
+            ascent (tf.Tensor, optional): Whether to swap the labels, i.e. do
+                                          a step of gradient ascent. Defaults
+                                          to False.
+        """
+        x, _ = self.unpack(data)
+
+        with tf.GradientTape() as tape:
+            d_loss = self.discriminator_loss(x, ascent, training=True)
+
+        apply_gradients(self.d_optimizer, tape, d_loss, self.d_variables)
+        self.d_loss_tracker.update_state(d_loss)
+
+    def generator_step(self, data):
+        """
+        Update the encoder and decoder on the combined loss
+
+        Args:
+            data (tf.Tensor or tuple): Batch of grids or of samples and
+                                       targets
+
+        Returns:
+            tf.Tensor: Loss
+        """
+        x, y = self.unpack(data)
+
+        with tf.GradientTape() as tape:
+            g_loss = self.generator_loss(x, y, training=True)
+
+        apply_gradients(self.g_optimizer, tape, g_loss, self.g_variables)
+        self.g_loss_tracker.update_state(g_loss)
+
+        return g_loss
+
+    @staticmethod
+    def ascent(step, n_gradient_ascent):
+        """
+        Whether the discriminator does a step of gradient ascent, i.e. is
+        trained on swapped labels, which inhibits it from becoming too good
+
+        Args:
+            step (tf.Tensor): Step within the epoch
+            n_gradient_ascent (tf.Tensor): Interval of the steps of gradient
+                                           ascent, non-positive for never
+
+        Returns:
+            tf.Tensor: Whether to do gradient ascent
+        """
+        return tf.logical_and(n_gradient_ascent > 0,
+                              step % n_gradient_ascent == 0)
+
+    def train_step(self, data, step=0, n_discriminator=1,
+                   n_gradient_ascent=-1):
+        """
+        Discriminator update, followed by the generator update if it is due
+
+        Args:
+            data (tf.Tensor or tuple): Batch of grids or of samples and
+                                       targets
+            step (tf.Tensor, optional): Step within the epoch. Defaults to 0.
+            n_discriminator (tf.Tensor, optional): Interval of the generator
+                                                   updates. Defaults to 1.
+            n_gradient_ascent (tf.Tensor, optional): Interval of the steps of
+                                                     gradient ascent of the
+                                                     discriminator. Defaults
+                                                     to -1, i.e. never.
+
+        Returns:
+            dict: Current values of the metrics
+        """
+        self.discriminator_step(data, self.ascent(step, n_gradient_ascent))
+
+        tf.cond(step % n_discriminator == 0,
+                lambda: self.generator_step(data),
+                lambda: tf.constant(0., self.compute_dtype))
+
+        return {m.name: m.result() for m in self.metrics}
+
+    def test_step(self, data):
+        """
+        Discriminator and generator loss of a batch, without updates
+
+        Args:
+            data (tf.Tensor or tuple): Batch of grids or of samples and
+                                       targets
+
+        Returns:
+            dict: Current values of the metrics
+        """
+        x, y = self.unpack(data)
+
+        self.d_loss_tracker.update_state(self.discriminator_loss(x))
+        self.g_loss_tracker.update_state(self.generator_loss(x, y))
+
+        return {m.name: m.result() for m in self.metrics}
+
+    def _epoch_function(self, training, jit_compile):
+        """
+        Compiled function that runs the training or validation steps over a
+        dataset
+        """
+        if (training, jit_compile) not in self._functions:
+            if self.distributed:
+                epoch = self._distributed_epoch_function(training)
+            elif training:
+                train_step = tf.function(self.train_step,
+                                         jit_compile=jit_compile)
+
+                @tf.function
+                def epoch(dataset, n_discriminator, n_gradient_ascent):
+                    step = tf.constant(0, tf.int64)
+                    for data in dataset:
+                        train_step(data, step, n_discriminator,
+                                   n_gradient_ascent)
+                        step += 1
+            else:
+                test_step = tf.function(self.test_step,
+                                        jit_compile=jit_compile)
+
+                @tf.function
+                def epoch(dataset):
+                    for data in dataset:
+                        test_step(data)
+
+            self._functions[training, jit_compile] = epoch
+
+        return self._functions[training, jit_compile]
+
+    def _distributed_epoch_function(self, training):
+        """
+        Compiled function that runs the training or validation steps over a
+        distributed dataset. The steps run directly on the replicas, and the
+        generator updates are scheduled outside of them, as the updates
+        synchronise the replicas.
+        """
+        run = self.distribute_strategy.run
+
+        if training:
+            @tf.function
+            def epoch(dataset, n_discriminator, n_gradient_ascent):
+                step = tf.constant(0, tf.int64)
+                for data in dataset:
+                    run(self.discriminator_step,
+                        args=(data, self.ascent(step, n_gradient_ascent)))
+                    if step % n_discriminator == 0:
+                        run(self.generator_step, args=(data,))
+                    step += 1
+        else:
+            @tf.function
+            def epoch(dataset):
+                for data in dataset:
+                    run(self.test_step, args=(data,))
+
+        return epoch
+
+    def train_epoch(self, dataset, n_discriminator=5,
+                    n_gradient_ascent=np.inf, jit_compile=False):
+        """
+        Train for one epoch
+
+        Args:
+            dataset (tf.data.Dataset): Batches of grids or of samples and
+                                       targets
+            n_discriminator (int, optional): Interval of the generator
+                                             updates. Defaults to 5.
+            n_gradient_ascent (int, optional): Interval of the steps of
+                                               gradient ascent of the
+                                               discriminator, None for none.
+                                               Defaults to np.inf, i.e. only
+                                               the first step.
+            jit_compile (bool, optional): Whether to compile the steps with
+                                          XLA. Defaults to False.
+
+        Returns:
+            tuple: Mean discriminator and generator loss, the latter 0 if
+                   there was no generator update
+        """
+        for metric in self.metrics:
+            metric.reset_state()
+
+        if n_gradient_ascent is None:
+            n_gradient_ascent = -1
+        elif not np.isfinite(n_gradient_ascent):
+            n_gradient_ascent = np.iinfo(np.int64).max
+
+        if self.distributed:
+            dataset = distribute_dataset(self.distribute_strategy, dataset)
+
+        self._epoch_function(True, jit_compile)(
+            dataset, tf.constant(n_discriminator, tf.int64),
+            tf.constant(n_gradient_ascent, tf.int64))
+
+        return tuple(float(metric.result()) for metric in self.metrics)
+
+    def validate(self, dataset, jit_compile=False):
+        """
+        Validate on a dataset, with the losses accumulated in the graph
+
+        Args:
+            dataset (tf.data.Dataset): Batches of grids or of samples and
+                                       targets
+            jit_compile (bool, optional): Whether to compile the steps with
+                                          XLA. Defaults to False.
+
+        Returns:
+            tuple: Mean discriminator and generator loss
+        """
+        for metric in self.metrics:
+            metric.reset_state()
+
+        if self.distributed:
+            dataset = distribute_dataset(self.distribute_strategy, dataset)
+
+        self._epoch_function(False, jit_compile)(dataset)
+
+        return tuple(float(metric.result()) for metric in self.metrics)
@@ -0,0 +1,127 @@
+"""
+
+Mixed precision training and inference. The networks of a model are rebuilt
+with a Keras mixed precision policy, such that they compute in float16 or
+bfloat16 while keeping their variables in float32, and the output of every
+network is cast back to float32 for the losses. Optimizers are wrapped with
+dynamic loss scaling for float16, which has too small a range for the
+gradients, while bfloat16 has the range of float32 and needs none. The data
+that is held on the host and fed to the networks is stored at the same width.
+
+"""
+
+from keras.layers import Activation
+from keras.models import Model, Sequential
+import numpy as np
+import tensorflow as tf
+
+__author__ = "Zef Wolffs"
+__credits__ = []
+__license__ = "MIT"
+__version__ = "1.0.0"
+__maintainer__ = "Zef Wolffs"
+__email__ = "zefwolffs@gmail.com"
+__status__ = "Development"
+
+PRECISIONS = (None, "float16", "bfloat16")
+
+
+def check_precision(precision):
+    """
+    Raise an error for an unknown precision
+
+    Args:
+        precision (str): Precision, one of `PRECISIONS`
+    """
+    if precision not in PRECISIONS:
+        raise ValueError("Unknown precision '%s', choose one of %s" %
+                         (precision, ", ".join(map(str, PRECISIONS))))
+
+
+def host_dtype(precision, default=None):
+    """
+    Data type of the host-side data of a precision
+
+    Args:
+        precision (str): Precision, one of `PRECISIONS`
+        default (np.dtype, optional): Data type without mixed precision.
+                                      Defaults to None.
+
+    Returns:
+        np.dtype: Data type
+    """
+    check_precision(precision)
+
+    if precision is None:
+        return default
+
+    return tf.as_dtype(precision).as_numpy_dtype
+
+
+def mixed_model(model, precision):
+    """
+    Rebuild a model with a mixed precision policy and the same weights, if
+    it is built already. The output is cast to float32.
+
+    Args:
+        model (tf.keras.Model): Sequential or functional model
+        precision (str): Precision, one of `PRECISIONS`
+
+    Returns:
+        tf.keras.Model: Model with the mixed precision policy, or the model
+                        itself if precision is None
+    """
+    check_precision(precision)
+
+    if precision is None:
+        return model
+
+    policy = tf.keras.mixed_precision.Policy("mixed_" + precision)
+
+    def clone_layer(layer):
+        return layer.__class__.from_config({**layer.get_config(),
+                                            "dtype": policy})
+
+    clone = tf.keras.models.clone_model(model, clone_function=clone_layer)
+    if model.built:
+        clone.set_weights(model.get_weights())
+
+    cast = Activation("linear", dtype="float32")
+    if isinstance(clone, Sequential):
+        clone.add(cast)
+        return clone
+
+    return Model(clone.inputs, cast(clone.outputs[0]), name=clone.name)
+
+
+def mixed_optimizer(optimizer, precision):
+    """
+    Wrap an optimizer with dynamic loss scaling for float16
+
+    Args:
+        optimizer (tf.keras.optimizers.Optimizer): Optimizer
+        precision (str): Precision, one of `PRECISIONS`
+
+    Returns:
+        tf.keras.optimizers.Optimizer: Optimizer
+    """
+    check_precision(precision)
+
+    if precision != "float16" or hasattr(optimizer, "get_scaled_loss"):
+        return optimizer
+
+    return tf.keras.mixed_precision.LossScaleOptimizer(optimizer)
+
+
+def cast_data(data, precision):
+    """
+    Cast data at the width of a precision
+
+    Args:
+        data (np.ndarray): Data
+        precision (str): Precision, one of `PRECISIONS`
+
+    Returns:
+        np.ndarray: Data, not copied without mixed precision
+    """
+    return np.asarray(data, dtype=host_dtype(precision, data.dtype))
@@ -10,15 +10,25 @@ time in this project.
 
 """
 
-from keras.layers import Input, Conv1D, GaussianNoise
+from keras.layers import Input, Conv1D
 from keras.models import Model
 import keras
 import tensorflow as tf
 from sklearn.model_selection import train_test_split
-import datetime
 import numpy as np
-import wandb
 import os
+from ddganAE.backends import Numpy_mlp
+from ddganAE.models.engine import Combined_loss_engine
+from ddganAE.preprocessing import stencil_dataset, Stencil_windows, \
+    Sample_batches, Stencil_augmentation, latent_std
+from ddganAE.models.rollout import rollout, stream_rollout, \
+    parareal_rollout, load_checkpoint
+from ddganAE.models.precision import mixed_model, mixed_optimizer, \
+    host_dtype, cast_data
+from ddganAE.models.distribute import check_strategy, worker_shard, \
+    strategy_scope, run_epoch
+from ddganAE.models.sinks import training_sink
+from ddganAE.models.timing import phase_timer
 
 __author__ = "Zef Wolffs"
 __credits__ = []
@@ -29,12 +39,435 @@ __email__ = "zefwolffs@gmail.com"
 __status__ = "Development"
 
 
-class Predictive_adversarial:
+def _stream_datasets(input_data, interval, increment, val_size, val_data,
+                     batch_size, val_batch_size, seed, dtype=None,
+                     shard=None):
+    """
+    Lazy training and validation datasets of the predictive models, see
+    `Stencil_windows`. The split with val_size equals that of the
+    materialised samples. Increments are differences of close values and are
+    therefore best gathered from data at full width.
+
+    Returns:
+        tuple: Training and validation dataset, the latter None if there is
+               no validation, and the list of their pipelines
+    """
+    windows = Stencil_windows(input_data, interval, increment, dtype)
+    train_indices = windows.indices
+    val_dataset = None
+    pipelines = [windows]
+
+    if val_size > 0:
+        train_indices, val_indices = train_test_split(
+            windows.indices, test_size=val_size, random_state=seed)
+        val_dataset = windows.dataset(val_batch_size, val_indices, seed=seed,
+                                      shard=shard)
+    elif val_data is not None:
+        pipelines.append(Stencil_windows(val_data, interval, increment,
+                                         dtype))
+        val_dataset = pipelines[-1].dataset(val_batch_size, seed=seed,
+                                            shard=shard)
+
+    return windows.dataset(batch_size, train_indices, seed=seed,
+                           shard=shard), val_dataset, pipelines
+
+
+def _augmentation(data, noise_std, noise_scaled, reverse, seed):
+    """
+    Augmentation of the training batches of the predictive models, see
+    `Stencil_augmentation`, with the noise scaled by the standard deviations
+    of the latent variables in the data if `noise_scaled`
+
+    Returns:
+        Stencil_augmentation: Augmentation, None if there is none
+    """
+    if noise_std == 0 and reverse == 0:
+        return None
+
+    return Stencil_augmentation(noise_std,
+                                latent_std(data) if noise_scaled else None,
+                                reverse, seed)
+
+
+class Predictive_rollouts:
+    """
+    Rollouts of the predictive models in time, shared by
+    `Predictive_adversarial` and `Predictive`, which provide the forward pass
+    of their networks in `_forward`
+    """
+
+    def predict(self, boundaries, init_values, timesteps, iters=5, sor=1,
+                pre_interval=False, timestep_print_interval=None,
+                save_interval=None, save_path=None, sweep="gauss-seidel",
+                tol=None, return_info=False, compiled=False,
+                jit_compile=False, checkpoint_path=None,
+                checkpoint_interval=100, scaler=None, resume=False,
+                accelerator=None, predictor=None, parareal_slices=None,
+                coarse_iters=1, parareal_tol=1e-6, workers=None,
+                backend=None):
+        """
+        Predict in time using boundaries and initial values for a certain
+        number of timesteps. The timestep shifts will be done in this function
+
+        Args:
+            boundaries (np.ndarray): Boundaries in shape
+                                     (nboundaries (2), nvars, ntimesteps).
+                                     An ensemble of scenarios is predicted
+                                     together if a leading axis is added,
+                                     i.e. shape (nscenarios, 2, nvars,
+                                     ntimesteps)
+            init_values (np.ndarray): Initial values in shape (ngrids, nvars)
+                                      or (nscenarios, ngrids, nvars)
+            timesteps (int): Number of timesteps to predict
+            iters (int): Maximum number of iterations to do before a
+                         prediction. Defaults to 5.
+            sor (float): Successive overrelaxation factor. Defaults to 1.
+            pre_interval (bool): Whether intervals have already been applied
+                                 outside of this function. If False, this
+                                 function will do it. Defaults to False.
+            timestep_print_interval: Interval at which to print the current
+                                     timestep to see progress, defaults to
+                                     None.
+            sweep (str, optional): Order in which subdomains are updated in
+                                   an iteration. "gauss-seidel" does a forward
+                                   and backward sweep over single subdomains,
+                                   "jacobi" and "red-black" update all or
+                                   every other subdomain in one batched
+                                   forward pass. Defaults to "gauss-seidel".
+            tol (float, optional): Stop iterating within a timestep once the
+                                   largest change of the predicted values
+                                   between two iterations drops below this
+                                   tolerance. Defaults to None, i.e. always do
+                                   `iters` iterations.
+            return_info (bool, optional): Whether to also return a dictionary
+                                          with the number of iterations
+                                          ("iters") and final residual
+                                          ("residuals") per timestep. Defaults
+                                          to False.
+            compiled (bool, optional): Whether to trace every timestep,
+                                       including all iterations, into a single
+                                       `tf.function`. Defaults to False.
+            jit_compile (bool, optional): Whether to additionally compile the
+                                          traced timestep with XLA. Defaults
+                                          to False.
+            checkpoint_path (str, optional): Path of a `.npz` rollout
+                                             checkpoint holding the last
+                                             three timesteps, the state of
+                                             the predictor, the step index,
+                                             the interval and the scaler.
+                                             Defaults to None.
+            checkpoint_interval (int, optional): Interval in timesteps at
+                                                 which the checkpoint is
+                                                 written. Defaults to 100.
+            scaler (object, optional): Scaler of the data, stored in the
+                                       checkpoint such that the predictions
+                                       can be transformed back after a
+                                       restart. Defaults to None.
+            resume (bool, optional): Whether to resume from
+                                     `checkpoint_path` if it exists.
+                                     Timesteps before the checkpoint are
+                                     returned as zeros, use `predict_iter`
+                                     with `out_path` to keep them on disk.
+                                     Defaults to False.
+            accelerator (str or object, optional): Accelerator of the
+                                                   iterations within a
+                                                   timestep, "sor",
+                                                   "aitken", "anderson" or
+                                                   an accelerator instance,
+                                                   see `ddganAE.models.
+                                                   accelerators`. Not
+                                                   supported if `compiled`
+                                                   is True. Defaults to
+                                                   None, i.e. no
+                                                   acceleration.
+            predictor (str or object, optional): Predictor of the initial
+                                                 guess of every timestep,
+                                                 "linear", "quadratic",
+                                                 "adams-bashforth",
+                                                 "warm-start" or a
+                                                 predictor instance, see
+                                                 `ddganAE.models.
+                                                 predictors`. Not supported
+                                                 if `compiled` is True.
+                                                 Defaults to None, i.e.
+                                                 linear extrapolation.
+            parareal_slices (int, optional): Number of time slices to solve
+                                             in parallel with the parareal
+                                             algorithm, see
+                                             `ddganAE.models.rollout.
+                                             parareal_rollout`. Cannot be
+                                             combined with saving or
+                                             checkpointing. Defaults to
+                                             None, i.e. a sequential
+                                             rollout.
+            coarse_iters (int, optional): Iterations per timestep of the
+                                          coarse parareal propagator.
+                                          Defaults to 1.
+            parareal_tol (float, optional): Tolerance on the change of the
+                                            initial states of the slices
+                                            between parareal iterations.
+                                            Defaults to 1e-6.
+            workers (int, optional): Number of parareal threads. Defaults to
+                                     None, i.e. one per slice.
+            backend (str or callable, optional): Backend that evaluates the
+                                                 network, "tensorflow",
+                                                 "numpy" for the frozen
+                                                 NumPy runtime of dense
+                                                 models, frozen once until
+                                                 the next training, see
+                                                 `ddganAE.backends.
+                                                 Numpy_mlp`, or a callable
+                                                 such as a TFLite runtime from
+                                                 `ddganAE.backends.from_tflite`.
+                                                 Only "tensorflow" is
+                                                 supported if `compiled` is
+                                                 True. Defaults to None,
+                                                 i.e. "tensorflow".
+
+        Returns:
+            np.ndarray: Predicted values in shape (ngrids + 2, nvars,
+                        ntimesteps), including the boundaries, or
+                        (nscenarios, ngrids + 2, nvars, ntimesteps) for an
+                        ensemble of scenarios. If
+                        `return_info` is True a tuple with the predicted
+                        values and the iteration record is returned instead.
+                        In parareal mode the record also holds the number
+                        of parareal iterations ("parareal_iters").
+        """
+        if resume and checkpoint_path is None:
+            raise ValueError("resume requires checkpoint_path")
+
+        if pre_interval is False:
+            boundaries = boundaries[..., ::self.interval]
+
+        network = self._network(backend, compiled)
+
+        # Held at the width of the data of the precision
+        pred_vars = np.zeros(boundaries.shape[:-3] +
+                             (2 + init_values.shape[-2],) +
+                             boundaries.shape[-2:],
+                             dtype=host_dtype(self.precision, np.float64))
+        pred_vars[..., 0, :, :] = boundaries[..., 0, :, :]
+        pred_vars[..., 1:-1, :, 0] = init_values
+        pred_vars[..., -1, :, :] = boundaries[..., 1, :, :]
+
+        if parareal_slices is not None:
+            if save_interval is not None or checkpoint_path is not None:
+                raise NotImplementedError("Parareal rollouts cannot be saved \
+or checkpointed")
+
+            pred_vars, info = parareal_rollout(
+                pred_vars, timesteps, network, parareal_slices,
+                coarse_iters=coarse_iters, parareal_tol=parareal_tol,
+                workers=workers,
+                timestep_print_interval=timestep_print_interval, iters=iters,
+                sor=sor, increment=self.increment, sweep=sweep, tol=tol,
+                compiled=compiled, jit_compile=jit_compile,
+                accelerator=accelerator, predictor=predictor)
+
+            return (pred_vars, info) if return_info else pred_vars
+
+        checkpoint = None
+        if resume and os.path.exists(checkpoint_path):
+            checkpoint = load_checkpoint(checkpoint_path, self.interval)
+
+        pred_vars, info = rollout(
+            pred_vars, timesteps, network, iters=iters, sor=sor,
+            increment=self.increment, sweep=sweep,
+            timestep_print_interval=timestep_print_interval,
+            save_interval=save_interval, save_path=save_path, tol=tol,
+            compiled=compiled, jit_compile=jit_compile,
+            checkpoint_path=checkpoint_path,
+            checkpoint_interval=checkpoint_interval, checkpoint=checkpoint,
+            interval=self.interval, scaler=scaler, accelerator=accelerator,
+            predictor=predictor)
+
+        if return_info:
+            return pred_vars, info
+
+        return pred_vars
+
+    def predict_iter(self, boundaries, init_values, timesteps, iters=5,
+                     sor=1, pre_interval=False,
+                     timestep_print_interval=None, out_path=None,
+                     flush_interval=100, sweep="gauss-seidel",
+                     tol=None, compiled=False, jit_compile=False,
+                     checkpoint_path=None, checkpoint_interval=100,
+                     scaler=None, resume=False, accelerator=None,
+                     predictor=None, backend=None):
+        """
+        Generator variant of `predict` that yields every timestep as soon as
+        it is predicted. Only the timesteps needed for the stencil and the
+        linear extrapolation are kept in memory, and the results can be
+        written incrementally to a single memory-mapped `.npy` file.
+
+        Args:
+            boundaries (np.ndarray): Boundaries in shape
+                                     (nboundaries (2), nvars, ntimesteps) or
+                                     (nscenarios, 2, nvars, ntimesteps). May
+                                     be memory-mapped, as only one timestep
+                                     is read at a time
+            init_values (np.ndarray): Initial values in shape (ngrids, nvars)
+                                      or (nscenarios, ngrids, nvars)
+            timesteps (int): Number of timesteps to predict
+            iters (int): Maximum number of iterations to do before a
+                         prediction. Defaults to 5.
+            sor (float): Successive overrelaxation factor. Defaults to 1.
+            pre_interval (bool): Whether intervals have already been applied
+                                 outside of this function. If False, this
+                                 function will do it. Defaults to False.
+            timestep_print_interval (int): Interval at which to print the
+                                           current timestep to see progress,
+                                           defaults to None.
+            out_path (str, optional): Path of a `.npy` file the predictions
+                                      are written to, in shape (timesteps +
+                                      1, [nscenarios,] ngrids + 2, nvars).
+                                      It can be opened with
+                                      `np.load(out_path, mmap_mode="r")`
+                                      while the rollout is running. Defaults
+                                      to None.
+            flush_interval (int, optional): Interval in timesteps at which
+                                            `out_path` is flushed to disk.
+                                            Defaults to 100.
+            sweep (str, optional): Order in which subdomains are updated in
+                                   an iteration, see `predict`. Defaults to
+                                   "gauss-seidel".
+            tol (float, optional): Tolerance on the change between two
+                                   iterations, see `predict`. Defaults to
+                                   None.
+            compiled (bool, optional): Whether to trace every timestep into a
+                                       single `tf.function`. Defaults to
+                                       False.
+            jit_compile (bool, optional): Whether to additionally compile the
+                                          traced timestep with XLA. Defaults
+                                          to False.
+            checkpoint_path (str, optional): Path of a `.npz` rollout
+                                             checkpoint holding the last
+                                             three timesteps, the state of
+                                             the predictor, the step index,
+                                             the interval and the scaler.
+                                             Defaults to None.
+            checkpoint_interval (int, optional): Interval in timesteps at
+                                                 which the checkpoint is
+                                                 written. Defaults to 100.
+            scaler (object, optional): Scaler of the data, stored in the
+                                       checkpoint such that the predictions
+                                       can be transformed back after a
+                                       restart. Defaults to None.
+            resume (bool, optional): Whether to resume from
+                                     `checkpoint_path` if it exists.
+                                     An existing `out_path` is then
+                                     appended to and only the timesteps
+                                     after the checkpoint are yielded.
+                                     Defaults to False.
+            accelerator (str or object, optional): Accelerator of the
+                                                   iterations within a
+                                                   timestep, "sor",
+                                                   "aitken", "anderson" or
+                                                   an accelerator instance,
+                                                   see `ddganAE.models.
+                                                   accelerators`. Not
+                                                   supported if `compiled`
+                                                   is True. Defaults to
+                                                   None, i.e. no
+                                                   acceleration.
+            predictor (str or object, optional): Predictor of the initial
+                                                 guess of every timestep,
+                                                 "linear", "quadratic",
+                                                 "adams-bashforth",
+                                                 "warm-start" or a
+                                                 predictor instance, see
+                                                 `ddganAE.models.
+                                                 predictors`. Not supported
+                                                 if `compiled` is True.
+                                                 Defaults to None, i.e.
+                                                 linear extrapolation.
+            backend (str or callable, optional): Backend that evaluates the
+                                                 network, "tensorflow",
+                                                 "numpy" for the frozen
+                                                 NumPy runtime of dense
+                                                 models, frozen once until
+                                                 the next training, see
+                                                 `ddganAE.backends.
+                                                 Numpy_mlp`, or a callable
+                                                 such as a TFLite runtime from
+                                                 `ddganAE.backends.from_tflite`.
+                                                 Only "tensorflow" is
+                                                 supported if `compiled` is
+                                                 True. Defaults to None,
+                                                 i.e. "tensorflow".
+
+        Yields:
+            np.ndarray: Predicted values at the next timestep in shape
+                        ([nscenarios,] ngrids + 2, nvars), including the
+                        boundaries
+        """
+        if resume and checkpoint_path is None:
+            raise ValueError("resume requires checkpoint_path")
+
+        if pre_interval is False:
+            boundaries = boundaries[..., ::self.interval]
+
+        network = self._network(backend, compiled)
+
+        checkpoint = None
+        if resume and os.path.exists(checkpoint_path):
+            checkpoint = load_checkpoint(checkpoint_path, self.interval)
+
+        # The state and the file are held at the width of the data of the
+        # precision, as in `predict`
+        dtype = host_dtype(self.precision, np.float64)
+
+        yield from stream_rollout(
+            np.asarray(boundaries, dtype), np.asarray(init_values, dtype),
+            timesteps, network,
+            out_path=out_path, flush_interval=flush_interval,
+            timestep_print_interval=timestep_print_interval,
+            checkpoint_path=checkpoint_path,
+            checkpoint_interval=checkpoint_interval, checkpoint=checkpoint,
+            interval=self.interval, scaler=scaler, iters=iters, sor=sor,
+            increment=self.increment, sweep=sweep, tol=tol,
+            compiled=compiled, jit_compile=jit_compile,
+            accelerator=accelerator, predictor=predictor)
+
+    def _network(self, backend=None, compiled=False):
+        """
+        Network evaluated by the rollouts
+
+        Args:
+            backend (str or callable, optional): "tensorflow", "numpy" or a
+                                                 callable. Defaults to None,
+                                                 i.e. "tensorflow".
+            compiled (bool, optional): Whether the rollout is compiled.
+                                       Defaults to False.
+
+        Returns:
+            callable: Maps stencil inputs in shape (nbatch, 3*nPOD) to
+                      predictions in shape (nbatch, nPOD)
+        """
+        if backend is None or backend == "tensorflow":
+            return self._forward
+
+        if compiled:
+            raise NotImplementedError("Compiled rollouts require the \
+tensorflow backend")
+
+        if backend == "numpy":
+            if self._numpy_mlp is None:
+                self._numpy_mlp = Numpy_mlp.from_keras(self.encoder,
+                                                       self.decoder)
+            return self._numpy_mlp
+
+        return backend
+
+
+class Predictive_adversarial(Predictive_rollouts):
     """
     Predictive Adversarial Neural Network class
     """
 
-    def __init__(self, encoder, decoder, discriminator, optimizer, seed=None):
+    def __init__(self, encoder, decoder, discriminator, optimizer, seed=None,
+                 precision=None):
         """
         Constructor, create an instance of predictive adversarial neural
         network
@@ -46,14 +479,22 @@ class Predictive_adversarial:
             optimizer (tf.keras.optimizers.Optimizer): Optimization method
             seed (int, optional): Seed that will be used wherever possible.
                                   Defaults to None.
+            precision (str, optional): Mixed precision of the networks and
+                                       the data fed to them, "float16" or
+                                       "bfloat16", see
+                                       `ddganAE.models.precision`. Defaults
+                                       to None, i.e. float32.
         """
-        self.encoder = encoder
-        self.decoder = decoder
-        self.discriminator = discriminator
+        self.encoder = mixed_model(encoder, precision)
+        self.decoder = mixed_model(decoder, precision)
+        self.discriminator = mixed_model(discriminator, precision)
         self.latent_dim = self.decoder.layers[0].input_shape[1]
         self.seed = seed
 
-        self.optimizer = optimizer
+        self.precision = precision
+        self.optimizer = mixed_optimizer(optimizer, precision)
+        self.engine = None
+        self._numpy_mlp = None
 
     @classmethod
     def from_save(cls, dirname, optimizer):
@@ -127,54 +568,15 @@ class Predictive_adversarial:
             tuple: Tuple containing x (samples) and y (targets) datasets
         """
 
-        # Preprocessing
-        for k in range(self.interval):
-            grid_coeffs = np.array(input_data)[:, :, k::self.interval]
-            train_data = np.zeros((grid_coeffs.shape[0] - 2,
-                                   grid_coeffs.shape[1]
-                                   * 3, grid_coeffs.shape[2]))
-
-            for i in range(1, grid_coeffs.shape[0]-1):
-                for j in range(3):
-                    train_data[i-1, j*self.nPOD:(j+1)*self.nPOD, :] = \
-                        grid_coeffs[i+j-1, :, :]
-
-            train_data_swap = train_data.swapaxes(1, 2)
-
-            step = train_data_swap[:, :-1, :]
-            step_forward = train_data_swap[:, 1:, :]
-
-            step[:, :, :self.nPOD] = step_forward[:, :, :self.nPOD]
-            step[:, :, self.nPOD*2:] = step_forward[:, :, self.nPOD*2:]
-
-            x_train = step
-
-            if self.increment:
-                # For if we use the time increment approach
-                y_train = step
-                y_train = np.diff(y_train, axis=1)
-                x_train = x_train[:, :-1, :]
-            else:
-                y_train = step_forward
-
-            x_train = np.concatenate(x_train, 0)
-            y_train = np.concatenate(y_train, 0)
-
-            # We only predict the central POD coefficients
-            y_train = y_train[:, self.nPOD:self.nPOD*2]
-
-            if k == 0:
-                x_train_full = x_train
-                y_train_full = y_train
-            else:
-                x_train_full = np.concatenate([x_train_full, x_train])
-                y_train_full = np.concatenate([y_train_full, y_train])
-
-        return x_train_full, y_train_full
+        return stencil_dataset(input_data, self.interval, self.increment,
+                               host_dtype(self.precision, np.float64))
 
     def train(self, input_data, epochs, interval=5, val_size=0, val_data=None,
               batch_size=128, val_batch_size=128, wandb_log=False,
-              n_discriminator=5, n_gradient_ascent=np.inf, noise_std=0):
+              n_discriminator=5, n_gradient_ascent=np.inf, noise_std=0,
+              streaming=False, compiled=False, jit_compile=False,
+              strategy=None, checkpoint=None, resume=False, sinks=None,
+              timer=None, noise_scaled=False, reverse=0):
         """
         Train the model and do preprocessing within this function.
 
@@ -208,12 +610,90 @@ class Predictive_adversarial:
                                                   Defaults to np.inf.
             noise_std (float, optional): Standard deviation of Gaussian noise
                                          applied to training dataset, is
-                                         reapplied uniquely every epoch.
-                                         Defaults to 0.
+                                         drawn anew every epoch within the
+                                         input pipeline, see
+                                         `Stencil_augmentation`. Defaults to
+                                         0.
+            streaming (bool, optional): Whether to gather the samples lazily
+                                        per batch from the input data rather
+                                        than preprocessing them all in
+                                        advance, which takes about a third
+                                        of the memory per interval phase.
+                                        Defaults to False.
+            compiled (bool, optional): Whether to train with the compiled
+                                       steps of a `Combined_loss_engine`,
+                                       which schedules the discriminator and
+                                       generator updates in the graph.
+                                       Defaults to False.
+            jit_compile (bool, optional): Whether to compile the steps with
+                                          XLA, requires compiled=True.
+                                          Defaults to False.
+            strategy (tf.distribute.Strategy, optional): Strategy of
+                                                         data-parallel
+                                                         training, in whose
+                                                         scope the model is
+                                                         constructed and
+                                                         compiled, see
+                                                         `distribute`. The
+                                                         batch sizes are
+                                                         per worker,
+                                                         requires
+                                                         compiled=True.
+                                                         Defaults to None.
+            checkpoint (Training_checkpoint, optional): Checkpoints of
+                                                        the training
+                                                        state, see
+                                                        `checkpoint`.
+                                                        Defaults to None.
+            resume (bool, optional): Whether to resume from the latest
+                                     checkpoint, if any, until `epochs`
+                                     epochs are done in total. Defaults to
+                                     False.
+            sinks (list, optional): Sinks of the metrics of every epoch,
+                                    which are written in the background, see
+                                    `sinks`. Defaults to None, i.e.
+                                    TensorBoard logs in a timestamped
+                                    directory under "logs/".
+            timer (Phase_timer, optional): Instrumentation of the epochs,
+                                           whose metrics are written to the
+                                           sinks, see `timing`. Defaults to
+                                           None.
+            noise_scaled (bool, optional): Whether to scale the noise of
+                                           every latent variable by its
+                                           standard deviation in the
+                                           training data. Defaults to False.
+            reverse (float, optional): Probability of reversing the order of
+                                       the neighbouring subdomains of a
+                                       training sample, which mirrors the
+                                       stencil. Defaults to 0.
         """
 
         self.interval = interval
 
+        if val_size > 0 and val_data is not None:
+            raise NotImplementedError("Use either val_size > 0 or supply \
+val_data, not both")
+
+        if streaming:
+            train_dataset, val_dataset, pipelines = _stream_datasets(
+                input_data, interval, self.increment, val_size, val_data,
+                batch_size, val_batch_size, self.seed,
+                None if self.increment else host_dtype(self.precision),
+                worker_shard(strategy))
+
+            self._fit(train_dataset, val_dataset, epochs,
+                      batch_size=batch_size, val_batch_size=val_batch_size,
+                      wandb_log=wandb_log, n_discriminator=n_discriminator,
+                      n_gradient_ascent=n_gradient_ascent,
+                      augmentation=_augmentation(input_data, noise_std,
+                                                 noise_scaled, reverse,
+                                                 self.seed),
+                      compiled=compiled, jit_compile=jit_compile,
+                      strategy=strategy, pipelines=pipelines,
+                      checkpoint=checkpoint, resume=resume, sinks=sinks,
+                      timer=timer)
+            return
+
         x_full, y_full = self.preprocess(input_data)
 
         self.train_preprocessed(x_full, y_full, epochs, interval=interval,
@@ -223,13 +703,20 @@ class Predictive_adversarial:
                                 wandb_log=wandb_log,
                                 n_discriminator=n_discriminator,
                                 n_gradient_ascent=n_gradient_ascent,
-                                noise_std=noise_std)
+                                noise_std=noise_std, compiled=compiled,
+                                jit_compile=jit_compile, strategy=strategy,
+                                checkpoint=checkpoint, resume=resume,
+                                sinks=sinks, timer=timer,
+                                noise_scaled=noise_scaled, reverse=reverse)
 
     def train_preprocessed(self, x_full, y_full, epochs, interval=5,
                            val_size=0, val_data=None,
                            batch_size=128, val_batch_size=128, wandb_log=False,
                            n_discriminator=5, n_gradient_ascent=np.inf,
-                           noise_std=0):
+                           noise_std=0, compiled=False, jit_compile=False,
+                           strategy=None, checkpoint=None,
+                           resume=False, sinks=None, timer=None,
+                           noise_scaled=False, reverse=0):
         """
         Train the model and do no preprocessing.
 
@@ -263,74 +750,233 @@ class Predictive_adversarial:
                                                   Defaults to np.inf.
             noise_std (float, optional): Standard deviation of Gaussian noise
                                          applied to training dataset, is
-                                         reapplied uniquely every epoch.
-                                         Defaults to 0.
+                                         drawn anew every epoch within the
+                                         input pipeline, see
+                                         `Stencil_augmentation`. Defaults to
+                                         0.
+            compiled (bool, optional): Whether to train with the compiled
+                                       steps of a `Combined_loss_engine`,
+                                       which schedules the discriminator and
+                                       generator updates in the graph.
+                                       Defaults to False.
+            jit_compile (bool, optional): Whether to compile the steps with
+                                          XLA, requires compiled=True.
+                                          Defaults to False.
+            strategy (tf.distribute.Strategy, optional): Strategy of
+                                                         data-parallel
+                                                         training, in whose
+                                                         scope the model is
+                                                         constructed and
+                                                         compiled, see
+                                                         `distribute`. The
+                                                         batch sizes are
+                                                         per worker,
+                                                         requires
+                                                         compiled=True.
+                                                         Defaults to None.
+            checkpoint (Training_checkpoint, optional): Checkpoints of
+                                                        the training
+                                                        state, see
+                                                        `checkpoint`.
+                                                        Defaults to None.
+            resume (bool, optional): Whether to resume from the latest
+                                     checkpoint, if any, until `epochs`
+                                     epochs are done in total. Defaults to
+                                     False.
+            sinks (list, optional): Sinks of the metrics of every epoch,
+                                    which are written in the background, see
+                                    `sinks`. Defaults to None, i.e.
+                                    TensorBoard logs in a timestamped
+                                    directory under "logs/".
+            timer (Phase_timer, optional): Instrumentation of the epochs,
+                                           whose metrics are written to the
+                                           sinks, see `timing`. Defaults to
+                                           None.
+            noise_scaled (bool, optional): Whether to scale the noise of
+                                           every latent variable by its
+                                           standard deviation in the
+                                           training data. Defaults to False.
+            reverse (float, optional): Probability of reversing the order of
+                                       the neighbouring subdomains of a
+                                       training sample, which mirrors the
+                                       stencil. Defaults to 0.
         """
 
         self.interval = interval
-
-        d_loss_val = g_loss_val = None
+        val_dataset = None
+        shard = worker_shard(strategy)
 
         if val_size > 0 and val_data is not None:
             raise NotImplementedError("Use either val_size > 0 or supply \
 val_data, not both")
 
+        # Held at the width of the networks, also when precomputed
+        x_full = cast_data(x_full, self.precision)
+        y_full = cast_data(y_full, self.precision)
+
         if val_size > 0:
             x_train, x_val, y_train, y_val = train_test_split(
                 x_full, y_full, test_size=val_size, random_state=self.seed)
         else:
             x_train, y_train = x_full, y_full
 
-        train_dataset = tf.data.Dataset.from_tensor_slices((x_train,
-                                                            y_train))
-        train_dataset = train_dataset.\
-            shuffle(buffer_size=x_train.shape[0],
-                    reshuffle_each_iteration=True).\
-            batch(batch_size,
-                  drop_remainder=True)
-
-        if noise_std > 0:
-            add_noise = tf.keras.Sequential([GaussianNoise(noise_std)])
-            train_dataset = train_dataset.map(lambda x, y:
-                                              (add_noise(float(x),
-                                                         training=True), y))
+        train_batches = Sample_batches((x_train, y_train), self.seed)
+        train_dataset = train_batches.dataset(batch_size, drop_remainder=True,
+                                              shard=shard)
+        val_batches = None
+
         if val_size > 0 or val_data is not None:
             if val_data is not None:
 
                 x_val, y_val = self.preprocess(val_data)
 
-            val_dataset = tf.data.Dataset.from_tensor_slices((x_val,
-                                                              y_val))
-            val_dataset = val_dataset. \
-                shuffle(buffer_size=x_val.shape[0],
-                        reshuffle_each_iteration=True).\
-                batch(val_batch_size,
-                      drop_remainder=True)
-
-        # Set up tensorboard logging
-        current_time = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
-        train_log_dir = 'logs/' + current_time + '/train'
-        val_log_dir = 'logs/' + current_time + '/val'
-        train_summary_writer = tf.summary.create_file_writer(train_log_dir)
-        val_summary_writer = tf.summary.create_file_writer(val_log_dir)
+            val_batches = Sample_batches((x_val, y_val), self.seed)
+            val_dataset = val_batches.dataset(
+                val_batch_size, drop_remainder=True, shard=shard)
+
+        self._fit(train_dataset, val_dataset, epochs, batch_size=batch_size,
+                  val_batch_size=val_batch_size, wandb_log=wandb_log,
+                  n_discriminator=n_discriminator,
+                  n_gradient_ascent=n_gradient_ascent,
+                  augmentation=_augmentation(x_train, noise_std,
+                                             noise_scaled, reverse,
+                                             self.seed),
+                  compiled=compiled, jit_compile=jit_compile,
+                  strategy=strategy,
+                  pipelines=[train_batches, val_batches],
+                  checkpoint=checkpoint, resume=resume, sinks=sinks,
+                  timer=timer)
+
+    def _fit(self, train_dataset, val_dataset, epochs, batch_size=128,
+             val_batch_size=128, wandb_log=False, n_discriminator=5,
+             n_gradient_ascent=np.inf, augmentation=None, compiled=False,
+             jit_compile=False, strategy=None, pipelines=(), checkpoint=None,
+             resume=False, sinks=None, timer=None):
+        """
+        Train the model on batched datasets, see `train_preprocessed` for the
+        arguments.
+
+        Args:
+            train_dataset (tf.data.Dataset): Batches of samples and targets
+            val_dataset (tf.data.Dataset): Validation batches, or None
+            augmentation (Stencil_augmentation, optional): Augmentation of
+                                                           the training
+                                                           batches. Defaults
+                                                           to None.
+            pipelines (list, optional): Input pipelines of the datasets,
+                                        see `Training_checkpoint.bind`.
+                                        Defaults to ().
+        """
+
+        if jit_compile and not compiled:
+            raise NotImplementedError("XLA compilation requires "
+                                      "compiled=True")
+
+        check_strategy(strategy, self.seed, compiled, jit_compile)
+
+        # The frozen NumPy runtime no longer matches the trained weights
+        self._numpy_mlp = None
+
+        if compiled and self.engine is None:
+            with strategy_scope(strategy):
+                self.engine = Combined_loss_engine(
+                    self.encoder, self.decoder, self.discriminator,
+                    self.optimizer, seed=self.seed)
+
+        d_loss_val = g_loss_val = None
+
+        if augmentation is not None:
+            train_dataset = augmentation.dataset(train_dataset)
+            # Its epoch counter is checkpointed along
+            pipelines = list(pipelines) + [augmentation]
+
+        sink = training_sink(sinks, wandb_log, strategy)
+
+        timer = phase_timer(timer)
+        timer.start()
+        train_dataset = timer.count(train_dataset)
 
         # Adversarial ground truths
         valid = np.ones((batch_size, 1))
         fake = np.zeros((batch_size, 1))
 
-        for epoch in range(epochs):
+        start = 0
+        if checkpoint is not None:
+            start = checkpoint.bind(self, pipelines, strategy, resume)
 
-            # Regularization phase
-            d_loss_cum = 0
-            g_loss_cum = 0
-            g_step = 0
-            step = 0
-            for step, (x, y) in enumerate(train_dataset):
+        for epoch in range(start, epochs):
 
+            with timer.phase("train"):
+                if compiled:
+                    d_loss, g_loss = self.engine.train_epoch(
+                        train_dataset, n_discriminator=n_discriminator,
+                        n_gradient_ascent=n_gradient_ascent,
+                        jit_compile=jit_compile)
+                else:
+                    d_loss, g_loss = self._train_epoch(
+                        train_dataset, valid, fake, n_discriminator,
+                        n_gradient_ascent, timer)
+
+            # From here on it is just validation and logging
+            sink.write(epoch, "train", {"g_loss": g_loss, "d_loss": d_loss})
+
+            # Calculate the accuracies on the validation set
+            if val_dataset is not None:
+
+                with timer.phase("validation"):
+                    if compiled:
+                        d_loss_val, g_loss_val = self.engine.validate(
+                            val_dataset, jit_compile=jit_compile)
+                    else:
+                        d_loss_val, g_loss_val = self.validate(
+                            val_dataset, val_batch_size)
+
+                sink.write(epoch, "val", {"g_loss": g_loss_val,
+                                          "d_loss": d_loss_val})
+
+            if checkpoint is not None:
+                with timer.phase("checkpoint"):
+                    checkpoint.save(epoch + 1, epochs)
+
+            timer.write(sink, epoch)
+
+        timer.stop()
+        sink.close()
+
+    def _train_epoch(self, train_dataset, valid, fake, n_discriminator,
+                     n_gradient_ascent, timer=None):
+        """
+        Train for one epoch with separate discriminator updates on the real
+        and fake latent variables
+
+        Args:
+            train_dataset (tf.data.Dataset): Batches of samples and targets
+            valid (np.ndarray): Labels of real latent variables
+            fake (np.ndarray): Labels of fake latent variables
+            n_discriminator (int): Interval of the generator updates
+            n_gradient_ascent (int): Interval of the steps of gradient ascent
+                                     of the discriminator
+            timer (Phase_timer, optional): Timer of the input and the
+                                           phases. Defaults to None.
+
+        Returns:
+            tuple: Mean discriminator and generator loss
+        """
+        timer = phase_timer(timer)
+
+        # Regularization phase
+        d_loss_cum = 0
+        g_loss_cum = 0
+        g_step = 0
+        step = 0
+        for step, (x, y) in enumerate(timer.batches(train_dataset)):
+
+            with timer.phase("encoder"):
                 latent_fake = self.encoder.predict(x)
-                latent_real = np.random.normal(size=(batch_size,
-                                                     self.latent_dim))
+            latent_real = np.random.normal(size=(len(valid),
+                                                 self.latent_dim))
 
+            with timer.phase("discriminator"):
                 if step % n_gradient_ascent == 0:
                     # Every so many timesteps do a step of gradient ascent to
                     # inhibit the discriminator from becoming too good
@@ -351,48 +997,20 @@ val_data, not both")
                         fake)[0]
                     d_loss_cum += 0.5 * np.add(d_loss_real, d_loss_fake)
 
-                if step % n_discriminator == 0:
-
-                    g_loss_cum += \
-                        self.adversarial_autoencoder.train_on_batch(x,
-                                                                    [y,
-                                                                     valid])[0]
-                    g_step += 1
-
-            d_loss = d_loss_cum/(step+1)
-            if g_step > 0:
-                g_loss = g_loss_cum/(g_step)
-            else:
-                g_loss = 0
-
-            # From here on it is just validation and logging
-            with train_summary_writer.as_default():
-                tf.summary.scalar('loss - g', g_loss, step=epoch)
-                tf.summary.scalar('loss - d', d_loss, step=epoch)
-
-            # Calculate the accuracies on the validation set
-            if val_dataset is not None:
-
-                d_loss_val, g_loss_val = self.validate(val_dataset,
-                                                       val_batch_size)
+            if step % n_discriminator == 0:
 
-                with val_summary_writer.as_default():
-                    tf.summary.scalar('loss - g', g_loss_val, step=epoch)
-                    tf.summary.scalar('loss - d', d_loss_val, step=epoch)
+                with timer.phase("generator"):
+                    g_loss_cum += self.adversarial_autoencoder.train_on_batch(
+                        x, [y, valid])[0]
+                g_step += 1
 
-            if wandb_log:
-                if val_dataset is not None:
-                    log = {"epoch": epoch,
-                           "g_train_loss": g_loss,
-                           "d_train_loss": d_loss,
-                           "g_valid_loss": g_loss_val,
-                           "d_valid_loss": d_loss_val}
-                else:
-                    log = {"epoch": epoch,
-                           "g_train_loss": g_loss,
-                           "d_train_loss": d_loss}
+        d_loss = d_loss_cum/(step+1)
+        if g_step > 0:
+            g_loss = g_loss_cum/(g_step)
+        else:
+            g_loss = 0
 
-                wandb.log(log)
+        return d_loss, g_loss
 
     def validate(self, val_dataset, val_batch_size):
         """
@@ -437,94 +1055,21 @@ val_data, not both")
 
         return d_loss, g_loss
 
-    def predict(self, boundaries, init_values, timesteps, iters=5, sor=1,
-                pre_interval=False, timestep_print_interval=None,
-                save_interval=None, save_path=None):
+    def _forward(self, x):
         """
-        Predict in time using boundaries and initial values for a certain
-        number of timesteps. The timestep shifts will be done in this function
+        Batched forward pass used by the rollouts in `predict`
 
         Args:
-            boundaries (np.ndarray): Boundaries in shape
-                                     (nboundaries (2), nvars, ntimesteps)
-            init_values (np.ndarray): Initial values in shape (ngrids, nvars)
-            timesteps (int): Number of timesteps to predict
-            iters (int): Number of iterations to do before a prediction.
-                         Defaults to 5.
-            sor (float): Successive overrelaxation factor. Defaults to 1.
-            pre_interval (bool): Whether intervals have already been applied
-                                 outside of this function. If False, this
-                                 function will do it. Defaults to False.
-            timestep_print_interval: Interval at which to print the current
-                                     timestep to see progress, defaults to
-                                     None.
+            x (np.ndarray or tf.Tensor): Stencil inputs in shape
+                                        (nbatch, 3*nPOD)
+
+        Returns:
+            tf.Tensor: Predictions in shape (nbatch, nPOD)
         """
-        if pre_interval is False:
-            boundaries = boundaries[:, :, ::self.interval]
-
-        pred_vars = np.zeros((2 + init_values.shape[0], boundaries.shape[1],
-                              boundaries.shape[2]))
-        pred_vars[0] = boundaries[0]
-        pred_vars[1:-1, :, 0] = init_values
-        pred_vars[-1] = boundaries[1]
-
-        for i in range(timesteps):
-
-            # Outer "timesteps" loop
-            if timestep_print_interval is not None and i % \
-               timestep_print_interval == 0:
-                print("At timestep number ", i)
-
-            if save_interval is not None and i % save_interval == 0:
-                np.save(save_path + str(i), pred_vars)
-
-            # Let's start with a linear extrapolation for the predictions
-            if i > 1:
-                for k in range(1, init_values.shape[0]+1):
-                    pred_vars[k, :, i+1] = pred_vars[k, :, i] + \
-                                           (pred_vars[k, :, i] -
-                                            pred_vars[k, :, i-1])
-
-            for j in range(iters):
-                # Inner optimization loop within a timestep
-                for k in range(1, init_values.shape[0]+1):
-
-                    # Loop over the columns that are meant to be predicted
-                    # pred_vars[k, :, i+1] = \
-                    #    self.adversarial_autoencoder.predict(
-                    #        pred_vars[k-1:k+2, :, i].reshape(1, -1))[0]
-
-                    pred_vars_t = \
-                        np.concatenate((pred_vars[k-1, :, i+1],
-                                        pred_vars[k, :, i],
-                                        pred_vars[k+1, :, i+1])).reshape(1, -1)
-
-                    if self.increment:
-                        pred_vars[k, :, i+1] = pred_vars[k, :, i] + \
-                            self.adversarial_autoencoder.predict(
-                                pred_vars_t)[0]
-                    else:
-                        pred_vars[k, :, i+1] = pred_vars[k, :, i] + \
-                            (self.decoder(self.encoder(pred_vars_t))[0]
-                             - pred_vars[k, :, i]) * sor
-
-                for k in range(init_values.shape[0], 0, -1):
-                    # Loop over the columns that are meant to be predicted
-                    pred_vars_t = \
-                        np.concatenate((pred_vars[k-1, :, i+1],
-                                        pred_vars[k, :, i],
-                                        pred_vars[k+1, :, i+1])).reshape(1, -1)
-
-                    if self.increment:
-                        pred_vars[k, :, i+1] = pred_vars[k, :, i] + \
-                            self.adversarial_autoencoder.predict(
-                                pred_vars_t)[0]
-                    else:
-                        pred_vars[k, :, i+1] = pred_vars[k, :, i] + \
-                            (self.decoder(self.encoder(pred_vars_t))[0]
-                             - pred_vars[k, :, i]) * sor
+        out = self.decoder(self.encoder(tf.reshape(x, (-1,) +
+                                                   self.input_shape)))
 
-        return pred_vars
+        return tf.reshape(out, (tf.shape(x)[0], -1))
 
     def save(self, dirname="model"):
         """
@@ -541,12 +1086,13 @@ val_data, not both")
         self.discriminator.save(dirname + '/discriminator')
 
 
-class Predictive:
+class Predictive(Predictive_rollouts):
     """
     Predictive Neural Network class
     """
 
-    def __init__(self, encoder, decoder, optimizer, seed=None):
+    def __init__(self, encoder, decoder, optimizer, seed=None,
+                 precision=None):
         """
         Constructor, create an instance of predictive neural
         network
@@ -557,13 +1103,20 @@ class Predictive:
             optimizer (tf.keras.optimizers.Optimizer): Optimization method
             seed (int, optional): Seed that will be used wherever possible.
                                   Defaults to None.
+            precision (str, optional): Mixed precision of the networks and
+                                       the data fed to them, "float16" or
+                                       "bfloat16", see
+                                       `ddganAE.models.precision`. Defaults
+                                       to None, i.e. float32.
         """
         self.seed = seed
-        self.encoder = encoder
-        self.decoder = decoder
+        self.encoder = mixed_model(encoder, precision)
+        self.decoder = mixed_model(decoder, precision)
         self.latent_dim = self.decoder.layers[0].input_shape[1]
 
-        self.optimizer = optimizer
+        self.precision = precision
+        self.optimizer = mixed_optimizer(optimizer, precision)
+        self._numpy_mlp = None
 
     def compile(self, nPOD, increment=False):
         """
@@ -608,54 +1161,14 @@ class Predictive:
             tuple: Tuple containing x (samples) and y (targets) datasets
         """
 
-        # Preprocessing
-        for k in range(self.interval):
-            grid_coeffs = np.array(input_data)[:, :, k::self.interval]
-            train_data = np.zeros((grid_coeffs.shape[0] - 2,
-                                   grid_coeffs.shape[1]
-                                   * 3, grid_coeffs.shape[2]))
-
-            for i in range(1, grid_coeffs.shape[0]-1):
-                for j in range(3):
-                    train_data[i-1, j*self.nPOD:(j+1)*self.nPOD, :] = \
-                        grid_coeffs[i+j-1, :, :]
-
-            train_data_swap = train_data.swapaxes(1, 2)
-
-            step = train_data_swap[:, :-1, :]
-            step_forward = train_data_swap[:, 1:, :]
-
-            step[:, :, :self.nPOD] = step_forward[:, :, :self.nPOD]
-            step[:, :, self.nPOD*2:] = step_forward[:, :, self.nPOD*2:]
-
-            x_train = step
-
-            if self.increment:
-                # For if we use the time increment approach
-                y_train = step
-                y_train = np.diff(y_train, axis=1)
-                x_train = x_train[:, :-1, :]
-            else:
-                y_train = step_forward
-
-            x_train = np.concatenate(x_train, 0)
-            y_train = np.concatenate(y_train, 0)
-
-            # We only predict the central POD coefficients
-            y_train = y_train[:, self.nPOD:self.nPOD*2]
-
-            if k == 0:
-                x_train_full = x_train
-                y_train_full = y_train
-            else:
-                x_train_full = np.concatenate([x_train_full, x_train])
-                y_train_full = np.concatenate([y_train_full, y_train])
-
-        return x_train_full, y_train_full
+        return stencil_dataset(input_data, self.interval, self.increment,
+                               host_dtype(self.precision, np.float64))
 
     def train(self, input_data, epochs, interval=5, val_size=0, val_data=None,
               batch_size=128, val_batch_size=128, wandb_log=False,
-              n_discriminator=5, n_gradient_ascent=np.inf, noise_std=0):
+              n_discriminator=5, n_gradient_ascent=np.inf, noise_std=0,
+              streaming=False, strategy=None, checkpoint=None, resume=False,
+              sinks=None, timer=None, noise_scaled=False, reverse=0):
         """
         Train the model and do preprocessing within this function.
 
@@ -689,96 +1202,300 @@ class Predictive:
                                                Defaults to np.inf.
             noise_std (float, optional): Standard deviation of Gaussian noise
                                          applied to training dataset, is
-                                         reapplied uniquely every epoch.
-                                         Defaults to 0.
+                                         drawn anew every epoch within the
+                                         input pipeline, see
+                                         `Stencil_augmentation`. Defaults to
+                                         0.
+            streaming (bool, optional): Whether to gather the samples lazily
+                                        per batch from the input data rather
+                                        than preprocessing them all in
+                                        advance, which takes about a third
+                                        of the memory per interval phase.
+                                        Defaults to False.
+            strategy (tf.distribute.Strategy, optional): Strategy of
+                                                         data-parallel
+                                                         training, in whose
+                                                         scope the model is
+                                                         constructed and
+                                                         compiled, see
+                                                         `distribute`. The
+                                                         batch sizes are
+                                                         per worker.
+                                                         Defaults to None.
+            checkpoint (Training_checkpoint, optional): Checkpoints of
+                                                        the training
+                                                        state, see
+                                                        `checkpoint`.
+                                                        Defaults to None.
+            resume (bool, optional): Whether to resume from the latest
+                                     checkpoint, if any, until `epochs`
+                                     epochs are done in total. Defaults to
+                                     False.
+            sinks (list, optional): Sinks of the metrics of every epoch,
+                                    which are written in the background, see
+                                    `sinks`. Defaults to None, i.e.
+                                    TensorBoard logs in a timestamped
+                                    directory under "logs/".
+            timer (Phase_timer, optional): Instrumentation of the epochs,
+                                           whose metrics are written to the
+                                           sinks, see `timing`. Defaults to
+                                           None.
+            noise_scaled (bool, optional): Whether to scale the noise of
+                                           every latent variable by its
+                                           standard deviation in the
+                                           training data. Defaults to False.
+            reverse (float, optional): Probability of reversing the order of
+                                       the neighbouring subdomains of a
+                                       training sample, which mirrors the
+                                       stencil. Defaults to 0.
         """
 
-        val_dataset = None
         self.interval = interval
 
         if val_size > 0 and val_data is not None:
             raise NotImplementedError("Use either val_size > 0 or supply \
 val_data, not both")
 
+        if streaming:
+            train_dataset, val_dataset, pipelines = _stream_datasets(
+                input_data, interval, self.increment, val_size, val_data,
+                batch_size, val_batch_size, self.seed,
+                None if self.increment else host_dtype(self.precision),
+                worker_shard(strategy))
+
+            self._fit(train_dataset, val_dataset, epochs,
+                      val_batch_size=val_batch_size, wandb_log=wandb_log,
+                      augmentation=_augmentation(input_data, noise_std,
+                                                 noise_scaled, reverse,
+                                                 self.seed),
+                      strategy=strategy, pipelines=pipelines,
+                      checkpoint=checkpoint, resume=resume, sinks=sinks,
+                      timer=timer)
+            return
+
         x_full, y_full = self.preprocess(input_data)
 
+        self.train_preprocessed(x_full, y_full, epochs, interval=interval,
+                                val_size=val_size, val_data=val_data,
+                                batch_size=batch_size,
+                                val_batch_size=val_batch_size,
+                                wandb_log=wandb_log, noise_std=noise_std,
+                                strategy=strategy,
+                                checkpoint=checkpoint, resume=resume,
+                                sinks=sinks, timer=timer,
+                                noise_scaled=noise_scaled, reverse=reverse)
+
+    def train_preprocessed(self, x_full, y_full, epochs, interval=5,
+                           val_size=0, val_data=None, batch_size=128,
+                           val_batch_size=128, wandb_log=False, noise_std=0,
+                           strategy=None, checkpoint=None,
+                           resume=False, sinks=None, timer=None,
+                           noise_scaled=False, reverse=0):
+        """
+        Train the model and do no preprocessing, e.g. on samples and targets
+        from `preprocess` or a `Preprocess_cache`.
+
+        Args:
+            x_full (np.ndarray): Samples
+            y_full (np.ndarray): Targets
+            epochs (int): Number of epochs to train for
+            interval (int, optional): Interval at which to train data.
+                                      Defaults to 5.
+            val_size (float, optional): Relative size of validation set, if not
+                                      supplied as the next argument. Number
+                                      between 0 and 1. Defaults to 0.
+            val_data (np.ndarray, optional): User-supplied validation dataset,
+                                             mutually exclusive with
+                                             val_size > 0. Defaults to None.
+            batch_size (int, optional): Batch size. Defaults to 128.
+            val_batch_size (int, optional): Batch size on the validation set.
+                                            Defaults to 128.
+            wandb_log (bool, optional): Whether to log results to wandb, needs
+                                        to be called within wandb context if
+                                        set to true. Defaults to False.
+            noise_std (float, optional): Standard deviation of Gaussian noise
+                                         applied to training dataset, is
+                                         drawn anew every epoch within the
+                                         input pipeline, see
+                                         `Stencil_augmentation`. Defaults to
+                                         0.
+            strategy (tf.distribute.Strategy, optional): Strategy of
+                                                         data-parallel
+                                                         training, in whose
+                                                         scope the model is
+                                                         constructed and
+                                                         compiled, see
+                                                         `distribute`. The
+                                                         batch sizes are
+                                                         per worker.
+                                                         Defaults to None.
+            checkpoint (Training_checkpoint, optional): Checkpoints of
+                                                        the training
+                                                        state, see
+                                                        `checkpoint`.
+                                                        Defaults to None.
+            resume (bool, optional): Whether to resume from the latest
+                                     checkpoint, if any, until `epochs`
+                                     epochs are done in total. Defaults to
+                                     False.
+            sinks (list, optional): Sinks of the metrics of every epoch,
+                                    which are written in the background, see
+                                    `sinks`. Defaults to None, i.e.
+                                    TensorBoard logs in a timestamped
+                                    directory under "logs/".
+            timer (Phase_timer, optional): Instrumentation of the epochs,
+                                           whose metrics are written to the
+                                           sinks, see `timing`. Defaults to
+                                           None.
+            noise_scaled (bool, optional): Whether to scale the noise of
+                                           every latent variable by its
+                                           standard deviation in the
+                                           training data. Defaults to False.
+            reverse (float, optional): Probability of reversing the order of
+                                       the neighbouring subdomains of a
+                                       training sample, which mirrors the
+                                       stencil. Defaults to 0.
+        """
+
+        val_dataset = None
+        self.interval = interval
+        shard = worker_shard(strategy)
+
+        if val_size > 0 and val_data is not None:
+            raise NotImplementedError("Use either val_size > 0 or supply \
+val_data, not both")
+
+        # Held at the width of the networks, also when precomputed
+        x_full = cast_data(x_full, self.precision)
+        y_full = cast_data(y_full, self.precision)
+
         if val_size > 0:
             x_train, x_val, y_train, y_val = train_test_split(
                 x_full, y_full, test_size=val_size, random_state=self.seed)
         else:
             x_train, y_train = x_full, y_full
 
-        train_dataset = tf.data.Dataset.from_tensor_slices((x_train,
-                                                            y_train))
-        train_dataset = train_dataset.\
-            shuffle(buffer_size=x_train.shape[0],
-                    reshuffle_each_iteration=True).\
-            batch(batch_size,
-                  drop_remainder=True)
-
-        if noise_std > 0:
-            add_noise = tf.keras.Sequential([GaussianNoise(noise_std)])
-            train_dataset = train_dataset.map(lambda x, y:
-                                              (add_noise(float(x),
-                                                         training=True), y))
+        train_batches = Sample_batches((x_train, y_train), self.seed)
+        train_dataset = train_batches.dataset(batch_size, drop_remainder=True,
+                                              shard=shard)
+        val_batches = None
 
         if val_size > 0 or val_data is not None:
             if val_data is not None:
 
                 x_val, y_val = self.preprocess(val_data)
 
-            val_dataset = tf.data.Dataset.from_tensor_slices((x_val,
-                                                              y_val))
-            val_dataset = val_dataset. \
-                shuffle(buffer_size=x_val.shape[0],
-                        reshuffle_each_iteration=True).\
-                batch(val_batch_size,
-                      drop_remainder=True)
-
-        # Set up tensorboard logging
-        current_time = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
-        train_log_dir = 'logs/' + current_time + '/train'
-        val_log_dir = 'logs/' + current_time + '/val'
-        train_summary_writer = tf.summary.create_file_writer(train_log_dir)
-        val_summary_writer = tf.summary.create_file_writer(val_log_dir)
-
-        for epoch in range(epochs):
-            loss_cum = 0
-            acc_cum = 0
-            for step, (x, y) in enumerate(train_dataset):
-
-                # Train the autoencoder reconstruction
-                loss, acc = self.autoencoder.train_on_batch(x, y)
-                loss_cum += loss
-                acc_cum += acc
-
-            # Average the loss and accuracy over the entire dataset
-            loss = loss_cum/(step+1)
-            acc = acc_cum/step
-
-            with train_summary_writer.as_default():
-                tf.summary.scalar('loss', loss, step=epoch)
-                tf.summary.scalar('accuracy', acc, step=epoch)
+            val_batches = Sample_batches((x_val, y_val), self.seed)
+            val_dataset = val_batches.dataset(
+                val_batch_size, drop_remainder=True, shard=shard)
+
+        self._fit(train_dataset, val_dataset, epochs,
+                  val_batch_size=val_batch_size, wandb_log=wandb_log,
+                  augmentation=_augmentation(x_train, noise_std,
+                                             noise_scaled, reverse,
+                                             self.seed),
+                  strategy=strategy,
+                  pipelines=[train_batches, val_batches],
+                  checkpoint=checkpoint, resume=resume, sinks=sinks,
+                  timer=timer)
+
+    def _fit(self, train_dataset, val_dataset, epochs, val_batch_size=128,
+             wandb_log=False, augmentation=None, strategy=None,
+             pipelines=(), checkpoint=None, resume=False, sinks=None,
+             timer=None):
+        """
+        Train the model on batched datasets, see `train_preprocessed` for the
+        arguments.
+
+        Args:
+            train_dataset (tf.data.Dataset): Batches of samples and targets
+            val_dataset (tf.data.Dataset): Validation batches, or None
+            augmentation (Stencil_augmentation, optional): Augmentation of
+                                                           the training
+                                                           batches. Defaults
+                                                           to None.
+            pipelines (list, optional): Input pipelines of the datasets,
+                                        see `Training_checkpoint.bind`.
+                                        Defaults to ().
+        """
+        check_strategy(strategy, self.seed)
+
+        # The frozen NumPy runtime no longer matches the trained weights
+        self._numpy_mlp = None
+
+        if augmentation is not None:
+            train_dataset = augmentation.dataset(train_dataset)
+            # Its epoch counter is checkpointed along
+            pipelines = list(pipelines) + [augmentation]
+
+        sink = training_sink(sinks, wandb_log, strategy)
+
+        timer = phase_timer(timer)
+        timer.start()
+        train_dataset = timer.count(train_dataset)
+
+        start = 0
+        if checkpoint is not None:
+            start = checkpoint.bind(self, pipelines, strategy, resume)
+
+        for epoch in range(start, epochs):
+            with timer.phase("train"):
+                if strategy is not None:
+                    loss, acc = run_epoch(self.autoencoder, train_dataset)
+                else:
+                    loss, acc = self._train_epoch(train_dataset, timer)
+
+            sink.write(epoch, "train", {"loss": loss, "accuracy": acc})
 
             # Calculate the accuracies on the validation set
             if val_dataset is not None:
-                loss_val, acc_val = self.validate(val_dataset, val_batch_size)
-
-                with val_summary_writer.as_default():
-                    tf.summary.scalar('loss', loss_val, step=epoch)
-                    tf.summary.scalar('accuracy', acc_val, step=epoch)
-
-            if wandb_log:
-                if val_dataset is not None:
-                    log = {"epoch": epoch, "train_loss": loss,
-                           "train_accuracy": acc,
-                           "valid_loss": loss_val,
-                           "valid_accuracy": acc_val}
-                else:
-                    log = {"epoch": epoch, "train_loss": loss,
-                           "train_accuracy": acc}
+                with timer.phase("validation"):
+                    if strategy is not None:
+                        loss_val, acc_val = run_epoch(
+                            self.autoencoder, val_dataset, training=False)
+                    else:
+                        loss_val, acc_val = self.validate(val_dataset,
+                                                          val_batch_size)
 
-                wandb.log(log)
+                sink.write(epoch, "val", {"loss": loss_val,
+                                          "accuracy": acc_val})
+
+            if checkpoint is not None:
+                with timer.phase("checkpoint"):
+                    checkpoint.save(epoch + 1, epochs)
+
+            timer.write(sink, epoch)
+
+        timer.stop()
+        sink.close()
+
+    def _train_epoch(self, train_dataset, timer=None):
+        """
+        Train for one epoch with a `train_on_batch` call per batch
+
+        Args:
+            train_dataset (tf.data.Dataset): Batches of samples and targets
+            timer (Phase_timer, optional): Timer of the input. Defaults to
+                                           None.
+
+        Returns:
+            tuple: Mean loss and accuracy
+        """
+        loss_cum = 0
+        acc_cum = 0
+        for step, (x, y) in enumerate(phase_timer(timer).batches(
+                train_dataset)):
+
+            # Train the autoencoder reconstruction
+            loss, acc = self.autoencoder.train_on_batch(x, y)
+            loss_cum += loss
+            acc_cum += acc
+
+        # Average the loss and accuracy over the entire dataset
+        loss = loss_cum/(step+1)
+        acc = acc_cum/step
+
+        return loss, acc
 
     def validate(self, val_dataset, val_batch_size):
         """
@@ -812,85 +1529,32 @@ val_data, not both")
 
     def predict(self, boundaries, init_values, timesteps, iters=5, sor=1,
                 timestep_print_interval=None, save_interval=None,
-                save_path=None):
+                save_path=None, **kwargs):
         """
         Predict in time using boundaries and initial values for a certain
-        number of timesteps. The timestep shifts will be done in this function
+        number of timesteps, see `Predictive_rollouts.predict`, whose
+        remaining arguments are passed as keywords
+
+        Returns:
+            np.ndarray: Predicted values, optionally with the iteration
+                        record
+        """
+        return super().predict(
+            boundaries, init_values, timesteps, iters=iters, sor=sor,
+            timestep_print_interval=timestep_print_interval,
+            save_interval=save_interval, save_path=save_path, **kwargs)
+
+    def _forward(self, x):
+        """
+        Batched forward pass used by the rollouts in `predict`
 
         Args:
-            boundaries (np.ndarray): Boundaries in shape
-                                     (nboundaries (2), nvars, ntimesteps)
-            init_values (np.ndarray): Initial values in shape (ngrids, nvars)
-            timesteps (int): Number of timesteps to predict
-            iters (int): Number of iterations to do before a prediction.
-                         Defaults to 5.
-            sor (float): Successive overrelaxation factor. Defaults to 1.
-            timestep_print_interval (int): Interval at which to print the
-                                           current timestep to see progress,
-                                           defaults to None.
+            x (np.ndarray or tf.Tensor): Stencil inputs in shape
+                                        (nbatch, 3*nPOD)
+
+        Returns:
+            tf.Tensor: Predictions in shape (nbatch, nPOD)
         """
-        boundaries = boundaries[:, :, ::self.interval]
-
-        pred_vars = np.zeros((2 + init_values.shape[0], boundaries.shape[1],
-                              boundaries.shape[2]))
-        pred_vars[0] = boundaries[0]
-        pred_vars[1:-1, :, 0] = init_values
-        pred_vars[-1] = boundaries[1]
-
-        for i in range(timesteps):
-            # Outer "timesteps" loop
-
-            if timestep_print_interval is not None and i % \
-               timestep_print_interval == 0:
-                print("At timestep number ", i)
-
-            if save_interval is not None and i % save_interval == 0:
-                np.save(save_path + str(i), pred_vars)
-
-            # Let's start with a linear extrapolation for the predictions
-            if i > 1:
-                for k in range(1, init_values.shape[0]+1):
-                    pred_vars[k, :, i+1] = pred_vars[k, :, i] + \
-                                           (pred_vars[k, :, i] -
-                                            pred_vars[k, :, i-1])
-
-            for j in range(iters):
-                # Inner optimization loop within a timestep
-                for k in range(1, init_values.shape[0]+1):
-
-                    # Loop over the columns that are meant to be predicted
-                    # pred_vars[k, :, i+1] = \
-                    #    self.adversarial_autoencoder.predict(
-                    #        pred_vars[k-1:k+2, :, i].reshape(1, -1))[0]
-
-                    pred_vars_t = \
-                        np.concatenate((pred_vars[k-1, :, i+1],
-                                        pred_vars[k, :, i],
-                                        pred_vars[k+1, :, i+1])).reshape(1, -1)
-
-                    if self.increment:
-                        pred_vars[k, :, i+1] = pred_vars[k, :, i] + \
-                            self.autoencoder.predict(
-                                pred_vars_t)
-                    else:
-                        pred_vars[k, :, i+1] = pred_vars[k, :, i] + \
-                            (self.autoencoder.predict(
-                                pred_vars_t)[0] - pred_vars[k, :, i]) * sor
-
-                for k in range(init_values.shape[0], 0, -1):
-                    # Loop over the columns that are meant to be predicted
-                    pred_vars_t = \
-                        np.concatenate((pred_vars[k-1, :, i+1],
-                                        pred_vars[k, :, i],
-                                        pred_vars[k+1, :, i+1])).reshape(1, -1)
-
-                    if self.increment:
-                        pred_vars[k, :, i+1] = pred_vars[k, :, i] + \
-                            self.autoencoder.predict(
-                                pred_vars_t)
-                    else:
-                        pred_vars[k, :, i+1] = pred_vars[k, :, i] + \
-                            (self.autoencoder.predict(
-                                pred_vars_t)[0] - pred_vars[k, :, i]) * sor
+        out = self.autoencoder(tf.reshape(x, (-1,) + self.input_shape))
 
-        return pred_vars
+        return tf.reshape(out, (tf.shape(x)[0], -1))
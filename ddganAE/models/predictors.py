@@ -0,0 +1,167 @@
+"""
+
+Predictors of the initial guess of every timestep of the predictive rollouts.
+A predictor extrapolates the converged states of the previous timesteps to
+the next one, after which the inner iterations correct the guess. The better
+the guess, the fewer inner iterations are needed to reach the tolerance.
+
+All predictors act on states of shape (nscenarios, ndomains, nvars) and fall
+back to a lower order while there are not enough previous timesteps, e.g. at
+the start of a rollout. The rollout checkpoints hold the last three
+timesteps and the state of the predictor, see `get_state`, such that a
+resumed rollout continues with the same initial guesses.
+
+"""
+
+import numpy as np
+
+__author__ = "Zef Wolffs"
+__credits__ = []
+__license__ = "MIT"
+__version__ = "1.0.0"
+__maintainer__ = "Zef Wolffs"
+__email__ = "zefwolffs@gmail.com"
+__status__ = "Development"
+
+
+class Linear_extrapolation:
+    """
+    First-order extrapolation from the last two timesteps. From the third
+    timestep on this is the original initial guess of the rollouts, before
+    that the guess is zero.
+    """
+
+    def reset(self):
+        """
+        Start a new rollout
+        """
+
+    def __call__(self, i, states):
+        """
+        Compute the initial guess of timestep i + 1
+
+        Args:
+            i (int): Current timestep
+            states (list of np.ndarray): Converged states at the timesteps i,
+                                         i - 1, ..., as far as available
+
+        Returns:
+            np.ndarray: Initial guess
+        """
+        if i > 1 and len(states) > 1:
+            return states[0] + (states[0] - states[1])
+
+        return np.zeros_like(states[0])
+
+    def update(self, i, guess, converged):
+        """
+        Observe the converged state of timestep i + 1
+
+        Args:
+            i (int): Current timestep
+            guess (np.ndarray): Initial guess of timestep i + 1
+            converged (np.ndarray): State after the inner iterations
+        """
+
+    def get_state(self):
+        """
+        State carried over from one timestep to the next besides the
+        converged states, e.g. to store in a rollout checkpoint
+
+        Returns:
+            dict: Picklable state
+        """
+        return {}
+
+    def set_state(self, state):
+        """
+        Restore a state from `get_state`, after `reset`
+
+        Args:
+            state (dict): State
+        """
+
+
+class Quadratic_extrapolation(Linear_extrapolation):
+    """
+    Second-order extrapolation through the last three timesteps
+    """
+
+    def __call__(self, i, states):
+        if i > 2 and len(states) > 2:
+            return 3 * states[0] - 3 * states[1] + states[2]
+
+        return super().__call__(i, states)
+
+
+class Adams_bashforth(Linear_extrapolation):
+    """
+    Two-step Adams-Bashforth extrapolation, where the increments of the last
+    two timesteps act as the time derivatives
+    """
+
+    def __call__(self, i, states):
+        if i > 2 and len(states) > 2:
+            return states[0] + 1.5 * (states[0] - states[1]) - \
+                0.5 * (states[1] - states[2])
+
+        return super().__call__(i, states)
+
+
+class Warm_start(Linear_extrapolation):
+    """
+    Linear extrapolation plus the correction that the inner iterations applied
+    to the initial guess of the previous timestep
+    """
+
+    def reset(self):
+        self.correction = None
+
+    def __call__(self, i, states):
+        guess = super().__call__(i, states)
+
+        if self.correction is not None and i > 1 and len(states) > 1:
+            guess = guess + self.correction
+
+        return guess
+
+    def update(self, i, guess, converged):
+        self.correction = converged - guess if i > 1 else None
+
+    def get_state(self):
+        return {"correction": self.correction}
+
+    def set_state(self, state):
+        self.correction = state["correction"]
+
+
+PREDICTORS = {"linear": Linear_extrapolation,
+              "quadratic": Quadratic_extrapolation,
+              "adams-bashforth": Adams_bashforth,
+              "warm-start": Warm_start}
+
+
+def get_predictor(predictor=None):
+    """
+    Get a predictor by name
+
+    Args:
+        predictor (str or object, optional): One of "linear", "quadratic",
+                                             "adams-bashforth" or
+                                             "warm-start", or a predictor
+                                             instance. Defaults to None,
+                                             i.e. linear extrapolation.
+
+    Returns:
+        object: Predictor
+    """
+    if predictor is None:
+        return Linear_extrapolation()
+
+    if isinstance(predictor, str):
+        if predictor not in PREDICTORS:
+            raise ValueError("Unknown predictor '%s', choose one of %s" %
+                             (predictor, ", ".join(PREDICTORS)))
+        return PREDICTORS[predictor]()
+
+    return predictor
@@ -0,0 +1,962 @@
+"""
+
+Sweep engine shared by the predictive models. A rollout advances all
+subdomains in time, where every timestep is solved by a number of inner
+(Schwarz) iterations in which each subdomain is predicted from its own value
+at the previous timestep and the values of its two neighbours at the current
+one.
+
+The original Gauss-Seidel ordering visits one subdomain at a time, which
+means one network call with a batch of 1 per subdomain. The Jacobi and
+red-black orderings update whole groups of subdomains in a single batched
+forward pass instead.
+
+Optionally a whole timestep, including every inner iteration, is traced into a
+single `tf.function` such that long rollouts do not round-trip to the host.
+
+The inner iterations stop early once the largest change of the predicted
+subdomains between two iterations drops below a tolerance. Both rollouts
+return a record with the number of iterations and the final residual of every
+timestep. Eager rollouts can additionally accelerate the inner iterations,
+see `ddganAE.models.accelerators`, and start them from a better initial
+guess, see `ddganAE.models.predictors`.
+
+The state carries a leading scenario axis, such that an ensemble of
+boundary and initial conditions advances together and shares every batched
+network call. A single scenario is treated as an ensemble of one.
+
+Rollouts are generators at their core that only keep the three timesteps in
+memory that the stencil and the extrapolation need, such that results can be
+streamed to disk while the rollout is still running. For the same reason a
+compact checkpoint of the last three timesteps and the state of the
+predictor suffices to resume a rollout exactly where it stopped, and the
+horizon can be split into time slices that are solved in parallel with the
+parareal algorithm.
+
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from numpy.lib.format import open_memmap
+import numpy as np
+import tensorflow as tf
+import weakref
+import pickle
+import copy
+import os
+from ddganAE.models.accelerators import get_accelerator
+from ddganAE.models.predictors import get_predictor
+
+__author__ = "Zef Wolffs"
+__credits__ = []
+__license__ = "MIT"
+__version__ = "1.0.0"
+__maintainer__ = "Zef Wolffs"
+__email__ = "zefwolffs@gmail.com"
+__status__ = "Development"
+
+SWEEPS = ("gauss-seidel", "jacobi", "red-black")
+
+# Traced timesteps by the object that owns the network, see
+# `compile_timestep`
+_timesteps = weakref.WeakKeyDictionary()
+
+
+def sweep_groups(n_domains, sweep="gauss-seidel"):
+    """
+    Order in which the subdomains are updated during one inner iteration.
+    Every group of subdomains is passed through the network in one batch.
+
+    Args:
+        n_domains (int): Number of subdomains that are to be predicted, i.e.
+                         excluding the two boundaries
+        sweep (str, optional): One of "gauss-seidel" (forward then backward
+                               sweep, one subdomain at a time), "jacobi" (all
+                               subdomains at once) or "red-black" (odd
+                               subdomains, then even ones). Defaults to
+                               "gauss-seidel".
+
+    Returns:
+        list of np.ndarray: Indices into the first axis of the state array
+    """
+    domains = np.arange(1, n_domains + 1)
+
+    if sweep == "gauss-seidel":
+        return [domains[[k]] for k in range(n_domains)] + \
+               [domains[[k]] for k in range(n_domains - 1, -1, -1)]
+    elif sweep == "jacobi":
+        return [domains]
+    elif sweep == "red-black":
+        return [group for group in (domains[0::2], domains[1::2])
+                if len(group) > 0]
+
+    raise ValueError("Unknown sweep '%s', choose one of %s" %
+                     (sweep, ", ".join(SWEEPS)))
+
+
+def stencil_inputs(pred_vars, i, domains):
+    """
+    Build the network inputs for a group of subdomains at timestep i. Every
+    input consists of the left neighbour at timestep i+1, the subdomain
+    itself at timestep i and the right neighbour at timestep i+1.
+
+    Args:
+        pred_vars (np.ndarray): State in shape (nscenarios, ndomains + 2,
+                                nvars, ntimesteps), including the boundaries
+        i (int): Current timestep
+        domains (np.ndarray): Indices of the subdomains to build inputs for
+
+    Returns:
+        np.ndarray: Inputs in shape (nscenarios*len(domains), 3*nvars)
+    """
+    cur, nxt = pred_vars[..., i], pred_vars[..., i + 1]
+    x = np.concatenate((nxt[:, domains - 1], cur[:, domains],
+                        nxt[:, domains + 1]), axis=-1)
+
+    return x.reshape(-1, x.shape[-1])
+
+
+def schwarz_iteration(pred_vars, i, network, groups, sor=1, increment=False):
+    """
+    Do a single inner iteration at timestep i, updating `pred_vars` in place.
+
+    Args:
+        pred_vars (np.ndarray): State in shape (nscenarios, ndomains + 2,
+                                nvars, ntimesteps), including the boundaries
+        i (int): Current timestep
+        network (callable): Maps a batch of stencil inputs of shape
+                            (nbatch, 3*nvars) to predictions of shape
+                            (nbatch, nvars)
+        groups (list of np.ndarray): Update order, see `sweep_groups`
+        sor (float, optional): Successive overrelaxation factor. Defaults to
+                               1.
+        increment (bool, optional): Whether the network predicts increments
+                                    instead of whole values. Defaults to
+                                    False.
+    """
+    # Views on the current and next timestep, indexing these keeps the
+    # scenario axis in front
+    cur, nxt = pred_vars[..., i], pred_vars[..., i + 1]
+
+    for domains in groups:
+        out = np.asarray(network(stencil_inputs(pred_vars, i, domains)))
+        out = out.reshape(pred_vars.shape[0], len(domains), -1)
+
+        if increment:
+            nxt[:, domains] = cur[:, domains] + out
+        else:
+            nxt[:, domains] = cur[:, domains] + (out - cur[:, domains]) * sor
+
+
+def compile_timestep(network, n_domains, nvars, iters=5, sor=1,
+                     increment=False, sweep="gauss-seidel", tol=None,
+                     n_scenarios=1, dtype=tf.float64, jit_compile=False):
+    """
+    Trace a full timestep, i.e. the linear extrapolation and all inner
+    iterations, into a single `tf.function` with a fixed signature. The
+    functions are cached for as long as the network lives, i.e. the object
+    of a bound method such as `Predictive._forward`, such that repeated
+    rollouts with the same network and settings are only traced once.
+
+    Args:
+        network (callable): Maps a batch of stencil inputs of shape
+                            (nbatch, 3*nvars) to predictions of shape
+                            (nbatch, nvars) using TensorFlow operations
+        n_domains (int): Number of subdomains that are to be predicted
+        nvars (int): Number of variables per subdomain
+        iters (int, optional): Maximum number of inner iterations per
+                               timestep. Defaults to 5.
+        sor (float, optional): Successive overrelaxation factor. Defaults to
+                               1.
+        increment (bool, optional): Whether the network predicts increments
+                                    instead of whole values. Defaults to
+                                    False.
+        sweep (str, optional): Update order of the subdomains, see
+                               `sweep_groups`. Defaults to "gauss-seidel".
+        tol (float, optional): Residual below which the inner iterations
+                               stop. Defaults to None, i.e. always do `iters`
+                               iterations.
+        n_scenarios (int, optional): Number of scenarios advanced together.
+                                     Defaults to 1.
+        dtype (tf.DType, optional): Data type of the state. Defaults to
+                                    tf.float64.
+        jit_compile (bool, optional): Whether to compile the timestep with
+                                      XLA. Defaults to False.
+
+    Returns:
+        tf.function: Function mapping the states at timesteps i-1 and i
+                     (shape (nscenarios, ndomains + 2, nvars)), the
+                     boundaries at timestep i+1 (shape (nscenarios, 2,
+                     nvars)) and the timestep index i to the state at
+                     timestep i+1, the number of inner iterations done and
+                     the final residual
+    """
+    settings = (n_domains, nvars, iters, sor, increment, sweep, tol,
+                n_scenarios, dtype, jit_compile)
+
+    # Bound methods are created anew on every access, their object owns the
+    # traced timesteps
+    owner = getattr(network, "__self__", network)
+    method = getattr(network, "__func__", None)
+
+    try:
+        timesteps = _timesteps.setdefault(owner, {})
+    except TypeError:
+        # Not weakly referenceable, trace without caching
+        return _trace_timestep(network, *settings)
+
+    if (method,) + settings not in timesteps:
+        # The cached timestep refers to the network weakly, such that it
+        # does not keep its owner alive
+        ref = weakref.ref(owner)
+        if method is None:
+            def weak_network(x):
+                return ref()(x)
+        else:
+            def weak_network(x):
+                return method(ref(), x)
+
+        timesteps[(method,) + settings] = _trace_timestep(weak_network,
+                                                          *settings)
+
+    return timesteps[(method,) + settings]
+
+
+def _trace_timestep(network, n_domains, nvars, iters, sor, increment, sweep,
+                    tol, n_scenarios, dtype, jit_compile):
+    """
+    Trace a timestep without caching, see `compile_timestep` for the
+    arguments
+
+    Returns:
+        tf.function: Timestep
+    """
+    groups = [tf.constant(domains, dtype=tf.int32)
+              for domains in sweep_groups(n_domains, sweep)]
+    state_spec = tf.TensorSpec((n_scenarios, n_domains + 2, nvars), dtype)
+    tol = -np.inf if tol is None else tol
+
+    def update(cur, nxt, domains):
+        # Subdomains lead the state here such that they can be gathered and
+        # scattered along the first axis
+        x = tf.concat([tf.gather(nxt, domains - 1), tf.gather(cur, domains),
+                       tf.gather(nxt, domains + 1)], axis=-1)
+        out = tf.cast(network(tf.reshape(x, (-1, 3 * nvars))), dtype)
+        out = tf.reshape(out, (-1, n_scenarios, nvars))
+        old = tf.gather(cur, domains)
+
+        if increment:
+            new = old + out
+        else:
+            new = old + (out - old) * sor
+
+        return tf.tensor_scatter_nd_update(nxt, domains[:, None], new)
+
+    @tf.function(input_signature=[state_spec, state_spec,
+                                  tf.TensorSpec((n_scenarios, 2, nvars),
+                                                dtype),
+                                  tf.TensorSpec((), tf.int32)],
+                 jit_compile=jit_compile)
+    def timestep(prev, cur, boundaries, i):
+        prev = tf.transpose(prev, (1, 0, 2))
+        cur = tf.transpose(cur, (1, 0, 2))
+        boundaries = tf.transpose(boundaries, (1, 0, 2))
+
+        # Linear extrapolation as initial guess from the third timestep on,
+        # before that the interior starts from zero
+        interior = tf.where(i > 1, cur[1:-1] + (cur[1:-1] - prev[1:-1]),
+                            tf.zeros_like(cur[1:-1]))
+        nxt = tf.concat([boundaries[:1], interior, boundaries[1:]], axis=0)
+
+        j = tf.constant(0)
+        residual = tf.constant(np.inf, dtype)
+        while j < iters and not residual < tol:
+            old = nxt
+            for domains in groups:
+                nxt = update(cur, nxt, domains)
+            residual = tf.reduce_max(tf.abs(nxt[1:-1] - old[1:-1]))
+            j += 1
+
+        return tf.transpose(nxt, (1, 0, 2)), j, residual
+
+    return timestep
+
+
+def save_checkpoint(path, prev, cur, step, interval=1, scaler=None,
+                    older=None, predictor_state=None):
+    """
+    Write a rollout checkpoint. The file is first written under a temporary
+    name and then moved into place, such that a job that is killed while
+    checkpointing leaves the previous checkpoint intact.
+
+    Args:
+        path (str): Path of the `.npz` checkpoint
+        prev (np.ndarray): State at timestep `step` - 1 in shape
+                           ([nscenarios,] ngrids + 2, nvars)
+        cur (np.ndarray): State at timestep `step` in the same shape
+        step (int): Index of the last completed timestep
+        interval (int, optional): Timestep interval of the model. Defaults
+                                  to 1.
+        scaler (object, optional): Picklable scaler, e.g. a fitted
+                                   `MinMaxScaler`, needed to transform the
+                                   predictions back. Defaults to None.
+        older (np.ndarray, optional): State at timestep `step` - 2, for
+                                      predictors of higher order. Defaults
+                                      to None.
+        predictor_state (dict, optional): State of the predictor, see
+                                          `Linear_extrapolation.get_state`.
+                                          Defaults to None.
+    """
+    scaler = np.frombuffer(pickle.dumps(scaler), dtype=np.uint8)
+    predictor_state = np.frombuffer(pickle.dumps(predictor_state),
+                                    dtype=np.uint8)
+    arrays = {} if older is None else {"older": np.asarray(older)}
+
+    with open(path + ".tmp", "wb") as f:
+        np.savez(f, prev=np.asarray(prev), cur=np.asarray(cur), step=step,
+                 interval=interval, scaler=scaler,
+                 predictor_state=predictor_state, **arrays)
+    os.replace(path + ".tmp", path)
+
+
+def load_checkpoint(path, interval=None):
+    """
+    Read a rollout checkpoint written by `save_checkpoint`
+
+    Args:
+        path (str): Path of the `.npz` checkpoint
+        interval (int, optional): Timestep interval of the model that is to
+                                  resume the rollout. If given, it must match
+                                  the checkpoint. Defaults to None.
+
+    Returns:
+        dict: Checkpoint with the states "prev" and "cur", the timestep index
+              "step" of "cur", the "interval", the "scaler", and the state
+              "older" before "prev" and the "predictor_state", which are
+              None if absent, e.g. in older checkpoints
+    """
+    with np.load(path) as f:
+        checkpoint = {"prev": f["prev"], "cur": f["cur"],
+                      "step": int(f["step"]), "interval": int(f["interval"]),
+                      "scaler": pickle.loads(f["scaler"].tobytes()),
+                      "older": f["older"] if "older" in f else None,
+                      "predictor_state": pickle.loads(
+                          f["predictor_state"].tobytes())
+                      if "predictor_state" in f else None}
+
+    if interval is not None and interval != checkpoint["interval"]:
+        raise ValueError("Checkpoint was written with interval " +
+                         str(checkpoint["interval"]) + ", not " +
+                         str(interval))
+
+    return checkpoint
+
+
+def iter_rollout(boundaries, init_values, timesteps, network, iters=5,
+                 sor=1, increment=False, sweep="gauss-seidel", tol=None,
+                 compiled=False, jit_compile=False, start=0,
+                 prev_values=None, accelerator=None, predictor=None,
+                 older_values=None, predictor_state=None):
+    """
+    Generator that advances the subdomains in time and yields every completed
+    timestep. Only the timesteps needed for the stencil and the linear
+    extrapolation are kept in memory.
+
+    Args:
+        boundaries (np.ndarray): Boundaries in shape (nscenarios, 2, nvars,
+                                 ntimesteps), only read one timestep at a
+                                 time such that this can be memory-mapped
+        init_values (np.ndarray): State at timestep `start` in shape
+                                  (nscenarios, ndomains + 2, nvars),
+                                  including the boundaries
+        timesteps (int): Number of timesteps to predict, counted from the
+                         first timestep
+        network (callable): Maps a batch of stencil inputs of shape
+                            (nbatch, 3*nvars) to predictions of shape
+                            (nbatch, nvars)
+        iters (int, optional): Maximum number of inner iterations per
+                               timestep. Defaults to 5.
+        sor (float, optional): Successive overrelaxation factor. Defaults to
+                               1.
+        increment (bool, optional): Whether the network predicts increments
+                                    instead of whole values. Defaults to
+                                    False.
+        sweep (str, optional): Update order of the subdomains, see
+                               `sweep_groups`. Defaults to "gauss-seidel".
+        tol (float, optional): Residual below which the inner iterations
+                               stop. Defaults to None, i.e. always do `iters`
+                               iterations.
+        compiled (bool, optional): Whether to run every timestep as a single
+                                   traced `tf.function`, see
+                                   `compile_timestep`. The network then needs
+                                   to consist of TensorFlow operations and
+                                   the yielded states are tensors. Defaults
+                                   to False.
+        jit_compile (bool, optional): Whether to compile the timestep with
+                                      XLA, only used if `compiled` is True.
+                                      Defaults to False.
+        start (int, optional): Timestep to resume from. Defaults to 0.
+        prev_values (np.ndarray, optional): State at timestep `start` - 1 in
+                                            the shape of `init_values`,
+                                            needed for the extrapolation when
+                                            resuming. Defaults to None.
+        accelerator (str or object, optional): Accelerator of the inner
+                                               iterations, see
+                                               `get_accelerator`. Only
+                                               supported if `compiled` is
+                                               False. Defaults to None.
+        predictor (str or object, optional): Predictor of the initial guess
+                                             of every timestep, see
+                                             `get_predictor`. Only supported
+                                             if `compiled` is False. Defaults
+                                             to None, i.e. linear
+                                             extrapolation.
+        older_values (np.ndarray, optional): State at timestep `start` - 2
+                                             in the shape of `init_values`,
+                                             needed by predictors of higher
+                                             order when resuming. Defaults
+                                             to None.
+        predictor_state (dict, optional): State of the predictor to resume
+                                          with, see
+                                          `Linear_extrapolation.get_state`.
+                                          Defaults to None.
+
+    Yields:
+        tuple: State at the next timestep in shape (nscenarios,
+               ndomains + 2, nvars), number of inner iterations done and the
+               final residual, i.e. the largest change over all scenarios
+               in the last iteration
+    """
+    if compiled and (accelerator is not None or predictor is not None):
+        raise NotImplementedError("Accelerators and predictors are only \
+supported in eager rollouts")
+
+    if compiled:
+        timestep = compile_timestep(
+            network, init_values.shape[1] - 2, init_values.shape[2],
+            iters=iters, sor=sor, increment=increment, sweep=sweep, tol=tol,
+            n_scenarios=init_values.shape[0],
+            dtype=tf.as_dtype(init_values.dtype), jit_compile=jit_compile)
+
+        prev = cur = tf.constant(init_values)
+        if prev_values is not None:
+            prev = tf.constant(prev_values, dtype=cur.dtype)
+
+        for i in range(start, timesteps):
+            nxt, j, residual = timestep(prev, cur, boundaries[..., i+1], i)
+            prev, cur = cur, nxt
+
+            yield nxt, j, residual
+
+        return
+
+    groups = sweep_groups(init_values.shape[1] - 2, sweep)
+    accelerator = get_accelerator(accelerator)
+    predictor = get_predictor(predictor)
+    predictor.reset()
+    if predictor_state is not None:
+        predictor.set_state(predictor_state)
+
+    # Window over the timesteps i-2, i-1, i and i+1, of which the first
+    # `history` past timesteps are known
+    window = np.zeros(init_values.shape + (4,), dtype=init_values.dtype)
+    window[..., 2] = init_values
+    history = 1
+    if prev_values is not None:
+        window[..., 1] = prev_values
+        history = 2
+        if older_values is not None:
+            window[..., 0] = older_values
+            history = 3
+
+    for i in range(start, timesteps):
+        window[..., 3][:, [0, -1]] = boundaries[..., i+1]
+
+        # Let's start with an extrapolation for the predictions
+        window[:, 1:-1, :, 3] = predictor(
+            i, [window[:, 1:-1, :, 2 - k] for k in range(history)])
+        guess = window[:, 1:-1, :, 3].copy()
+
+        residual = np.nan
+        accelerator.reset()
+        for j in range(iters):
+            # Inner optimization loop within a timestep
+            old = window[:, 1:-1, :, 3].copy()
+            schwarz_iteration(window, 2, network, groups, sor=sor,
+                              increment=increment)
+            residual = np.abs(window[:, 1:-1, :, 3] - old).max()
+
+            if tol is not None and residual < tol:
+                break
+
+            # Only extrapolate if a sweep evaluates the result
+            if j < iters - 1:
+                window[:, 1:-1, :, 3] = accelerator(old,
+                                                    window[:, 1:-1, :, 3])
+        else:
+            j = iters - 1
+
+        predictor.update(i, guess, window[:, 1:-1, :, 3])
+
+        yield window[..., 3].copy(), j + 1, residual
+
+        window = np.roll(window, -1, axis=-1)
+        history = min(history + 1, 3)
+
+
+def rollout(pred_vars, timesteps, network, iters=5, sor=1, increment=False,
+            sweep="gauss-seidel", timestep_print_interval=None,
+            save_interval=None, save_path=None, tol=None, compiled=False,
+            jit_compile=False, checkpoint_path=None, checkpoint_interval=100,
+            checkpoint=None, interval=1, scaler=None, accelerator=None,
+            predictor=None):
+    """
+    Advance the state in time, updating `pred_vars` in place.
+
+    Args:
+        pred_vars (np.ndarray): State in shape (ndomains + 2, nvars,
+                                ntimesteps), with the boundaries in the first
+                                and last subdomain and the initial values at
+                                the first timestep. An ensemble of scenarios
+                                can be advanced together by adding a leading
+                                scenario axis
+        timesteps (int): Number of timesteps to predict
+        network (callable): Maps a batch of stencil inputs of shape
+                            (nbatch, 3*nvars) to predictions of shape
+                            (nbatch, nvars)
+        iters (int, optional): Maximum number of inner iterations per
+                               timestep. Defaults to 5.
+        sor (float, optional): Successive overrelaxation factor. Defaults to
+                               1.
+        increment (bool, optional): Whether the network predicts increments
+                                    instead of whole values. Defaults to
+                                    False.
+        sweep (str, optional): Update order of the subdomains, see
+                               `sweep_groups`. Defaults to "gauss-seidel".
+        timestep_print_interval (int, optional): Interval at which to print
+                                                 the current timestep.
+                                                 Defaults to None.
+        save_interval (int, optional): Interval at which to save the state.
+                                       Defaults to None.
+        save_path (str, optional): Path prefix to save the state to. Defaults
+                                   to None.
+        tol (float, optional): Stop the inner iterations of a timestep once
+                               the largest absolute change of the predicted
+                               subdomains between two iterations drops below
+                               this value. Defaults to None, i.e. always do
+                               `iters` iterations.
+        compiled (bool, optional): Whether to run every timestep as a single
+                                   traced `tf.function`, see
+                                   `compile_timestep`. The network then needs
+                                   to consist of TensorFlow operations. The
+                                   state then stays in TensorFlow and is only
+                                   copied back to `pred_vars` when it is
+                                   saved and at the end of the rollout.
+                                   Defaults to False.
+        jit_compile (bool, optional): Whether to compile the timestep with
+                                      XLA, only used if `compiled` is True.
+                                      Defaults to False.
+        checkpoint_path (str, optional): Path of the `.npz` checkpoint that
+                                         is written every
+                                         `checkpoint_interval` timesteps and
+                                         at the end, see `save_checkpoint`.
+                                         Defaults to None.
+        checkpoint_interval (int, optional): Interval in timesteps at which
+                                             the checkpoint is written.
+                                             Defaults to 100.
+        checkpoint (dict, optional): Checkpoint returned by
+                                     `load_checkpoint` to resume from. Only
+                                     the timesteps in the checkpoint and the
+                                     ones after are filled in. Defaults to
+                                     None.
+        interval (int, optional): Timestep interval stored in the checkpoint.
+                                  Defaults to 1.
+        scaler (object, optional): Scaler stored in the checkpoint. Defaults
+                                   to None.
+        accelerator (str or object, optional): Accelerator of the inner
+                                               iterations, see
+                                               `iter_rollout`. Defaults to
+                                               None.
+        predictor (str or object, optional): Predictor of the initial guess
+                                             of every timestep, see
+                                             `iter_rollout`. Defaults to
+                                             None.
+
+    Returns:
+        tuple: The updated state and a dictionary with the number of inner
+               iterations ("iters") and the final residual ("residuals") of
+               every timestep, where the residual is the largest over all
+               scenarios
+    """
+    # A single scenario is run as an ensemble of one, `state` is a view such
+    # that `pred_vars` is updated in place
+    single = pred_vars.ndim == 3
+    state = pred_vars[None] if single else pred_vars
+
+    # Resolved here such that its state can be checkpointed
+    if predictor is not None:
+        predictor = get_predictor(predictor)
+
+    start = 0
+    older = predictor_state = None
+    if checkpoint is not None:
+        start = checkpoint["step"]
+        pred_vars[..., start-1] = checkpoint["prev"]
+        pred_vars[..., start] = checkpoint["cur"]
+        if checkpoint.get("older") is not None:
+            pred_vars[..., start-2] = checkpoint["older"]
+            older = state[..., start-2]
+        predictor_state = checkpoint.get("predictor_state")
+
+    steps = iter_rollout(state[:, [0, -1]], state[..., start], timesteps,
+                         network, iters=iters, sor=sor, increment=increment,
+                         sweep=sweep, tol=tol, compiled=compiled,
+                         jit_compile=jit_compile, start=start,
+                         prev_values=state[..., start-1] if start else None,
+                         accelerator=accelerator, predictor=predictor,
+                         older_values=older, predictor_state=predictor_state)
+    before = state[..., start-1] if start else None
+    last = state[..., start]
+
+    # Completed timesteps that are not yet copied into the state
+    pending = []
+    n_iters = []
+    residuals = []
+
+    def squeeze(values):
+        # Checkpoints of a single scenario have no scenario axis
+        if values is None or not single:
+            return values
+        return np.asarray(values)[0]
+
+    def flush(i):
+        if pending:
+            state[:, 1:-1, :, i+1-len(pending):i+1] = \
+                np.stack(pending, axis=-1)[:, 1:-1]
+            pending.clear()
+
+    for i in range(start, timesteps):
+        # Outer "timesteps" loop
+
+        if timestep_print_interval is not None and i % \
+           timestep_print_interval == 0:
+            print("At timestep number ", i)
+
+        if save_interval is not None and i % save_interval == 0:
+            flush(i)
+            np.save(save_path + str(i), pred_vars)
+
+        values, j, residual = next(steps)
+        pending.append(values)
+        n_iters.append(j)
+        residuals.append(residual)
+
+        if not compiled:
+            flush(i + 1)
+
+        if checkpoint_path is not None and \
+           ((i + 1) % checkpoint_interval == 0 or i + 1 == timesteps):
+            save_checkpoint(
+                checkpoint_path, squeeze(last), squeeze(values), i + 1,
+                interval=interval, scaler=scaler, older=squeeze(before),
+                predictor_state=None if predictor is None else
+                predictor.get_state())
+        before, last = last, values
+
+    flush(timesteps)
+
+    n_steps = max(timesteps - start, 0)
+    info = {"iters": np.array(n_iters, dtype=int).reshape(n_steps),
+            "residuals": np.array(residuals, dtype=float).reshape(n_steps)}
+    info["residuals"][info["iters"] == 0] = np.nan
+
+    return pred_vars, info
+
+
+def stream_rollout(boundaries, init_values, timesteps, network, out_path=None,
+                   flush_interval=100, timestep_print_interval=None,
+                   checkpoint_path=None, checkpoint_interval=100,
+                   checkpoint=None, interval=1, scaler=None, **kwargs):
+    """
+    Generator that streams a rollout timestep by timestep, optionally writing
+    every completed timestep to a memory-mapped `.npy` file. The file is laid
+    out with time on the first axis, i.e. in shape (timesteps + 1,
+    [nscenarios,] ndomains + 2, nvars), such that every timestep is a
+    contiguous block and the file can be read with
+    `np.load(out_path, mmap_mode="r")` while the rollout is still running.
+    Timesteps that are not yet predicted read as zeros. The state and the file
+    have the data type of the initial values. When resuming from a checkpoint
+    an existing file is reopened and appended to.
+
+    Args:
+        boundaries (np.ndarray): Boundaries in shape (2, nvars, ntimesteps)
+                                 or (nscenarios, 2, nvars, ntimesteps)
+        init_values (np.ndarray): Initial values in shape (ngrids, nvars) or
+                                  (nscenarios, ngrids, nvars)
+        timesteps (int): Number of timesteps to predict
+        network (callable): Maps a batch of stencil inputs of shape
+                            (nbatch, 3*nvars) to predictions of shape
+                            (nbatch, nvars)
+        out_path (str, optional): Path of the `.npy` file to write to.
+                                  Defaults to None, i.e. nothing is written.
+        flush_interval (int, optional): Interval in timesteps at which the
+                                        file is flushed to disk. Defaults to
+                                        100.
+        timestep_print_interval (int, optional): Interval at which to print
+                                                 the current timestep.
+                                                 Defaults to None.
+        checkpoint_path (str, optional): Path of the `.npz` checkpoint, see
+                                         `rollout`. Defaults to None.
+        checkpoint_interval (int, optional): Interval in timesteps at which
+                                             the checkpoint is written.
+                                             Defaults to 100.
+        checkpoint (dict, optional): Checkpoint returned by
+                                     `load_checkpoint` to resume from.
+                                     Defaults to None.
+        interval (int, optional): Timestep interval stored in the checkpoint.
+                                  Defaults to 1.
+        scaler (object, optional): Scaler stored in the checkpoint. Defaults
+                                   to None.
+        **kwargs: Remaining arguments of `iter_rollout`
+
+    Yields:
+        np.ndarray: Predicted values at the next timestep in shape
+                    ([nscenarios,] ngrids + 2, nvars), including the
+                    boundaries
+    """
+    single = boundaries.ndim == 3
+    if single:
+        boundaries, init_values = boundaries[None], init_values[None]
+
+    # Resolved here such that its state can be checkpointed
+    predictor = kwargs.get("predictor")
+    if predictor is not None:
+        predictor = kwargs["predictor"] = get_predictor(predictor)
+
+    start = 0
+    prev = older = predictor_state = None
+    state = np.zeros(init_values.shape[:1] +
+                     (init_values.shape[1] + 2, init_values.shape[2]),
+                     dtype=init_values.dtype)
+    state[:, [0, -1]] = boundaries[..., 0]
+    state[:, 1:-1] = init_values
+
+    if checkpoint is not None:
+        start = checkpoint["step"]
+        prev = checkpoint["prev"][None] if single else checkpoint["prev"]
+        state = checkpoint["cur"][None] if single else checkpoint["cur"]
+        if checkpoint.get("older") is not None:
+            older = checkpoint["older"][None] if single else \
+                checkpoint["older"]
+        predictor_state = checkpoint.get("predictor_state")
+
+    out = None
+    if out_path is not None:
+        shape = (timesteps + 1,) + state.shape[single:]
+        if checkpoint is not None and os.path.exists(out_path):
+            out = open_memmap(out_path, mode="r+")
+            if out.shape != shape:
+                raise ValueError("Cannot resume into " + out_path +
+                                 " of shape " + str(out.shape))
+        else:
+            out = open_memmap(out_path, mode="w+", dtype=state.dtype,
+                              shape=shape)
+            if prev is not None:
+                out[start - 1] = prev[0] if single else prev
+            if older is not None:
+                out[start - 2] = older[0] if single else older
+
+        out[start] = state[0] if single else state
+
+    steps = iter_rollout(boundaries, state, timesteps, network, start=start,
+                         prev_values=prev, older_values=older,
+                         predictor_state=predictor_state, **kwargs)
+    before = prev if prev is None or not single else prev[0]
+    last = state[0] if single else state
+
+    for i in range(start, timesteps):
+
+        if timestep_print_interval is not None and i % \
+           timestep_print_interval == 0:
+            print("At timestep number ", i)
+
+        values = np.asarray(next(steps)[0])
+        values = values[0] if single else values
+
+        if out is not None:
+            out[i + 1] = values
+            if (i + 1) % flush_interval == 0:
+                out.flush()
+
+        if checkpoint_path is not None and \
+           ((i + 1) % checkpoint_interval == 0 or i + 1 == timesteps):
+            if out is not None:
+                # The checkpoint must never be ahead of the file
+                out.flush()
+            save_checkpoint(checkpoint_path, last, values, i + 1,
+                            interval=interval, scaler=scaler, older=before,
+                            predictor_state=None if predictor is None else
+                            predictor.get_state())
+        before, last = last, values
+
+        yield values
+
+    if out is not None:
+        out.flush()
+
+
+def parareal_rollout(pred_vars, timesteps, network, n_slices, coarse_iters=1,
+                     parareal_tol=1e-6, max_parareal_iters=None, workers=None,
+                     timestep_print_interval=None, **kwargs):
+    """
+    Advance the state in time with the parareal algorithm, updating
+    `pred_vars` in place. The horizon is split into `n_slices` time slices.
+    A cheap coarse propagator sweeps all slices sequentially, after which the
+    fine propagator, i.e. the full rollout, solves every slice in parallel
+    from the current estimate of its initial state. The initial states are
+    then corrected with the parareal update
+
+        U[n+1] = F(U_old[n]) + G(U[n]) - G(U_old[n])
+
+    until they change less than `parareal_tol`. The state of a slice
+    consists of the last three timesteps before it and the state of the
+    predictor, like a rollout checkpoint, such that every slice continues as
+    the sequential rollout would. After k parareal iterations the first k
+    slices therefore equal the sequential rollout, and at most `n_slices`
+    iterations are needed.
+
+    The slices run in a thread pool, TensorFlow releases the global
+    interpreter lock while evaluating the network, which is most effective
+    with `compiled` rollouts.
+
+    Args:
+        pred_vars (np.ndarray): State in shape ([nscenarios,] ndomains + 2,
+                                nvars, ntimesteps), see `rollout`
+        timesteps (int): Number of timesteps to predict
+        network (callable): Maps a batch of stencil inputs of shape
+                            (nbatch, 3*nvars) to predictions of shape
+                            (nbatch, nvars)
+        n_slices (int): Number of time slices
+        coarse_iters (int, optional): Inner iterations per timestep of the
+                                      coarse propagator. With 0 the coarse
+                                      propagator only extrapolates without
+                                      network calls, which is only accurate
+                                      enough for short slices. Defaults to
+                                      1.
+        parareal_tol (float, optional): Largest change of the initial states
+                                        of the slices between two parareal
+                                        iterations at which to stop, with 0
+                                        all iterations are done and the
+                                        result equals the sequential rollout.
+                                        Defaults to 1e-6.
+        max_parareal_iters (int, optional): Maximum number of parareal
+                                            iterations. Defaults to None,
+                                            i.e. `n_slices`.
+        workers (int, optional): Number of threads. Defaults to None, i.e.
+                                 one per slice.
+        timestep_print_interval (int, optional): Interval at which to print
+                                                 the number of the parareal
+                                                 iteration. Defaults to None.
+        **kwargs: Remaining arguments of `iter_rollout`, such as `iters`,
+                  `sweep`, `tol` and `compiled`. Accelerators and predictors
+                  are copied for every slice, the latter continuing from the
+                  state carried in the slice.
+
+    Returns:
+        tuple: The updated state and a dictionary with the number of inner
+               iterations ("iters") and final residual ("residuals") of every
+               timestep, the number of parareal iterations
+               ("parareal_iters") and the largest change of the initial
+               states in every parareal iteration ("parareal_changes")
+    """
+    single = pred_vars.ndim == 3
+    state = pred_vars[None] if single else pred_vars
+    boundaries = state[:, [0, -1]]
+
+    bounds = np.unique(np.linspace(0, timesteps, n_slices + 1).astype(int))
+    n_slices = len(bounds) - 1
+    max_parareal_iters = max_parareal_iters or n_slices
+
+    # Resolved here such that its state can be carried between slices
+    if kwargs.get("predictor") is not None:
+        kwargs["predictor"] = get_predictor(kwargs["predictor"])
+
+    def propagate(u, n, iters=None):
+        # Run slice n from its initial state u, i.e. the timesteps up to
+        # bounds[n], of which there is only one at the start, and the state
+        # of the predictor
+        slice_kwargs = {key: value if isinstance(value, str) or
+                        key not in ("accelerator", "predictor")
+                        else copy.deepcopy(value)
+                        for key, value in kwargs.items()}
+        if iters is not None:
+            slice_kwargs["iters"] = iters
+
+        values, predictor_state = u
+        steps = [(np.asarray(values), int(j), float(residual))
+                 for values, j, residual in iter_rollout(
+                     boundaries, values[-1], bounds[n + 1], network,
+                     start=bounds[n],
+                     prev_values=values[-2] if len(values) > 1 else None,
+                     older_values=values[-3] if len(values) > 2 else None,
+                     predictor_state=predictor_state, **slice_kwargs)]
+
+        predictor = slice_kwargs.get("predictor")
+        return steps, None if predictor is None else predictor.get_state()
+
+    def end(u, propagated):
+        # Initial state of the next slice from the last three timesteps
+        steps, predictor_state = propagated
+        values = np.concatenate([u[0], np.stack([v for v, _, _ in steps])])
+
+        return values[-3:], predictor_state
+
+    # Initial estimate with a sequential coarse sweep
+    u = [(state[..., 0][None], None)]
+    coarse = []
+    for n in range(n_slices):
+        coarse.append(end(u[n], propagate(u[n], n, coarse_iters)))
+        u.append(coarse[-1])
+
+    fine = [None] * n_slices
+    changes = []
+    with ThreadPoolExecutor(max_workers=workers or n_slices) as pool:
+        for k in range(max_parareal_iters):
+
+            if timestep_print_interval is not None and k % \
+               timestep_print_interval == 0:
+                print("At parareal iteration ", k)
+
+            # Fine propagation of all slices that are not yet exact
+            fine[k:] = pool.map(propagate, u[k:-1], range(k, n_slices))
+
+            # Sequential correction with the coarse propagator
+            u_new = u[:k+1]
+            for n in range(k, n_slices):
+                f = end(u[n], fine[n])
+                if n == k:
+                    u_new.append(f)
+                    continue
+
+                g = end(u_new[n], propagate(u_new[n], n, coarse_iters))
+                # The predictor continues from the fine propagation
+                u_new.append((f[0] + (g[0] - coarse[n][0]), f[1]))
+                coarse[n] = g
+
+            changes.append(max(np.abs(a[0][-1] - b[0][-1]).max()
+                               for a, b in zip(u_new[1:], u[1:])))
+            u = u_new
+
+            if changes[-1] <= parareal_tol:
+                break
+
+    steps = [step for steps, _ in fine for step in steps]
+    state[:, 1:-1, :, 1:timesteps+1] = \
+        np.stack([values for values, _, _ in steps], axis=-1)[:, 1:-1]
+
+    info = {"iters": np.array([j for _, j, _ in steps], dtype=int),
+            "residuals": np.array([r for _, _, r in steps], dtype=float),
+            "parareal_iters": len(changes),
+            "parareal_changes": np.array(changes)}
+    info["residuals"][info["iters"] == 0] = np.nan
+
+    return pred_vars, info
@@ -0,0 +1,443 @@
+"""
+
+Sinks of the metrics of every epoch of training, which replace the
+TensorBoard writers and `wandb.log` calls on the training thread. An
+`Async_sink` hands the metrics to a background thread, which writes them to
+its sinks and flushes those in batches, such that logging never stalls the
+training. Every `train` method takes a list of sinks:
+
+    sinks = [Tensorboard_sink("logs/run"), File_sink("logs/run.jsonl")]
+    model.train(data, 100, sinks=sinks)
+
+Without sinks the models log to TensorBoard in a timestamped directory under
+`logs/` as before, and `wandb_log=True` adds a `Wandb_sink`. The wandb
+package is only imported by the wandb sink, and on nodes without network
+access an `Offline_wandb_sink` writes the same records to a file, which
+`replay_wandb` logs to a wandb run later on.
+
+The metrics are named "loss", "accuracy", "g_loss" and "d_loss", for the
+loss and accuracy of the autoencoder and the losses of the generator and
+discriminator, per split "train" or "val". The instrumentation of the
+training loops writes the split "timing", see `timing`. In TensorBoard the
+autoencoder metrics of an `AAE` keep their former tags "loss - ae" and
+"accuracy - ae", for which its own sinks take `tags=AAE_TENSORBOARD_TAGS`.
+
+"""
+
+import datetime
+import threading
+import time
+import atexit
+import queue
+import json
+import csv
+import os
+import tensorflow as tf
+from ddganAE.models.distribute import is_chief
+
+__author__ = "Zef Wolffs"
+__credits__ = []
+__license__ = "MIT"
+__version__ = "1.0.0"
+__maintainer__ = "Zef Wolffs"
+__email__ = "zefwolffs@gmail.com"
+__status__ = "Development"
+
+FILE_FORMATS = (".jsonl", ".csv")
+
+# Tags of the metrics in TensorBoard, the others are tagged by their name
+TENSORBOARD_TAGS = {"g_loss": "loss - g", "d_loss": "loss - d"}
+
+# Tags of the autoencoder metrics of `AAE`, which are told apart from those of
+# its generator and discriminator
+AAE_TENSORBOARD_TAGS = {"loss": "loss - ae", "accuracy": "accuracy - ae"}
+
+# Names of the splits in the keys of wandb
+WANDB_SPLITS = {"train": "train", "val": "valid"}
+
+# Markers on the queue of an `Async_sink`
+_FLUSH = object()
+_CLOSE = object()
+
+
+def wandb_key(name, split):
+    """
+    Key of a metric in wandb, e.g. "g_valid_loss" for "g_loss" in "val", and
+    "timing/time_epoch" for "time_epoch" in other splits such as "timing"
+
+    Args:
+        name (str): Name of the metric
+        split (str): Split
+
+    Returns:
+        str: Key
+    """
+    if split not in WANDB_SPLITS:
+        return "%s/%s" % (split, name)
+
+    prefix, _, quantity = name.rpartition("_")
+
+    return "_".join(filter(None, [prefix, WANDB_SPLITS[split], quantity]))
+
+
+class Metric_sink:
+    """
+    Destination of the metrics of the epochs, which does nothing by itself.
+    Sinks are not thread-safe, and can be written to again after they are
+    closed.
+    """
+
+    def write(self, step, split, metrics):
+        """
+        Write the metrics of a step
+
+        Args:
+            step (int): Step, i.e. the epoch
+            split (str): Split, "train" or "val"
+            metrics (dict): Values of the metrics by name
+        """
+
+    def flush(self):
+        """
+        Push the written metrics to their destination
+        """
+
+    def close(self):
+        """
+        Flush and release the resources of the sink
+        """
+        self.flush()
+
+
+class Tensorboard_sink(Metric_sink):
+    """
+    Scalars in TensorBoard, with a directory per split
+    """
+
+    def __init__(self, logdir=None, tags=None):
+        """
+        Constructor
+
+        Args:
+            logdir (str, optional): Directory of the logs. Defaults to None,
+                                    i.e. a timestamped directory under
+                                    "logs/".
+            tags (dict, optional): Tags of metrics by name, besides those of
+                                   `TENSORBOARD_TAGS`, e.g.
+                                   `AAE_TENSORBOARD_TAGS`. Defaults to None.
+        """
+        if logdir is None:
+            logdir = os.path.join("logs", datetime.datetime.now().strftime(
+                "%Y%m%d-%H%M%S"))
+
+        self.logdir = logdir
+        self.tags = dict(TENSORBOARD_TAGS, **(tags or {}))
+        self._writers = {}
+
+    def write(self, step, split, metrics):
+        if split not in self._writers:
+            self._writers[split] = tf.summary.create_file_writer(
+                os.path.join(self.logdir, split))
+
+        with self._writers[split].as_default():
+            for name, value in metrics.items():
+                tf.summary.scalar(self.tags.get(name, name),
+                                  float(value), step=step)
+
+    def flush(self):
+        for writer in self._writers.values():
+            writer.flush()
+
+    def close(self):
+        for writer in self._writers.values():
+            writer.close()
+        self._writers = {}
+
+
+class File_sink(Metric_sink):
+    """
+    Local file with a record per line, either JSON objects with the step,
+    the split and the metrics, or CSV rows with the step, the split, the
+    name and the value of a metric
+    """
+
+    def __init__(self, path):
+        """
+        Constructor
+
+        Args:
+            path (str): Path of the file, whose extension is one of
+                        `FILE_FORMATS`. Records are appended to an existing
+                        file.
+        """
+        self.format = os.path.splitext(path)[1]
+        if self.format not in FILE_FORMATS:
+            raise ValueError("Unknown file format '%s', choose one of %s" %
+                             (self.format, ", ".join(FILE_FORMATS)))
+
+        self.path = path
+        self._file = None
+
+    def _open(self):
+        """
+        Open the file for appending, with a header for a new CSV file
+        """
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        new = not os.path.exists(self.path) or \
+            os.path.getsize(self.path) == 0
+        self._file = open(self.path, "a", newline="")
+
+        if self.format == ".csv" and new:
+            csv.writer(self._file).writerow(["step", "split", "metric",
+                                             "value"])
+
+    def write(self, step, split, metrics):
+        if self._file is None:
+            self._open()
+
+        if self.format == ".jsonl":
+            record = {"step": step, "split": split}
+            record.update({name: float(value)
+                           for name, value in metrics.items()})
+            self._file.write(json.dumps(record) + "\n")
+        else:
+            csv.writer(self._file).writerows(
+                [step, split, name, float(value)]
+                for name, value in metrics.items())
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+        self._file = None
+
+
+class Wandb_sink(Metric_sink):
+    """
+    Metrics logged to the active wandb run, with a `wandb.log` call per epoch
+    that holds the metrics of all splits, as logged by `wandb_log=True`
+    """
+
+    def __init__(self):
+        """
+        Constructor
+        """
+        self._log = None
+
+    def write(self, step, split, metrics):
+        # The splits of a step are logged together
+        if self._log is not None and self._log["epoch"] != step:
+            self._emit()
+
+        if self._log is None:
+            self._log = {"epoch": step}
+        self._log.update({wandb_key(name, split): float(value)
+                          for name, value in metrics.items()})
+
+    def close(self):
+        if self._log is not None:
+            self._emit()
+
+    def _emit(self):
+        """
+        Log the metrics of the pending step
+        """
+        self.log(self._log)
+        self._log = None
+
+    def log(self, log):
+        """
+        Log the metrics of a step to wandb
+
+        Args:
+            log (dict): Metrics by key, and the epoch
+        """
+        import wandb
+
+        wandb.log(log)
+
+
+class Offline_wandb_sink(Wandb_sink):
+    """
+    Stand-in for a `Wandb_sink` without wandb, e.g. on nodes without network
+    access, which writes the records that would be logged to wandb as JSON
+    lines, see `replay_wandb`
+    """
+
+    def __init__(self, path):
+        """
+        Constructor
+
+        Args:
+            path (str): Path of the file, records are appended to an
+                        existing file
+        """
+        super().__init__()
+        self.path = path
+
+    def log(self, log):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with open(self.path, "a") as f:
+            f.write(json.dumps(log) + "\n")
+
+
+def replay_wandb(path):
+    """
+    Log the records of an `Offline_wandb_sink` to the active wandb run
+
+    Args:
+        path (str): Path of the file
+    """
+    import wandb
+
+    with open(path) as f:
+        for line in f:
+            wandb.log(json.loads(line))
+
+
+class Async_sink(Metric_sink):
+    """
+    Sinks written to by a background thread, which takes the metrics from a
+    queue and flushes the sinks at an interval, when idle and when closed.
+    Errors of the sinks are raised by the next call on the training thread.
+    """
+
+    def __init__(self, sinks, flush_interval=10.):
+        """
+        Constructor
+
+        Args:
+            sinks (list): Sinks to write to
+            flush_interval (float, optional): Maximum interval in seconds
+                                              between flushes of the sinks.
+                                              Defaults to 10.
+        """
+        self.sinks = list(sinks)
+        self.flush_interval = flush_interval
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._error = None
+
+    def _raise(self):
+        """
+        Raise the error of the background thread, if any
+        """
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _run(self):
+        """
+        Write and flush the sinks until closed
+        """
+        written = False
+        flushed = time.monotonic()
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                # Idle
+                item = None
+
+            try:
+                # After an error the sinks are in an unknown state, and the
+                # metrics are discarded
+                if self._error is None:
+                    if item is _CLOSE:
+                        for sink in self.sinks:
+                            sink.close()
+                        written = False
+                    elif isinstance(item, tuple):
+                        for sink in self.sinks:
+                            sink.write(*item)
+                        written = True
+
+                    if written and (item is None or item is _FLUSH or
+                                    time.monotonic() - flushed >=
+                                    self.flush_interval):
+                        for sink in self.sinks:
+                            sink.flush()
+                        written = False
+                        flushed = time.monotonic()
+            except Exception as error:
+                self._error = error
+            finally:
+                if item is not None:
+                    self._queue.task_done()
+
+            if item is _CLOSE:
+                return
+
+    def write(self, step, split, metrics):
+        self._raise()
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+            # Metrics that are still queued are written before exiting
+            atexit.register(self.close)
+
+        self._queue.put((step, split, dict(metrics)))
+
+    def flush(self):
+        """
+        Flush the sinks and wait until they are flushed
+        """
+        if self._thread is not None:
+            self._queue.put(_FLUSH)
+            self._queue.join()
+
+        self._raise()
+
+    def close(self):
+        """
+        Close the sinks and stop the background thread
+        """
+        if self._thread is not None:
+            self._queue.put(_CLOSE)
+            self._thread.join()
+            self._thread = None
+            atexit.unregister(self.close)
+
+        self._raise()
+
+
+def training_sink(sinks=None, wandb_log=False, strategy=None, tags=None):
+    """
+    Asynchronous sink of the metrics of a `train` call, which only writes on
+    the chief of data-parallel training
+
+    Args:
+        sinks (list, optional): Sinks. Defaults to None, i.e. a
+                                `Tensorboard_sink` in a timestamped
+                                directory.
+        wandb_log (bool, optional): Whether to log to wandb as well. Defaults
+                                    to False.
+        strategy (tf.distribute.Strategy, optional): Strategy. Defaults to
+                                                     None.
+        tags (dict, optional): Tags of the metrics of the default
+                               `Tensorboard_sink`, see `Tensorboard_sink`.
+                               Defaults to None.
+
+    Returns:
+        Async_sink: Sink, to close after training
+    """
+    if not is_chief(strategy):
+        return Async_sink([])
+
+    if sinks is None:
+        sinks = [Tensorboard_sink(tags=tags)]
+    if wandb_log:
+        sinks = list(sinks) + [Wandb_sink()]
+
+    return Async_sink(sinks)
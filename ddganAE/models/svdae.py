@@ -7,11 +7,16 @@ encoder and decoder architectures in architectures directory.
 
 from keras.layers import Input, Conv1D
 from keras.models import Model
-import tensorflow as tf
-import datetime
 from ddganAE.utils import calc_pod, mse_weighted
+from ddganAE.backends import Numpy_mlp
+from ddganAE.preprocessing import Sample_batches
+from ddganAE.models.precision import mixed_model, mixed_optimizer, \
+    host_dtype, cast_data
+from ddganAE.models.distribute import check_strategy, worker_shard, \
+    run_epoch
+from ddganAE.models.sinks import training_sink
+from ddganAE.models.timing import phase_timer
 import numpy as np
-import wandb
 
 __author__ = "Zef Wolffs"
 __credits__ = []
@@ -27,7 +32,8 @@ class SVDAE:
     SVD Autoencoder class
     """
 
-    def __init__(self, encoder, decoder, optimizer, seed=None):
+    def __init__(self, encoder, decoder, optimizer, seed=None,
+                 precision=None):
         """
         Constructor, create an instance of SVD autoencoder
 
@@ -37,13 +43,20 @@ class SVDAE:
             optimizer (tf.keras.optimizers.Optimizer): Optimization method
             seed (int, optional): Seed that will be used wherever possible.
                                   Defaults to None.
+            precision (str, optional): Mixed precision of the networks and
+                                       the data fed to them, "float16" or
+                                       "bfloat16", see
+                                       `ddganAE.models.precision`. Defaults
+                                       to None, i.e. float32.
         """
-        self.encoder = encoder
-        self.decoder = decoder
+        self.encoder = mixed_model(encoder, precision)
+        self.decoder = mixed_model(decoder, precision)
         self.seed = seed
         self.latent_dim = self.decoder.layers[0].input_shape[1]
 
-        self.optimizer = optimizer
+        self.precision = precision
+        self.optimizer = mixed_optimizer(optimizer, precision)
+        self._numpy_mlp = None
 
     def calc_pod(self, snapshots, nPOD=-2, cumulative_tol=0.99):
         """
@@ -123,7 +136,8 @@ class SVDAE:
                                      )
 
     def train(self, train_data, epochs, val_data=None, batch_size=128,
-              val_batch_size=128, wandb_log=False):
+              val_batch_size=128, wandb_log=False, strategy=None,
+              checkpoint=None, resume=False, sinks=None, timer=None):
         """
         Training SVD autoencoder model
 
@@ -139,11 +153,49 @@ class SVDAE:
                                         function needs to be called in
                                         wandb.init() scope for this to work.
                                         Defaults to False.
+            strategy (tf.distribute.Strategy, optional): Strategy of
+                                                         data-parallel
+                                                         training, in whose
+                                                         scope the model is
+                                                         constructed and
+                                                         compiled, see
+                                                         `distribute`. The
+                                                         batch sizes are
+                                                         per worker.
+                                                         Defaults to None.
+            checkpoint (Training_checkpoint, optional): Checkpoints of
+                                                        the training
+                                                        state, see
+                                                        `checkpoint`.
+                                                        Defaults to None.
+            resume (bool, optional): Whether to resume from the latest
+                                     checkpoint, if any, until `epochs`
+                                     epochs are done in total. Defaults to
+                                     False.
+            sinks (list, optional): Sinks of the metrics of every epoch,
+                                    which are written in the background, see
+                                    `sinks`. Defaults to None, i.e.
+                                    TensorBoard logs in a timestamped
+                                    directory under "logs/".
+            timer (Phase_timer, optional): Instrumentation of the POD and
+                                           the epochs, whose metrics are
+                                           written to the sinks, see
+                                           `timing`. The POD is part of the
+                                           first epoch. Defaults to None.
         """
+        check_strategy(strategy, self.seed)
+
+        # The frozen NumPy runtime no longer matches the trained weights
+        self._numpy_mlp = None
+
+        timer = phase_timer(timer)
+        timer.start()
 
         loss_val = None
+        shard = worker_shard(strategy)
         # Returns POD as list of pod coefficients per subgrid
-        coeffs = self.calc_pod(train_data, self.nPOD)
+        with timer.phase("pod"):
+            coeffs = self.calc_pod(train_data, self.nPOD)
 
         if self.weight_loss:
             # Rescale
@@ -162,11 +214,10 @@ class SVDAE:
             # Convolutional networks require a slightly different input shape
             train_data = np.expand_dims(train_data, 1)
 
-        train_dataset = tf.data.Dataset.from_tensor_slices(train_data)
-        train_dataset = train_dataset.shuffle(buffer_size=train_data.shape[0],
-                                              reshuffle_each_iteration=True,
-                                              seed=self.seed).\
-            batch(batch_size)
+        dtype = host_dtype(self.precision)
+        train_batches = Sample_batches(train_data, self.seed, dtype)
+        train_dataset = train_batches.dataset(batch_size, shard=shard)
+        val_batches = None
 
         if val_data is not None:
 
@@ -184,7 +235,8 @@ class SVDAE:
                     out[:, iGrid*val_data[0].shape[-1]:(iGrid+1) *
                         val_data[0].shape[-1]]
 
-                coeffs.append(np.dot(self.R.T, snapshots_per_grid))
+                with timer.phase("pod"):
+                    coeffs.append(np.dot(self.R.T, snapshots_per_grid))
 
             # Invert earlier operation of reshaping subgrids
             out = np.zeros((coeffs[0].shape[0],
@@ -199,57 +251,78 @@ class SVDAE:
                 # shape
                 val_data = np.expand_dims(val_data, 1)
 
-            val_dataset = tf.data.Dataset.from_tensor_slices(val_data)
-            val_dataset = val_dataset.shuffle(
-                buffer_size=val_data.shape[0],
-                reshuffle_each_iteration=True,
-                seed=self.seed).\
-                batch(val_batch_size)
-
-        # Set up tensorboard logging
-        current_time = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
-        train_log_dir = 'logs/' + current_time + '/train'
-        val_log_dir = 'logs/' + current_time + '/val'
-        train_summary_writer = tf.summary.create_file_writer(train_log_dir)
-        val_summary_writer = tf.summary.create_file_writer(val_log_dir)
-
-        for epoch in range(epochs):
-            loss_cum = 0
-            acc_cum = 0
-            for step, grids in enumerate(train_dataset):
-
-                # Train the autoencoder reconstruction
-                loss, acc = self.autoencoder.train_on_batch(grids, grids)
-                loss_cum += loss
-                acc_cum += acc
-
-            # Average the loss and accuracy over the entire dataset
-            loss = loss_cum/(step+1)
-            acc = acc_cum/(step+1)
-
-            with train_summary_writer.as_default():
-                tf.summary.scalar('loss', loss, step=epoch)
-                tf.summary.scalar('accuracy', acc, step=epoch)
+            val_batches = Sample_batches(val_data, self.seed, dtype)
+            val_dataset = val_batches.dataset(val_batch_size, shard=shard)
+
+        sink = training_sink(sinks, wandb_log, strategy)
+
+        train_dataset = timer.count(train_dataset)
+
+        start = 0
+        if checkpoint is not None:
+            start = checkpoint.bind(self, [train_batches, val_batches],
+                                    strategy, resume)
+
+        for epoch in range(start, epochs):
+            with timer.phase("train"):
+                if strategy is not None:
+                    loss, acc = run_epoch(self.autoencoder, train_dataset.map(
+                        lambda grids: (grids, grids)))
+                else:
+                    loss, acc = self._train_epoch(train_dataset, timer)
+
+            sink.write(epoch, "train", {"loss": loss, "accuracy": acc})
 
             # Calculate the accuracies on the validation set
             if val_data is not None:
-                loss_val, acc_val = self.validate(val_dataset)
-
-                with val_summary_writer.as_default():
-                    tf.summary.scalar('loss', loss_val, step=epoch)
-                    tf.summary.scalar('accuracy', acc_val, step=epoch)
-
-            if wandb_log:
-                if val_data is not None:
-                    log = {"epoch": epoch, "train_loss": loss,
-                           "train_accuracy": acc,
-                           "valid_loss": loss_val,
-                           "valid_accuracy": acc_val}
-                else:
-                    log = {"epoch": epoch, "train_loss": loss,
-                           "train_accuracy": acc}
+                with timer.phase("validation"):
+                    if strategy is not None:
+                        loss_val, acc_val = run_epoch(
+                            self.autoencoder,
+                            val_dataset.map(lambda grids: (grids, grids)),
+                            training=False)
+                    else:
+                        loss_val, acc_val = self.validate(val_dataset)
+
+                sink.write(epoch, "val", {"loss": loss_val,
+                                          "accuracy": acc_val})
 
-                wandb.log(log)
+            if checkpoint is not None:
+                with timer.phase("checkpoint"):
+                    checkpoint.save(epoch + 1, epochs)
+
+            timer.write(sink, epoch)
+
+        timer.stop()
+        sink.close()
+
+    def _train_epoch(self, train_dataset, timer=None):
+        """
+        Train for one epoch with a `train_on_batch` call per batch
+
+        Args:
+            train_dataset (tf.data.Dataset): Batches of POD coefficients
+            timer (Phase_timer, optional): Timer of the input. Defaults to
+                                           None.
+
+        Returns:
+            tuple: Mean loss and accuracy
+        """
+        loss_cum = 0
+        acc_cum = 0
+        for step, grids in enumerate(phase_timer(timer).batches(
+                train_dataset)):
+
+            # Train the autoencoder reconstruction
+            loss, acc = self.autoencoder.train_on_batch(grids, grids)
+            loss_cum += loss
+            acc_cum += acc
+
+        # Average the loss and accuracy over the entire dataset
+        loss = loss_cum/(step+1)
+        acc = acc_cum/(step+1)
+
+        return loss, acc
 
     def validate(self, val_dataset):
         """
@@ -277,28 +350,63 @@ class SVDAE:
 
         return loss, acc
 
-    def predict_single(self, snapshot):
+    def predict_single(self, snapshot, backend=None):
         """
         Pass single array through full model including POD and the autoencoder
 
         Args:
             snapshot (np.ndarray): Grid to be predicted
+            backend (str or callable, optional): Backend that evaluates the
+                                                 autoencoder, "tensorflow",
+                                                 "numpy" for the frozen
+                                                 NumPy runtime of dense
+                                                 models, frozen once until
+                                                 the next training, see
+                                                 `ddganAE.backends.
+                                                 Numpy_mlp`, or a callable
+                                                 such as a TFLite runtime from
+                                                 `ddganAE.backends.from_tflite`.
+                                                 Defaults to None, i.e.
+                                                 "tensorflow".
 
         Returns:
             np.ndarray: Grid reconstructed by SVD autoencoder
         """
         coeff = (self.R.T@snapshot).reshape(1, -1)
 
-        gen_coeff = self.autoencoder.predict(coeff)
+        if backend is None or backend == "tensorflow":
+            gen_coeff = self.autoencoder.predict(
+                cast_data(coeff, self.precision))
+        elif backend == "numpy":
+            gen_coeff = self._numpy_network()(coeff)
+        else:
+            gen_coeff = backend(coeff)
 
         return self.R @ gen_coeff[0]
 
-    def predict(self, data):
+    def _numpy_network(self):
+        """
+        Frozen NumPy runtime of the autoencoder, which is kept until the next
+        training
+
+        Returns:
+            Numpy_mlp: Frozen autoencoder
+        """
+        if self._numpy_mlp is None:
+            self._numpy_mlp = Numpy_mlp.from_keras(self.encoder, self.decoder)
+
+        return self._numpy_mlp
+
+    def predict(self, data, backend=None):
         """
         Pass a collection of grids through the model
 
         Args:
             data (np.ndarray): Dataset that is to be passed through the model
+            backend (str or callable, optional): Backend that evaluates the
+                                                 autoencoder, see
+                                                 `predict_single`. Defaults
+                                                 to None, i.e. "tensorflow".
 
         Returns:
             np.ndarray: Reconstructed dataset
@@ -314,7 +422,13 @@ class SVDAE:
 
         val_data = out.T
 
-        x_val_recon = self.autoencoder.predict(val_data)
+        if backend is None or backend == "tensorflow":
+            x_val_recon = self.autoencoder.predict(
+                cast_data(val_data, self.precision))
+        elif backend == "numpy":
+            x_val_recon = self._numpy_network()(val_data)
+        else:
+            x_val_recon = backend(val_data)
 
         x_val_recon = \
             x_val_recon.reshape((len(data),
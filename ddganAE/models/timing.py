@@ -0,0 +1,299 @@
+"""
+
+Instrumentation of the training loops, which shows where the time of every
+epoch goes. A `Phase_timer` passed to a `train` method measures the
+wall-clock time of the phases of the epochs, e.g. the reconstruction and
+regularization phases of `AAE` or the encoder, discriminator and generator
+updates of `Predictive_adversarial`, the time spent waiting for the batches
+of the input pipeline including their copy to the device, the throughput
+and the peak memory. These are written to the metric sinks of the training
+as the split "timing", see `sinks`:
+
+    timer = Phase_timer(profile_steps=(100, 110))
+    model.train(data, 10, timer=timer, sinks=[File_sink("logs/run.jsonl")])
+
+Phases can be nested, e.g. the phases of the updates of an epoch are part of
+its "train" phase. The compiled engines run an epoch as a single call, of
+which only the total is measured. Optionally the timer records a
+`tf.profiler` trace of a window of training steps, for a detailed view in
+the profile tab of TensorBoard.
+
+"""
+
+import contextlib
+import datetime
+import time
+import sys
+import os
+import tensorflow as tf
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+__author__ = "Zef Wolffs"
+__credits__ = []
+__license__ = "MIT"
+__version__ = "1.0.0"
+__maintainer__ = "Zef Wolffs"
+__email__ = "zefwolffs@gmail.com"
+__status__ = "Development"
+
+
+def peak_host_memory():
+    """
+    Peak resident memory of the process
+
+    Returns:
+        float: Peak memory in MB, or None where unknown
+    """
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Bytes on macOS, kilobytes elsewhere
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+def peak_device_memory(reset=True):
+    """
+    Peak memory allocated by TensorFlow on the GPUs
+
+    Args:
+        reset (bool, optional): Whether to reset the peak afterwards.
+                                Defaults to True.
+
+    Returns:
+        float: Highest peak of the GPUs in MB, or None without GPUs
+    """
+    devices = ["GPU:%d" % i
+               for i in range(len(tf.config.list_logical_devices("GPU")))]
+    if not devices:
+        return None
+
+    peak = max(tf.config.experimental.get_memory_info(device)["peak"]
+               for device in devices)
+    if reset:
+        for device in devices:
+            tf.config.experimental.reset_memory_stats(device)
+
+    return peak / 1e6
+
+
+class Phase_timer:
+    """
+    Wall-clock time of the phases of the epochs, throughput and peak memory
+    of training, and an optional profiler trace
+    """
+
+    def __init__(self, profile_steps=None, profile_dir=None):
+        """
+        Constructor
+
+        Args:
+            profile_steps (tuple, optional): First and last training step of
+                                             a `tf.profiler` trace, counted
+                                             in batches from the start of
+                                             training. The trace starts and
+                                             stops between steps, or between
+                                             epochs with compiled engines.
+                                             Defaults to None, i.e. no
+                                             trace.
+            profile_dir (str, optional): Directory of the trace. Defaults to
+                                         None, i.e. a timestamped directory
+                                         under "logs/profile/".
+        """
+        if profile_dir is None:
+            profile_dir = os.path.join(
+                "logs", "profile",
+                datetime.datetime.now().strftime("%Y%m%d-%H%M%S"))
+
+        self.profile_steps = profile_steps
+        self.profile_dir = profile_dir
+
+        # Counted by the input pipeline, see `count`
+        with tf.device("/cpu:0"):
+            self._samples = tf.Variable(0, dtype=tf.int64, trainable=False)
+            self._steps = tf.Variable(0, dtype=tf.int64, trainable=False)
+
+        self._profiling = False
+        self._traced = False
+
+        self.start()
+
+    def start(self):
+        """
+        Reset the times, counts and the clock, at the start of training
+        """
+        self._times = {}
+        self._clock = time.perf_counter()
+        self._samples.assign(0)
+        self._steps.assign(0)
+
+    def _profile(self):
+        """
+        Start or stop the trace when its window is reached or passed
+        """
+        if self.profile_steps is None or self._traced:
+            return
+
+        step = int(self._steps.numpy())
+        first, last = self.profile_steps
+        if not self._profiling and first <= step <= last:
+            tf.profiler.experimental.start(self.profile_dir)
+            self._profiling = True
+        elif self._profiling and step > last:
+            self.stop()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Context in which the time of a phase is measured
+
+        Args:
+            name (str): Name of the phase, the time is written as the metric
+                        "time_<name>"
+        """
+        self._profile()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._times[name] = self._times.get(name, 0.) + \
+                time.perf_counter() - start
+            self._profile()
+
+    def batches(self, dataset):
+        """
+        Iterate over a dataset, with the time of creating the iterator and of
+        every next batch measured as the phase "input"
+
+        Args:
+            dataset (tf.data.Dataset): Dataset
+
+        Yields:
+            object: Batches
+        """
+        with self.phase("input"):
+            iterator = iter(dataset)
+        while True:
+            with self.phase("input"):
+                try:
+                    batch = next(iterator)
+                except StopIteration:
+                    return
+            yield batch
+
+    def count(self, dataset):
+        """
+        Count the samples and batches taken from a training dataset, for the
+        throughput and the steps of the trace
+
+        Args:
+            dataset (tf.data.Dataset): Batches of samples, or of tuples whose
+                                       first element is the samples
+
+        Returns:
+            tf.data.Dataset: Dataset with the same batches
+        """
+        def count(*batch):
+            self._samples.assign_add(tf.shape(tf.nest.flatten(batch)[0],
+                                              out_type=tf.int64)[0])
+            self._steps.assign_add(1)
+            return batch if len(batch) > 1 else batch[0]
+
+        return dataset.map(count)
+
+    def metrics(self):
+        """
+        Metrics since the start or the previous call, which resets them
+
+        Returns:
+            dict: Time of every phase and of the epoch in seconds, samples
+                  taken from the training dataset per second, which counts
+                  every pass over the data, and peak host and device memory
+                  in MB
+        """
+        elapsed = time.perf_counter() - self._clock
+
+        metrics = {"time_" + name: value
+                   for name, value in self._times.items()}
+        metrics["time_epoch"] = elapsed
+        metrics["samples_per_second"] = int(self._samples.numpy()) / elapsed
+
+        for name, value in [("peak_host_memory", peak_host_memory()),
+                            ("peak_device_memory", peak_device_memory())]:
+            if value is not None:
+                metrics[name] = value
+
+        self._times = {}
+        self._clock = time.perf_counter()
+        self._samples.assign(0)
+
+        return metrics
+
+    def write(self, sink, step):
+        """
+        Write the metrics of an epoch to a sink
+
+        Args:
+            sink (Metric_sink): Sink
+            step (int): Step, i.e. the epoch
+        """
+        sink.write(step, "timing", self.metrics())
+
+    def stop(self):
+        """
+        Stop the trace if it is recording, at the end of training
+        """
+        if self._profiling:
+            tf.profiler.experimental.stop()
+            self._profiling = False
+            self._traced = True
+
+
+class _Disabled_timer(Phase_timer):
+    """
+    Timer that measures nothing, for training without instrumentation
+    """
+
+    def __init__(self):
+        pass
+
+    def start(self):
+        pass
+
+    def phase(self, name):
+        return contextlib.nullcontext()
+
+    def batches(self, dataset):
+        return iter(dataset)
+
+    def count(self, dataset):
+        return dataset
+
+    def write(self, sink, step):
+        pass
+
+    def stop(self):
+        pass
+
+
+def phase_timer(timer=None):
+    """
+    Timer of the training loops
+
+    Args:
+        timer (Phase_timer, optional): Timer. Defaults to None, i.e. one that
+                                       measures nothing.
+
+    Returns:
+        Phase_timer: Timer
+    """
+    if timer is None:
+        return _Disabled_timer()
+
+    return timer
@@ -1 +1,3 @@
 from .utils import *  # noqa: F403, F401
+from .pipeline import *  # noqa: F403, F401
+from .cache import *  # noqa: F403, F401
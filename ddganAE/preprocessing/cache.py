@@ -0,0 +1,223 @@
+"""
+
+Content-addressed cache of the preprocessed training data of the predictive
+models. Entries are keyed by a hash of the input data and of every setting
+that the preprocessing depends on, and hold the scaled data and the samples
+and targets as `.npy` files that are loaded memory-mapped. Repeated training
+runs on the same data, e.g. the trials of a hyperparameter sweep, thereby skip
+the scaling and the preprocessing. The least recently used entries are
+evicted once the cache exceeds its size limit.
+
+"""
+
+from numpy.lib.format import open_memmap
+import numpy as np
+import hashlib
+import shutil
+import pickle
+import json
+import time
+import os
+from ddganAE.preprocessing.utils import stencil_dataset
+
+__author__ = "Zef Wolffs"
+__credits__ = []
+__license__ = "MIT"
+__version__ = "1.0.0"
+__maintainer__ = "Zef Wolffs"
+__email__ = "zefwolffs@gmail.com"
+__status__ = "Development"
+
+
+class Preprocess_cache:
+    """
+    Size-bounded least recently used cache of preprocessed training data
+    """
+
+    def __init__(self, directory="preprocess_cache", max_bytes=2**32):
+        """
+        Constructor
+
+        Args:
+            directory (str, optional): Directory of the cache, created if it
+                                       does not exist. Defaults to
+                                       "preprocess_cache".
+            max_bytes (int, optional): Maximum total size of the entries.
+                                       Defaults to 2**32, i.e. 4 GiB.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, input_data, interval=5, increment=False, scaler=None,
+            dtype=np.float32):
+        """
+        Key of the entry of a preprocessing
+
+        Args:
+            input_data (np.ndarray): Input data in shape (<number of domains>,
+                                     <number of variables>,
+                                     <number of timesteps>)
+            interval (int, optional): Timestep interval. Defaults to 5.
+            increment (bool, optional): Whether the targets are increments.
+                                        Defaults to False.
+            scaler (object, optional): Unfitted scikit-learn scaler, such as
+                                       `MinMaxScaler((-1, 1))`. Defaults to
+                                       None, i.e. no scaling.
+            dtype (np.dtype, optional): Data type of the stored arrays.
+                                        Defaults to np.float32.
+
+        Returns:
+            str: Hexadecimal hash
+        """
+        input_data = np.ascontiguousarray(input_data)
+
+        settings = {"shape": input_data.shape,
+                    "data_dtype": input_data.dtype.str,
+                    "interval": int(interval),
+                    "increment": bool(increment),
+                    "scaler": None if scaler is None else
+                    [type(scaler).__name__, repr(scaler.get_params())],
+                    "dtype": np.dtype(dtype).str}
+
+        h = hashlib.sha256(json.dumps(settings, sort_keys=True).encode())
+        h.update(memoryview(input_data).cast("B"))
+
+        return h.hexdigest()
+
+    def load(self, input_data, interval=5, increment=False, scaler=None,
+             dtype=np.float32):
+        """
+        Scale and preprocess the input data, or load the result from the
+        cache. The scaler is fitted on all values at once, as in the training
+        scripts, and is also fitted in place on a cache hit.
+
+        Args:
+            input_data (np.ndarray): Input data in shape (<number of domains>,
+                                     <number of variables>,
+                                     <number of timesteps>)
+            interval (int, optional): Timestep interval. Defaults to 5.
+            increment (bool, optional): Whether the targets are increments.
+                                        Defaults to False.
+            scaler (object, optional): Unfitted scikit-learn scaler, such as
+                                       `MinMaxScaler((-1, 1))`. Defaults to
+                                       None, i.e. no scaling.
+            dtype (np.dtype, optional): Data type of the stored arrays.
+                                        Defaults to np.float32.
+
+        Returns:
+            tuple: Memory-mapped scaled data, samples and targets
+        """
+        key = self.key(input_data, interval, increment, scaler, dtype)
+        entry = os.path.join(self.directory, key)
+
+        while True:
+            if not os.path.isdir(entry):
+                self._write(entry, input_data, interval, increment, scaler,
+                            dtype)
+                self.evict(keep=key)
+
+            try:
+                # Mark as most recently used, explicitly since the implicit
+                # timestamps of some file systems are too coarse to order by
+                now = time.time()
+                os.utime(entry, (now, now))
+
+                if scaler is not None:
+                    with open(os.path.join(entry, "scaler.pkl"), "rb") as f:
+                        state = pickle.load(f).__getstate__()
+
+                arrays = tuple(np.load(os.path.join(entry, name + ".npy"),
+                                       mmap_mode="r")
+                               for name in ["data", "x", "y"])
+            except FileNotFoundError:
+                # Evicted by a concurrent run in the meantime, remove what
+                # is left of the entry and write it again
+                shutil.rmtree(entry, ignore_errors=True)
+                continue
+
+            if scaler is not None:
+                scaler.__setstate__(state)
+
+            return arrays
+
+    def _write(self, entry, input_data, interval, increment, scaler, dtype):
+        """
+        Compute an entry and move it into place once complete, such that
+        concurrent runs never see partial entries
+        """
+        data = np.asarray(input_data)
+        if scaler is not None:
+            data = scaler.fit_transform(data.reshape(-1, 1)).reshape(
+                data.shape)
+
+        tmp = "%s.%d.tmp" % (entry, os.getpid())
+        os.makedirs(tmp, exist_ok=True)
+
+        for name, array in zip(["data", "x", "y"],
+                               (data,) + stencil_dataset(data, interval,
+                                                         increment)):
+            out = open_memmap(os.path.join(tmp, name + ".npy"), mode="w+",
+                              dtype=dtype, shape=array.shape)
+            out[:] = array
+            out.flush()
+            del out
+
+        with open(os.path.join(tmp, "scaler.pkl"), "wb") as f:
+            pickle.dump(scaler, f)
+
+        try:
+            os.rename(tmp, entry)
+        except OSError:
+            # Another run wrote the same entry in the meantime
+            shutil.rmtree(tmp)
+
+    def entries(self):
+        """
+        Entries of the cache, least recently used first
+
+        Returns:
+            list: Tuples of key, last use and size in bytes
+        """
+        entries = []
+        for key in os.listdir(self.directory):
+            entry = os.path.join(self.directory, key)
+            if key.endswith(".tmp") or not os.path.isdir(entry):
+                continue
+
+            size = sum(os.path.getsize(os.path.join(entry, name))
+                       for name in os.listdir(entry))
+            entries.append((key, os.path.getmtime(entry), size))
+
+        return sorted(entries, key=lambda entry: entry[1])
+
+    def evict(self, keep=None):
+        """
+        Remove the least recently used entries until the cache fits within
+        `max_bytes`
+
+        Args:
+            keep (str, optional): Key of an entry to never remove. Defaults to
+                                  None.
+        """
+        entries = self.entries()
+        total = sum(entry[2] for entry in entries)
+
+        for key, _, size in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+
+            shutil.rmtree(os.path.join(self.directory, key),
+                          ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        """
+        Remove all entries
+        """
+        for key, _, _ in self.entries():
+            shutil.rmtree(os.path.join(self.directory, key),
+                          ignore_errors=True)
@@ -0,0 +1,415 @@
+"""
+
+Lazy input pipelines. Instead of materialising the samples and targets of
+`stencil_dataset`, which hold every timestep three times over for each
+interval phase, the predictive models keep only the raw data in memory and
+gather the stencil windows on the fly per batch. The raw data is held in a
+variable rather than embedded as a constant, such that large latent datasets
+do not run into the 2 GB graph size limit.
+
+The autoencoders shuffle a permutation of the sample indices rather than the
+samples themselves, and gather every batch from the array in parallel, which
+may also be a memory-mapped `.npy` file. Neither keeps a copy of the dataset
+in a shuffle buffer.
+
+Every epoch of a shuffled pipeline is a permutation seeded by the seed and an
+epoch counter, which the training checkpoints store, such that resumed
+training continues in the same order. The random augmentation of the stencil
+samples of the predictive models is a vectorised stage of the pipeline,
+seeded alike.
+
+"""
+
+import numpy as np
+import tensorflow as tf
+from ddganAE.preprocessing.utils import stencil_indices
+
+__author__ = "Zef Wolffs"
+__credits__ = []
+__license__ = "MIT"
+__version__ = "1.0.0"
+__maintainer__ = "Zef Wolffs"
+__email__ = "zefwolffs@gmail.com"
+__status__ = "Development"
+
+
+def shard_samples(dataset, size, shard=None):
+    """
+    Shard of a dataset of samples for one of the workers of data-parallel
+    training. Every worker takes every so many samples, and all take the same
+    number of samples, such that they run the same number of steps.
+
+    Args:
+        dataset (tf.data.Dataset): Samples or sample indices, in the same
+                                   order on every worker
+        size (int): Number of samples
+        shard (tuple, optional): Index of the worker and number of workers.
+                                 Defaults to None, i.e. all samples.
+
+    Returns:
+        tf.data.Dataset: Samples of the worker
+    """
+    if shard is None:
+        return dataset
+
+    index, count = shard
+
+    return dataset.shard(count, index).take(size // count)
+
+
+def epoch_permutation(size, seed, epoch):
+    """
+    Permutation of indices seeded by a seed and an epoch counter, which is
+    incremented
+
+    Args:
+        size (int): Number of indices
+        seed (int): Seed
+        epoch (tf.Variable): Number of permutations drawn so far
+
+    Returns:
+        tf.Tensor: Permuted indices
+    """
+    seed = tf.stack([tf.constant(seed, tf.int64), epoch.assign_add(1) - 1])
+
+    return tf.random.experimental.stateless_shuffle(
+        tf.range(size, dtype=tf.int64), seed)
+
+
+class Stencil_windows:
+    """
+    Stencil samples and targets of the predictive models, gathered lazily
+    from the raw data. The samples and their order equal those of
+    `stencil_dataset`.
+    """
+
+    def __init__(self, input_data, interval=5, increment=False, dtype=None):
+        """
+        Constructor
+
+        Args:
+            input_data (np.ndarray): Input data in shape (<number of domains>,
+                                     <number of pod coeffcients or latent
+                                     variables per domain>,
+                                     <number of timesteps>)
+            interval (int, optional): Timestep interval. Defaults to 5.
+            increment (bool, optional): Whether the targets are the
+                                        increments of the subdomain. Defaults
+                                        to False.
+            dtype (np.dtype, optional): Data type of the samples. Defaults to
+                                        None, i.e. that of the input data.
+        """
+        input_data = np.asarray(input_data)
+        ndomains, self.nvars, self.ntimes = input_data.shape
+        self.interval = interval
+        self.increment = increment
+
+        # Timesteps as rows, such that every window is a gather of three rows
+        rows = np.ascontiguousarray(input_data.transpose(0, 2, 1),
+                                    dtype=dtype).reshape(-1, self.nvars)
+        self.rows = tf.Variable(rows, trainable=False)
+
+        self.indices = stencil_indices(input_data.shape, interval, increment)
+
+        # Number of permutations drawn so far
+        self.epoch = tf.Variable(0, dtype=tf.int64, trainable=False)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def gather(self, cur):
+        """
+        Gather a batch of samples and targets
+
+        Args:
+            cur (tf.Tensor): Sample indices, i.e. elements of `indices`
+
+        Returns:
+            tuple: Batch of samples and targets
+        """
+        nxt = cur + self.interval
+
+        x = tf.gather(self.rows, tf.stack([nxt - self.ntimes, cur,
+                                           nxt + self.ntimes], axis=1))
+        x = tf.reshape(x, (-1, 3 * self.nvars))
+
+        y = tf.gather(self.rows, nxt)
+        if self.increment:
+            y = y - x[:, self.nvars:2 * self.nvars]
+
+        return x, y
+
+    def dataset(self, batch_size, indices=None, shuffle=True, seed=None,
+                drop_remainder=True, shard=None):
+        """
+        Batched dataset of samples and targets
+
+        Args:
+            batch_size (int): Batch size
+            indices (np.ndarray, optional): Subset of `indices` to iterate
+                                            over, e.g. after a train and
+                                            validation split. Defaults to
+                                            None, i.e. all samples.
+            shuffle (bool, optional): Whether to permute the samples every
+                                      iteration, seeded by the seed and the
+                                      epoch counter. Defaults to True.
+            seed (int, optional): Seed of the permutations. Defaults to None.
+            drop_remainder (bool, optional): Whether to drop the last
+                                             incomplete batch. Defaults to
+                                             True.
+            shard (tuple, optional): Index of the worker and number of
+                                     workers of data-parallel training, see
+                                     `shard_samples`. Defaults to None.
+
+        Returns:
+            tf.data.Dataset: Dataset of batches of samples and targets
+        """
+        if indices is None:
+            indices = self.indices
+
+        # Only the indices are shuffled
+        if shuffle:
+            if seed is None:
+                seed = np.random.SeedSequence().entropy % 2**63
+
+            dataset = tf.data.Dataset.from_tensors(0).flat_map(
+                lambda _: tf.data.Dataset.from_tensor_slices(tf.gather(
+                    indices, epoch_permutation(len(indices), seed,
+                                               self.epoch))))
+        else:
+            dataset = tf.data.Dataset.from_tensor_slices(indices)
+        dataset = shard_samples(dataset, len(indices), shard)
+
+        return dataset.batch(batch_size, drop_remainder=drop_remainder).\
+            map(self.gather, num_parallel_calls=tf.data.AUTOTUNE).\
+            prefetch(tf.data.AUTOTUNE)
+
+
+class Sample_batches:
+    """
+    Batches of the samples of an array, e.g. the grids of the autoencoders,
+    gathered from the array per batch. Every epoch, i.e. iteration over the
+    dataset, uses a permutation of the indices seeded by the seed and the
+    epoch, such that the order is reproducible. Tuples of arrays, such as
+    samples and targets, are batched alike.
+    """
+
+    def __init__(self, data, seed=None, dtype=None):
+        """
+        Constructor
+
+        Args:
+            data (np.ndarray, str or tuple): Samples along the first axis,
+                                             or the path of a `.npy` file
+                                             with these which is then
+                                             memory-mapped, or a tuple of
+                                             these with the same number of
+                                             samples, whose batches are
+                                             tuples
+            seed (int, optional): Seed of the permutations. Defaults to None.
+            dtype (np.dtype, optional): Data type of the batches. Defaults to
+                                        None, i.e. that of the data.
+        """
+        self.is_tuple = isinstance(data, tuple)
+        if not self.is_tuple:
+            data = (data,)
+
+        self.arrays = tuple(np.load(array, mmap_mode="r")
+                            if isinstance(array, str) else array
+                            for array in data)
+        self.dtypes = tuple(np.dtype(array.dtype if dtype is None else dtype)
+                            for array in self.arrays)
+
+        if seed is None:
+            seed = np.random.SeedSequence().entropy % 2**63
+        self.seed = seed
+
+        # Number of permutations drawn so far
+        self.epoch = tf.Variable(0, dtype=tf.int64, trainable=False)
+
+    def __len__(self):
+        return len(self.arrays[0])
+
+    def _take(self, indices):
+        # Sorted reads are sequential on memory-mapped files
+        indices = np.sort(indices)
+
+        return [np.asarray(array[indices], dtype=dtype)
+                for array, dtype in zip(self.arrays, self.dtypes)]
+
+    def gather(self, indices):
+        """
+        Gather a batch of samples
+
+        Args:
+            indices (tf.Tensor): Sample indices
+
+        Returns:
+            tf.Tensor or tuple: Batch of samples, or of every array
+        """
+        batch = tf.numpy_function(self._take, [indices],
+                                  [tf.as_dtype(dtype)
+                                   for dtype in self.dtypes],
+                                  stateful=False)
+        for tensor, array in zip(batch, self.arrays):
+            tensor.set_shape((None,) + array.shape[1:])
+
+        return tuple(batch) if self.is_tuple else batch[0]
+
+    def permutation(self):
+        """
+        Permutation of the sample indices of the next epoch
+
+        Returns:
+            tf.Tensor: Sample indices
+        """
+        return epoch_permutation(len(self), self.seed, self.epoch)
+
+    def dataset(self, batch_size, shuffle=True, drop_remainder=False,
+                shard=None):
+        """
+        Batched dataset of samples
+
+        Args:
+            batch_size (int): Batch size
+            shuffle (bool, optional): Whether to permute the samples every
+                                      iteration. Defaults to True.
+            drop_remainder (bool, optional): Whether to drop the last
+                                             incomplete batch. Defaults to
+                                             False.
+            shard (tuple, optional): Index of the worker and number of
+                                     workers of data-parallel training, see
+                                     `shard_samples`. Defaults to None.
+
+        Returns:
+            tf.data.Dataset: Dataset of batches of samples
+        """
+        if shuffle:
+            indices = tf.data.Dataset.from_tensors(0).flat_map(
+                lambda _: tf.data.Dataset.from_tensor_slices(
+                    self.permutation()))
+        else:
+            indices = tf.data.Dataset.range(len(self))
+        indices = shard_samples(indices, len(self), shard)
+
+        return indices.batch(batch_size, drop_remainder=drop_remainder).\
+            map(self.gather, num_parallel_calls=tf.data.AUTOTUNE).\
+            prefetch(tf.data.AUTOTUNE)
+
+
+def latent_std(data):
+    """
+    Standard deviation of every latent variable, e.g. to scale the noise of
+    `Stencil_augmentation` with
+
+    Args:
+        data (np.ndarray): Input data in shape (<number of domains>,
+                           <number of latent variables per domain>,
+                           <number of timesteps>), or stencil samples in
+                           shape (<number of samples>, 3 * <number of latent
+                           variables per domain>)
+
+    Returns:
+        np.ndarray: Standard deviations
+    """
+    data = np.asarray(data)
+    if data.ndim == 3:
+        return data.std(axis=(0, 2))
+
+    return data.reshape(len(data), 3, -1).std(axis=(0, 1))
+
+
+class Stencil_augmentation:
+    """
+    Random augmentation of batches of stencil samples and targets, applied to
+    whole batches within the input pipeline. The samples get Gaussian noise,
+    optionally scaled per latent variable, and the order of the neighbouring
+    subdomains of a sample is reversed at random, which mirrors the stencil.
+    The targets are left as they are. The random numbers are seeded by the
+    seed, an epoch counter and the index of the batch.
+    """
+
+    def __init__(self, noise_std=0, scale=None, reverse=0, seed=None):
+        """
+        Constructor
+
+        Args:
+            noise_std (float, optional): Standard deviation of the Gaussian
+                                         noise of the samples. Defaults to 0.
+            scale (np.ndarray, optional): Scale of the noise of every latent
+                                          variable, e.g. its standard
+                                          deviation, see `latent_std`.
+                                          Defaults to None, i.e. the same
+                                          noise for all.
+            reverse (float, optional): Probability of reversing the order of
+                                       the neighbouring subdomains of a
+                                       sample. Defaults to 0.
+            seed (int, optional): Seed. Defaults to None.
+        """
+        self.noise_std = noise_std
+        self.scale = None if scale is None else np.asarray(scale)
+        self.reverse = reverse
+
+        if seed is None:
+            seed = np.random.SeedSequence().entropy % 2**63
+        self.seed = seed
+
+        # Number of epochs augmented so far
+        self.epoch = tf.Variable(0, dtype=tf.int64, trainable=False)
+
+    def augment(self, key, x, y):
+        """
+        Augment a batch
+
+        Args:
+            key (tf.Tensor): Seed of the random numbers of the batch, a
+                             tensor of two integers
+            x (tf.Tensor): Samples
+            y (tf.Tensor): Targets
+
+        Returns:
+            tuple: Augmented samples and the targets
+        """
+        noise_key, reverse_key = tf.unstack(
+            tf.random.experimental.stateless_split(key, 2))
+
+        if self.reverse > 0:
+            # Swap the first and last third of the samples that are reversed
+            nvars = x.shape[-1] // 3
+            mirrored = tf.concat([x[:, 2 * nvars:], x[:, nvars:2 * nvars],
+                                  x[:, :nvars]], axis=-1)
+            flip = tf.random.stateless_uniform(
+                tf.shape(x)[:1], reverse_key) < self.reverse
+            x = tf.where(flip[:, None], mirrored, x)
+
+        if self.noise_std > 0:
+            std = self.noise_std
+            if self.scale is not None:
+                std = std * np.tile(self.scale, 3)
+            x = x + tf.cast(std, x.dtype) * tf.random.stateless_normal(
+                tf.shape(x), noise_key, dtype=x.dtype)
+
+        return x, y
+
+    def dataset(self, dataset):
+        """
+        Augmented dataset
+
+        Args:
+            dataset (tf.data.Dataset): Batches of samples and targets
+
+        Returns:
+            tf.data.Dataset: Augmented batches
+        """
+        def epoch(_):
+            key = tf.stack([tf.constant(self.seed, tf.int64),
+                            self.epoch.assign_add(1) - 1])
+
+            return dataset.enumerate().map(
+                lambda step, batch: self.augment(
+                    tf.random.experimental.stateless_fold_in(key, step),
+                    *batch),
+                num_parallel_calls=tf.data.AUTOTUNE)
+
+        return tf.data.Dataset.from_tensors(0).flat_map(epoch).\
+            prefetch(tf.data.AUTOTUNE)
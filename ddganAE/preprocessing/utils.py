@@ -39,3 +39,81 @@ def convert_2d(subgrid_snapshots, shape, timesteps):
         subgrid_snapshots_out.append(subgrid_snapshot)
 
     return subgrid_snapshots_out
+
+
+def stencil_indices(shape, interval=5, increment=False):
+    """
+    Indices of the samples of the predictive models, see `stencil_dataset`.
+    The data is regarded as rows of shape (<number of domains> * <number of
+    timesteps>, <number of variables>), i.e. the row of subdomain d at
+    timestep t is d * <number of timesteps> + t.
+
+    Args:
+        shape (tuple): Shape of the input data, i.e. (<number of domains>,
+                       <number of variables>, <number of timesteps>)
+        interval (int, optional): Timestep interval. Defaults to 5.
+        increment (bool, optional): Whether the targets are the increments
+                                    of the subdomain. Defaults to False.
+
+    Returns:
+        np.ndarray: Rows of the subdomains at the current timestep of every
+                    sample, ordered by phase, subdomain and timestep
+    """
+    ndomains, _, ntimes = shape
+
+    # Current timesteps of the samples of every phase, the last timesteps
+    # lack a target
+    lag = (2 if increment else 1) * interval
+    cur = [np.arange(k, ntimes - lag, interval) for k in range(interval)]
+    domains = np.arange(1, ndomains - 1)
+
+    return np.concatenate([(domains[:, None] * ntimes + t).ravel()
+                           for t in cur])
+
+
+def stencil_dataset(input_data, interval=5, increment=False,
+                    dtype=np.float64):
+    """
+    Build the samples and targets of the predictive models. For every
+    interval phase, i.e. the timesteps k, k + interval, ..., and every
+    interior subdomain a sample holds the neighbouring subdomains at the next
+    timestep and the subdomain itself at the current timestep. The target is
+    the subdomain at the next timestep or, with increment, the increment
+    towards it. The samples are ordered by phase, subdomain and timestep.
+
+    Args:
+        input_data (np.ndarray): Input data in shape (<number of domains>,
+                                 <number of pod coeffcients or latent
+                                 variables per domain>, <number of timesteps>)
+        interval (int, optional): Timestep interval. Defaults to 5.
+        increment (bool, optional): Whether the targets are the increments
+                                    of the subdomain. Defaults to False.
+        dtype (np.dtype, optional): Data type of the samples and targets,
+                                    the increments are computed at float64
+                                    regardless. Defaults to np.float64.
+
+    Returns:
+        tuple: Tuple containing x (samples) and y (targets) datasets
+    """
+    ndomains, nvars, ntimes = np.shape(input_data)
+
+    # Timesteps as rows, such that every window is a gather of three rows
+    rows = np.ascontiguousarray(np.asarray(input_data).transpose(0, 2, 1),
+                                dtype=np.float64).reshape(-1, nvars)
+
+    cur = stencil_indices((ndomains, nvars, ntimes), interval, increment)
+    nxt = cur + interval
+
+    # Gather straight into the outputs, the indices are always in bounds
+    x = np.empty((len(cur), 3, nvars), dtype=dtype)
+    np.take(rows.astype(dtype, copy=False),
+            np.stack([nxt - ntimes, cur, nxt + ntimes], axis=1), axis=0,
+            out=x, mode="clip")
+    x = x.reshape(len(cur), 3 * nvars)
+
+    y = np.empty((len(cur), nvars))
+    np.take(rows, nxt, axis=0, out=y, mode="clip")
+    if increment:
+        y -= rows[cur]
+
+    return x, y.astype(dtype, copy=False)
@@ -13,6 +13,7 @@ import json
 import keras
 from sklearn.preprocessing import MinMaxScaler
 from ddganAE.models import Predictive_adversarial, Predictive
+from ddganAE.preprocessing import Preprocess_cache
 from ddganAE.architectures.svdae import (
     build_vinicius_encoder_decoder,
     build_slimmer_vinicius_encoder_decoder,
@@ -69,10 +70,16 @@ def train_wandb_pred_aae(config=None):
 
         train_data = latent_vars_reshaped[:config.domains]
 
-        # Scaling the latent variables
+        # Scaling the latent variables, or reusing the scaling and
+        # preprocessing of an earlier trial
         scaler = MinMaxScaler((-1, 1))
-        train_data = scaler.fit_transform(
-            train_data.reshape(-1, 1)).reshape(train_data.shape)
+        if config.get("cache_dir"):
+            train_data, x_train, y_train = Preprocess_cache(
+                config.cache_dir).load(train_data, config.interval,
+                                       config.increment, scaler)
+        else:
+            train_data = scaler.fit_transform(
+                train_data.reshape(-1, 1)).reshape(train_data.shape)
 
         initializer = tf.keras.initializers.RandomNormal(
             mean=0.0, stddev=0.05, seed=None
@@ -211,8 +218,14 @@ def train_wandb_pred_aae(config=None):
         pred_adv = Predictive_adversarial(encoder, decoder, discriminator,
                                           optimizer)
         pred_adv.compile(config.in_vars, increment=config.increment)
-        pred_adv.train(
-            train_data,
+        if config.get("cache_dir"):
+            train, train_args = pred_adv.train_preprocessed, (x_train,
+                                                              y_train)
+        else:
+            train, train_args = pred_adv.train, (train_data,)
+
+        train(
+            *train_args,
             config.epochs,
             interval=config.interval,
             batch_size=config.batch_size,
@@ -281,10 +294,16 @@ def train_wandb_pred_ae(config=None):
 
         train_data = latent_vars_reshaped[:config.domains]
 
-        # Scaling the latent variables
+        # Scaling the latent variables, or reusing the scaling and
+        # preprocessing of an earlier trial
         scaler = MinMaxScaler((-1, 1))
-        train_data = scaler.fit_transform(
-            train_data.reshape(-1, 1)).reshape(train_data.shape)
+        if config.get("cache_dir"):
+            train_data, x_train, y_train = Preprocess_cache(
+                config.cache_dir).load(train_data, config.interval,
+                                       config.increment, scaler)
+        else:
+            train_data = scaler.fit_transform(
+                train_data.reshape(-1, 1)).reshape(train_data.shape)
 
         initializer = tf.keras.initializers.RandomNormal(
             mean=0.0, stddev=0.05, seed=None
@@ -414,8 +433,14 @@ def train_wandb_pred_ae(config=None):
         pred_adv = Predictive(encoder, decoder,
                               optimizer)
         pred_adv.compile(config.in_vars, increment=config.increment)
-        pred_adv.train(
-            train_data,
+        if config.get("cache_dir"):
+            train, train_args = pred_adv.train_preprocessed, (x_train,
+                                                              y_train)
+        else:
+            train, train_args = pred_adv.train, (train_data,)
+
+        train(
+            *train_args,
             config.epochs,
             interval=config.interval,
             batch_size=config.batch_size,
@@ -862,6 +887,10 @@ functionality')
                         default=None,
                         help='folder with autoencoder for generating latent \
 variables')
+    parser.add_argument('--cache_dir', type=str, nargs='?',
+                        default=None,
+                        help='directory to cache the preprocessed training \
+data in across trials')
     parser.add_argument('--model', type=str, nargs='?',
                         default=None,
                         help='Choose either ae (normal autoencoder) or aae \
@@ -903,6 +932,8 @@ variables')
 
         Predictive_ae_sweep_config['parameters']['datafile'] = \
             {'values': [arg_dict['datafile']]}
+        Predictive_ae_sweep_config['parameters']['cache_dir'] = \
+            {'values': [arg_dict['cache_dir']]}
 
         sweep_id = wandb.sweep(Predictive_ae_sweep_config,
                                project='pred-ae', entity='zeff020')
@@ -918,6 +949,8 @@ variables')
 
         Predictive_adversarial_sweep_config['parameters']['datafile'] = \
             {'values': [arg_dict['datafile']]}
+        Predictive_adversarial_sweep_config['parameters']['cache_dir'] = \
+            {'values': [arg_dict['cache_dir']]}
 
         sweep_id = wandb.sweep(Predictive_adversarial_sweep_config,
                                project='pred-aae', entity='zeff020')
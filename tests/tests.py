@@ -4,12 +4,30 @@ Tests for DD-GAN-AE repository. Please execute from root of repository
 
 """
 
-from pytest import fixture
+from pytest import fixture, raises
+import weakref
+import json
+import gc
+import shutil
+import os
 import numpy as np
 from tensorflow.keras.layers.experimental import preprocessing
 import tensorflow as tf
 from ddganAE.utils import calc_pod, mse_weighted, mse_PI
-from ddganAE.preprocessing import convert_2d
+from ddganAE.preprocessing import convert_2d, stencil_dataset, \
+    Stencil_windows, Sample_batches, Preprocess_cache, Stencil_augmentation, \
+    latent_std
+from ddganAE.models.rollout import rollout, stream_rollout, load_checkpoint, \
+    parareal_rollout, compile_timestep
+from ddganAE.models.predictors import get_predictor
+from ddganAE.models import AAE, AAE_combined_loss, Predictive_adversarial, \
+    CAE, mixed_model, mixed_optimizer, launch, scale_hyperparameters, \
+    Training_checkpoint, Metric_sink, Async_sink, File_sink, \
+    Offline_wandb_sink, Phase_timer, Tensorboard_sink, AAE_TENSORBOARD_TAGS
+from ddganAE.backends import Numpy_mlp, export_tflite, from_tflite
+from ddganAE.architectures.discriminators import build_custom_discriminator
+from ddganAE.architectures.svdae import build_dense_encoder, \
+    build_dense_decoder
 
 __author__ = "Zef Wolffs"
 __credits__ = []
@@ -103,3 +121,860 @@ def test_mse_pi():
     snapshots_2 = snapshots_1 + 0.1
 
     assert 0.01 == round(loss(snapshots_1, snapshots_2).numpy(), 2)
+
+
+def toy_network(x):
+    """
+    Contractive toy network acting on the stencil inputs of a rollout
+    """
+    nvars = x.shape[1] // 3
+    return 0.3 * (x[:, :nvars] + x[:, 2*nvars:]) + 0.2 * x[:, nvars:2*nvars]
+
+
+def rollout_state():
+    """
+    Random rollout state with 6 predicted subdomains, 3 variables and 6
+    timesteps
+    """
+    rng = np.random.default_rng(0)
+    state = np.zeros((8, 3, 6))
+    state[0], state[-1] = rng.uniform(size=(2, 3, 6))
+    state[1:-1, :, 0] = rng.uniform(size=(6, 3))
+
+    return state
+
+
+def test_rollout_sweeps():
+    """
+    Test that the batched sweeps converge to the Gauss-Seidel result
+    """
+
+    state = rollout_state()
+
+    pred_gs, _ = rollout(state.copy(), 5, toy_network, iters=30)
+    for sweep in ["jacobi", "red-black"]:
+        pred, _ = rollout(state.copy(), 5, toy_network, iters=60,
+                          sweep=sweep)
+        assert np.allclose(pred, pred_gs)
+
+
+def test_compiled_rollout():
+    """
+    Test that the compiled rollout gives the same result as the eager one
+    """
+    state = rollout_state()
+
+    for sweep in ["gauss-seidel", "red-black"]:
+        pred, info = rollout(state.copy(), 5, toy_network, iters=3,
+                             sor=0.8, sweep=sweep, tol=1e-2)
+        pred_compiled, info_compiled = rollout(state.copy(), 5, toy_network,
+                                               iters=3, sor=0.8, sweep=sweep,
+                                               tol=1e-2, compiled=True)
+        assert np.allclose(pred, pred_compiled)
+        assert np.array_equal(info["iters"], info_compiled["iters"])
+        assert np.allclose(info["residuals"], info_compiled["residuals"])
+
+
+class Toy_model:
+    """
+    Owner of a network, like the predictive models
+    """
+
+    def forward(self, x):
+        return toy_network(x)
+
+
+def test_timestep_cache():
+    """
+    Test that compiled timesteps are cached per network without keeping the
+    object of a bound method alive
+    """
+    model = Toy_model()
+    timestep = compile_timestep(model.forward, 6, 3, iters=3)
+    assert compile_timestep(model.forward, 6, 3, iters=3) is timestep
+    assert compile_timestep(model.forward, 6, 3, iters=4) is not timestep
+    rollout(rollout_state(), 5, model.forward, iters=3, compiled=True)
+
+    owner = weakref.ref(model)
+    del model, timestep
+    gc.collect()
+    assert owner() is None
+
+
+def test_rollout_tolerance():
+    """
+    Test that the inner iterations stop once the tolerance is reached
+    """
+    state = rollout_state()
+
+    pred, info = rollout(state.copy(), 5, toy_network, iters=100, tol=1e-8)
+    pred_full, info_full = rollout(state.copy(), 5, toy_network, iters=100)
+
+    assert np.all(info["iters"] < 100)
+    assert np.all(info["residuals"] < 1e-8)
+    assert np.all(info_full["iters"] == 100)
+    assert np.allclose(pred, pred_full)
+
+
+def test_rollout_scenarios():
+    """
+    Test that an ensemble of scenarios gives the same result as predicting
+    every scenario separately
+    """
+    states = np.stack([rollout_state(), 2 * rollout_state()])
+
+    for compiled in [False, True]:
+        pred, _ = rollout(states.copy(), 5, toy_network, iters=3,
+                          sweep="jacobi", compiled=compiled)
+
+        assert pred.shape == (2, 8, 3, 6)
+        for s in range(2):
+            pred_single, _ = rollout(states[s].copy(), 5, toy_network,
+                                     iters=3, sweep="jacobi",
+                                     compiled=compiled)
+            assert np.allclose(pred[s], pred_single)
+
+
+def test_stream_rollout(tmp_path):
+    """
+    Test that a streamed rollout yields and writes the same values as the
+    full rollout
+    """
+    state = rollout_state()
+    pred, _ = rollout(state.copy(), 5, toy_network, iters=3)
+
+    out_path = str(tmp_path / "rollout.npy")
+    steps = stream_rollout(state[[0, -1]], state[1:-1, :, 0], 5, toy_network,
+                           out_path=out_path, flush_interval=2, iters=3)
+
+    for i, values in enumerate(steps):
+        assert np.allclose(values, pred[..., i+1])
+
+    assert np.allclose(np.moveaxis(np.load(out_path), 0, -1), pred)
+
+
+def test_rollout_checkpoint(tmp_path):
+    """
+    Test that a rollout that is stopped and resumed from its checkpoint gives
+    the same result as an uninterrupted one
+    """
+    state = rollout_state()
+    pred, _ = rollout(state.copy(), 5, toy_network, iters=3)
+
+    out_path = str(tmp_path / "rollout.npy")
+    checkpoint_path = str(tmp_path / "checkpoint.npz")
+    args = (state[[0, -1]], state[1:-1, :, 0], 5, toy_network)
+    kwargs = {"out_path": out_path, "checkpoint_path": checkpoint_path,
+              "checkpoint_interval": 2, "interval": 3, "scaler": "scaler",
+              "iters": 3}
+
+    # Stop the rollout after three timesteps, i.e. past the checkpoint at 2
+    steps = stream_rollout(*args, **kwargs)
+    for _ in range(3):
+        next(steps)
+    steps.close()
+
+    checkpoint = load_checkpoint(checkpoint_path, interval=3)
+    assert checkpoint["step"] == 2 and checkpoint["scaler"] == "scaler"
+
+    resumed = list(stream_rollout(*args, checkpoint=checkpoint, **kwargs))
+    assert len(resumed) == 3
+    assert np.allclose(np.moveaxis(np.load(out_path), 0, -1), pred)
+
+    pred_resumed, _ = rollout(state.copy(), 5, toy_network, iters=3,
+                              checkpoint=checkpoint)
+    assert np.allclose(pred_resumed[..., 1:], pred[..., 1:])
+
+    # Predictors with a history resume with the same initial guesses
+    state = np.concatenate([state] * 3, axis=-1)
+    for predictor in ["quadratic", "warm-start"]:
+        kwargs = {"iters": 2, "predictor": predictor}
+        pred, _ = rollout(state.copy(), 15, toy_network, **kwargs)
+        rollout(state.copy(), 10, toy_network, checkpoint_path=checkpoint_path,
+                **kwargs)
+        checkpoint = load_checkpoint(checkpoint_path)
+        pred_resumed, _ = rollout(state.copy(), 15, toy_network,
+                                  checkpoint=checkpoint, **kwargs)
+        assert np.array_equal(pred_resumed[..., 8:], pred[..., 8:])
+
+        args = (state[[0, -1]], state[1:-1, :, 0], 15, toy_network)
+        steps = stream_rollout(*args, checkpoint_path=checkpoint_path,
+                               checkpoint_interval=10, **kwargs)
+        for _ in range(11):
+            next(steps)
+        steps.close()
+        resumed = list(stream_rollout(
+            *args, checkpoint=load_checkpoint(checkpoint_path), **kwargs))
+        assert np.array_equal(np.stack(resumed, -1), pred[..., 11:16])
+
+    # Resuming the rollouts of the models requires a checkpoint
+    initializer = tf.keras.initializers.RandomNormal(stddev=0.05, seed=0)
+    model = Predictive_adversarial(build_dense_encoder(5, initializer),
+                                   build_dense_decoder(10, 5, initializer),
+                                   build_custom_discriminator(5, initializer),
+                                   tf.keras.optimizers.legacy.Adam(), seed=0)
+    model.compile(10)
+    boundaries, init_values = np.zeros((2, 10, 5)), np.zeros((4, 10))
+    with raises(ValueError, match="checkpoint_path"):
+        model.predict(boundaries, init_values, 4, resume=True)
+    with raises(ValueError, match="checkpoint_path"):
+        next(model.predict_iter(boundaries, init_values, 4, resume=True))
+
+
+def test_rollout_accelerators():
+    """
+    Test that the accelerated inner iterations converge to the same state in
+    fewer iterations
+    """
+    state = rollout_state()
+    pred, info = rollout(state.copy(), 5, toy_network, iters=100, tol=1e-8,
+                         sweep="jacobi")
+
+    for accelerator in ["aitken", "anderson"]:
+        pred_acc, info_acc = rollout(state.copy(), 5, toy_network, iters=100,
+                                     tol=1e-8, sweep="jacobi",
+                                     accelerator=accelerator)
+
+        assert info_acc["iters"].sum() < info["iters"].sum()
+        assert np.allclose(pred_acc, pred)
+
+    # The last sweep of a timestep is not extrapolated
+    class Counting_accelerator:
+        calls = 0
+
+        def reset(self):
+            pass
+
+        def __call__(self, old, new):
+            self.calls += 1
+            return new
+
+    accelerator = Counting_accelerator()
+    rollout(state.copy(), 5, toy_network, iters=3, accelerator=accelerator)
+    assert accelerator.calls == 5 * 2
+
+
+def test_rollout_predictors():
+    """
+    Test the predictors of the initial guess and that the rollout converges
+    to the same state with any of them
+    """
+    times = np.arange(3.)[:, None, None, None]
+    states = list(2 - 0.5 * times + times ** 2)[::-1]
+
+    assert np.allclose(get_predictor("quadratic")(3, states), 2 - 1.5 + 9)
+    assert np.allclose(get_predictor("quadratic")(3, states[:2]),
+                       get_predictor("linear")(3, states))
+
+    state = rollout_state()
+    pred, _ = rollout(state.copy(), 5, toy_network, iters=100, tol=1e-10)
+
+    for predictor in ["quadratic", "adams-bashforth", "warm-start"]:
+        pred_predictor, _ = rollout(state.copy(), 5, toy_network, iters=100,
+                                    tol=1e-10, predictor=predictor)
+        assert np.allclose(pred_predictor, pred)
+
+
+def test_parareal_rollout():
+    """
+    Test that a parareal rollout matches the sequential one
+    """
+    state = np.concatenate([rollout_state()] * 4, axis=-1)
+    pred, info = rollout(state.copy(), 23, toy_network, iters=3)
+
+    for compiled in [False, True]:
+        pred_par, info_par = parareal_rollout(state.copy(), 23, toy_network,
+                                              4, parareal_tol=1e-4, iters=3,
+                                              compiled=compiled)
+
+        assert info_par["parareal_iters"] < 4
+        assert np.allclose(pred_par, pred, atol=1e-4)
+        assert np.all(info_par["iters"] == info["iters"])
+
+    pred_par, _ = parareal_rollout(state.copy(), 23, toy_network, 4,
+                                   parareal_tol=0, iters=3)
+    assert np.allclose(pred_par, pred, rtol=0, atol=1e-12)
+
+    # Predictors that extrapolate from more timesteps or keep a state
+    # continue between the slices as in the sequential rollout
+    for predictor in ["quadratic", "warm-start"]:
+        pred, info = rollout(state.copy(), 23, toy_network, iters=3,
+                             predictor=predictor)
+        pred_par, info_par = parareal_rollout(state.copy(), 23, toy_network,
+                                              4, parareal_tol=0, iters=3,
+                                              predictor=predictor)
+
+        assert np.allclose(pred_par, pred, rtol=0, atol=1e-12)
+        assert np.all(info_par["iters"] == info["iters"])
+
+
+def test_numpy_backend():
+    """
+    Test that the NumPy runtime reproduces a dense encoder and decoder in
+    inference mode, including batch normalization
+    """
+    initializer = tf.keras.initializers.RandomNormal(stddev=0.05, seed=0)
+    encoder = build_dense_encoder(5, initializer, act="elu")
+    decoder = build_dense_decoder(30, 5, initializer, act="elu")
+    decoder.add(tf.keras.layers.BatchNormalization())
+    model = tf.keras.Sequential([encoder, decoder])
+    model.build((None, 30))
+
+    rng = np.random.default_rng(0)
+    for layer in decoder.layers:
+        if isinstance(layer, tf.keras.layers.BatchNormalization):
+            layer.moving_mean.assign(rng.normal(size=30))
+            layer.moving_variance.assign(rng.uniform(0.5, 2, size=30))
+
+    x = rng.uniform(-1, 1, (7, 30))
+    runtime = Numpy_mlp.from_keras(encoder, decoder, dtype=np.float64)
+
+    assert np.allclose(runtime(x), model(x, training=False), atol=1e-5)
+
+    # The models freeze their runtime once, until they are trained again
+    model = Predictive_adversarial(build_dense_encoder(5, initializer),
+                                   build_dense_decoder(10, 5, initializer),
+                                   build_custom_discriminator(5, initializer),
+                                   tf.keras.optimizers.legacy.Adam(), seed=0)
+    model.compile(10)
+    boundaries = rng.uniform(-1, 1, (2, 10, 4))
+    init_values = rng.uniform(-1, 1, (4, 10))
+
+    runtime = model._network("numpy")
+    assert model._network("numpy") is runtime
+
+    data = np.sin(np.linspace(0, 6 * np.pi, 100) +
+                  np.arange(40).reshape(4, 10, 1) / 3)
+    model.train(data, 1, batch_size=16, n_discriminator=1, sinks=[])
+    assert model._network("numpy") is not runtime
+    kwargs = {"iters": 2, "pre_interval": True}
+    assert np.allclose(model.predict(boundaries, init_values, 3,
+                                     backend="numpy", **kwargs),
+                       model.predict(boundaries, init_values, 3, **kwargs),
+                       atol=1e-5)
+
+
+def test_tflite_backend(tmp_path):
+    """
+    Test that the TFLite runtime reproduces a dense encoder and decoder, with
+    and without int8 quantization
+    """
+    initializer = tf.keras.initializers.RandomNormal(stddev=0.05, seed=0)
+    encoder = build_dense_encoder(5, initializer)
+    decoder = build_dense_decoder(30, 5, initializer)
+    model = tf.keras.Sequential([encoder, decoder])
+    model.build((None, 30))
+
+    x = np.random.default_rng(0).uniform(-1, 1, (16, 30))
+    path = str(tmp_path / "model.tflite")
+
+    for quantization, atol in [(None, 1e-5), ("int8", 5e-2)]:
+        export_tflite(encoder, decoder, (30,), path=path,
+                      quantization=quantization, calibration_data=x)
+        runtime = from_tflite(path)
+
+        assert np.allclose(runtime(x), model(x, training=False), atol=atol)
+        assert runtime(x[:1]).shape == (1, 30)
+
+
+def test_stencil_dataset():
+    """
+    Test the samples and targets of the predictive preprocessing on data
+    that encodes the subdomain, variable and timestep in every value
+    """
+    domain, var, time = np.meshgrid(np.arange(4), np.arange(2), np.arange(11),
+                                    indexing="ij")
+    data = 1000 * domain + 100 * var + time
+
+    x, y = stencil_dataset(data, interval=3)
+
+    # 2 interior subdomains, phases with 3, 3 and 2 samples per subdomain
+    assert x.shape == (16, 6) and y.shape == (16, 2)
+
+    # Phase 1, subdomain 2, timestep 4 -> 7
+    assert np.array_equal(x[10], [1007, 1107, 2004, 2104, 3007, 3107])
+    assert np.array_equal(y[10], [2007, 2107])
+
+    x, y = stencil_dataset(data, interval=3, increment=True)
+
+    assert x.shape == (10, 6) and np.all(y == 3)
+
+
+def test_stencil_windows():
+    """
+    Test that the lazy pipeline yields the samples and targets of the
+    materialised preprocessing
+    """
+    data = np.random.default_rng(0).normal(size=(5, 4, 53))
+
+    for increment in [False, True]:
+        x, y = stencil_dataset(data, interval=3, increment=increment)
+        windows = Stencil_windows(data, interval=3, increment=increment)
+
+        batches = list(windows.dataset(7, shuffle=False,
+                                       drop_remainder=False))
+        assert len(windows) == len(x)
+        assert np.allclose(np.concatenate([b[0] for b in batches]), x)
+        assert np.allclose(np.concatenate([b[1] for b in batches]), y)
+
+        # Shuffled batches hold the same samples
+        batches = list(windows.dataset(7, seed=0))
+        assert len(batches) == len(x) // 7
+        assert not np.allclose(batches[0][0], x[:7])
+
+
+def test_sample_batches(tmp_path):
+    """
+    Test that the batches hold every sample once per epoch, in a permutation
+    that is reproducible by seed and epoch, also from a memory-mapped file
+    """
+    data = np.random.default_rng(0).normal(size=(50, 4, 3))
+    np.save(tmp_path / "data.npy", data)
+
+    batches = Sample_batches(data, seed=0)
+    first = np.concatenate(list(batches.dataset(8)))
+    second = np.concatenate(list(batches.dataset(8)))
+
+    assert first.shape == data.shape and not np.allclose(first, second)
+    assert np.allclose(np.sort(first, 0), np.sort(data, 0))
+    assert np.allclose(np.concatenate(list(
+        Sample_batches(str(tmp_path / "data.npy"), seed=0).dataset(8))),
+        first)
+
+    # Drop the last incomplete batch
+    assert len(list(batches.dataset(8, drop_remainder=True))) == 6
+    assert np.allclose(np.concatenate(list(batches.dataset(
+        8, shuffle=False))), data)
+
+
+def test_stencil_augmentation():
+    """
+    Test that the augmentation mirrors stencils and adds noise of the given
+    scale, reproducibly by seed and anew every epoch, and that the predictive
+    models train with it
+    """
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(256, 12)).astype(np.float32)
+    y = rng.normal(size=(256, 4)).astype(np.float32)
+    dataset = tf.data.Dataset.from_tensor_slices((x, y)).batch(64)
+
+    # Every sample is either left as it is or has its neighbours swapped
+    mirrored = np.concatenate([x[:, 8:], x[:, 4:8], x[:, :4]], axis=1)
+    x_aug, y_aug = (np.concatenate(b) for b in zip(*Stencil_augmentation(
+        reverse=0.5, seed=0).dataset(dataset)))
+    flipped = np.all(x_aug == mirrored, axis=1)
+    assert np.all(flipped | np.all(x_aug == x, axis=1))
+    assert 0.3 < flipped.mean() < 0.7 and np.all(y_aug == y)
+
+    scale = np.array([1, 2, 3, 4])
+    augmentation = Stencil_augmentation(0.1, scale, seed=0)
+    first = np.concatenate([b[0] for b in augmentation.dataset(dataset)])
+    second = np.concatenate([b[0] for b in augmentation.dataset(dataset)])
+    assert np.allclose((first - x).std(axis=0), 0.1 * np.tile(scale, 3),
+                       rtol=0.2)
+    assert not np.allclose(first, second)
+    again = Stencil_augmentation(0.1, scale, seed=0).dataset(dataset)
+    assert np.allclose(first, np.concatenate([b[0] for b in again]))
+
+    assert np.allclose(latent_std(x), x.reshape(256, 3, 4).std(axis=(0, 1)))
+
+    initializer = tf.keras.initializers.RandomNormal(stddev=0.05, seed=0)
+    model = Predictive_adversarial(build_dense_encoder(5, initializer),
+                                   build_dense_decoder(10, 5, initializer),
+                                   build_custom_discriminator(5, initializer),
+                                   tf.keras.optimizers.legacy.Adam(), seed=0)
+    model.compile(10)
+    times = np.linspace(0, 6 * np.pi, 100)
+    data = np.sin(times + np.arange(40).reshape(4, 10, 1) / 3)
+    for streaming in (False, True):
+        model.train(data, 1, batch_size=16, n_discriminator=1,
+                    noise_std=0.01, noise_scaled=True, reverse=0.5,
+                    streaming=streaming, sinks=[])
+
+
+def test_preprocess_cache(tmp_path, monkeypatch):
+    """
+    Test that the cache returns the preprocessing of the scaled data, fits
+    the scaler on a hit and evicts the least recently used entries
+    """
+    from sklearn.preprocessing import MinMaxScaler
+
+    data = np.random.default_rng(0).normal(size=(4, 3, 50))
+    cache = Preprocess_cache(str(tmp_path), max_bytes=16000)
+
+    scaled, x, y = cache.load(data, 2, False, MinMaxScaler((-1, 1)))
+    x_ref, y_ref = stencil_dataset(scaled, 2)
+    assert np.allclose(x, x_ref) and np.allclose(y, y_ref)
+    assert scaled.min() == -1 and scaled.max() == 1
+
+    scaler = MinMaxScaler((-1, 1))
+    assert np.array_equal(cache.load(data, 2, False, scaler)[1], x)
+    assert scaler.data_min_ == data.min()
+    assert len(cache.entries()) == 1
+
+    # Every entry is about 7 kB, such that only two fit
+    cache.load(data, 3, False)
+    cache.load(data, 2, False, MinMaxScaler((-1, 1)))
+    cache.load(data, 2, True)
+    keys = [entry[0] for entry in cache.entries()]
+    assert len(keys) == 2 and cache.key(data, 3) not in keys
+
+    # An entry evicted by a concurrent run after it was found is written again
+    utime = os.utime
+
+    def evicted_utime(path, times):
+        monkeypatch.setattr(os, "utime", utime)
+        shutil.rmtree(path)
+        utime(path, times)
+
+    monkeypatch.setattr(os, "utime", evicted_utime)
+    assert np.allclose(cache.load(data, 2, True)[1],
+                       stencil_dataset(data, 2, True)[0])
+    assert os.utime is utime
+
+
+def test_aae_engine():
+    """
+    Test that the compiled steps of the adversarial autoencoder update the
+    encoder, decoder and discriminator and reduce the reconstruction loss
+    """
+    initializer = tf.keras.initializers.RandomNormal(stddev=0.05, seed=0)
+    aae = AAE(build_dense_encoder(5, initializer),
+              build_dense_decoder(30, 5, initializer),
+              build_custom_discriminator(5, initializer),
+              tf.keras.optimizers.legacy.Adam(), seed=0)
+    aae.compile((30,))
+
+    x = np.random.default_rng(0).uniform(-1, 1, (256, 30))
+    discriminator = [w.copy() for w in aae.discriminator.get_weights()]
+
+    aae.train(x, 1, batch_size=32, compiled=True, sinks=[])
+    first = aae.engine.train_epoch(
+        tf.data.Dataset.from_tensor_slices(x).batch(32))
+    aae.train(x, 5, batch_size=32, compiled=True, fused=True, sinks=[])
+    last = aae.engine.train_epoch(
+        tf.data.Dataset.from_tensor_slices(x).batch(32), fused=True)
+
+    assert np.all(np.isfinite(last)) and last[0] < first[0]
+    assert not np.allclose(aae.discriminator.get_weights()[0],
+                           discriminator[0])
+
+
+def test_combined_loss_engine():
+    """
+    Test that the compiled steps of the predictive adversarial network update
+    the discriminator and reduce both losses
+    """
+    initializer = tf.keras.initializers.RandomNormal(stddev=0.05, seed=0)
+    model = Predictive_adversarial(build_dense_encoder(5, initializer),
+                                   build_dense_decoder(10, 5, initializer),
+                                   build_custom_discriminator(5, initializer),
+                                   tf.keras.optimizers.legacy.Adam(), seed=0)
+    model.compile(10)
+
+    times = np.linspace(0, 6 * np.pi, 100)
+    data = np.sin(times + np.arange(40).reshape(4, 10, 1) / 3)
+    x, y = stencil_dataset(data, interval=5)
+    dataset = tf.data.Dataset.from_tensor_slices((x, y)).batch(16)
+    discriminator = [w.copy() for w in model.discriminator.get_weights()]
+
+    model.train(data, 1, batch_size=16, n_discriminator=1, compiled=True,
+                sinks=[])
+    first = model.engine.train_epoch(dataset, n_discriminator=1)
+    model.train(data, 5, batch_size=16, n_discriminator=1, compiled=True,
+                sinks=[])
+    last = model.engine.train_epoch(dataset, n_discriminator=1)
+
+    assert np.all(np.isfinite(last)) and last[0] < first[0] and \
+        last[1] < first[1]
+    assert not np.allclose(model.discriminator.get_weights()[0],
+                           discriminator[0])
+
+    # Without generator updates after the first step
+    assert np.isfinite(model.engine.train_epoch(dataset, n_discriminator=100,
+                                                n_gradient_ascent=3)[1])
+
+
+def test_combined_loss_validation():
+    """
+    Test that the compiled validation of the adversarial autoencoder with
+    combined loss matches the validation with Keras evaluate calls
+    """
+    initializer = tf.keras.initializers.RandomNormal(stddev=0.05, seed=0)
+    aae = AAE_combined_loss(build_dense_encoder(5, initializer),
+                            build_dense_decoder(30, 5, initializer),
+                            build_custom_discriminator(5, initializer),
+                            tf.keras.optimizers.legacy.Adam(), seed=0)
+    aae.compile((30,))
+
+    x = np.random.default_rng(0).uniform(-1, 1, (256, 30))
+    aae.train(x[:192], 2, val_data=x[192:], batch_size=32, compiled=True,
+              sinks=[])
+
+    dataset = tf.data.Dataset.from_tensor_slices(x[192:]).batch(32)
+    d_loss, g_loss = aae.engine.validate(dataset)
+    d_loss_keras, g_loss_keras = aae.validate(dataset, 32)
+
+    assert np.isclose(g_loss, g_loss_keras, rtol=1e-4)
+    assert np.isclose(d_loss, d_loss_keras, rtol=0.1)
+
+
+def test_mixed_precision(tmp_path):
+    """
+    Test that mixed precision networks keep their weights and float32
+    outputs, that the data is held at their width and that the adversarial
+    autoencoder trains with them
+    """
+    initializer = tf.keras.initializers.RandomNormal(stddev=0.05, seed=0)
+    encoder = build_dense_encoder(5, initializer)
+    encoder.build((None, 30))
+    x = np.random.default_rng(0).uniform(-1, 1, (256, 30))
+
+    mixed = mixed_model(encoder, "bfloat16")
+    assert mixed(x).dtype == tf.float32
+    assert np.allclose(mixed(x), encoder(x), atol=0.05)
+    assert hasattr(mixed_optimizer(tf.keras.optimizers.legacy.Adam(),
+                                   "float16"), "get_scaled_loss")
+
+    with raises(ValueError):
+        mixed_model(encoder, "float8")
+
+    data = np.random.default_rng(0).normal(size=(4, 3, 50))
+    x_full, y_full = stencil_dataset(data, interval=3, increment=True)
+    x_half, y_half = stencil_dataset(data, interval=3, increment=True,
+                                     dtype=np.float16)
+    assert x_half.dtype == y_half.dtype == np.float16
+    assert np.allclose(y_half, y_full, rtol=1e-3, atol=1e-3)
+
+    aae = AAE(encoder, build_dense_decoder(30, 5, initializer),
+              build_custom_discriminator(5, initializer),
+              tf.keras.optimizers.legacy.Adam(), seed=0, precision="bfloat16")
+    aae.compile((30,))
+    aae.train(x, 2, batch_size=32, compiled=True, fused=True, sinks=[])
+
+    assert np.all(np.isfinite(aae.engine.train_epoch(
+        tf.data.Dataset.from_tensor_slices(x).batch(32), fused=True)))
+
+    # The rollouts hold their state at the same width
+    model = Predictive_adversarial(build_dense_encoder(5, initializer),
+                                   build_dense_decoder(10, 5, initializer),
+                                   build_custom_discriminator(5, initializer),
+                                   tf.keras.optimizers.legacy.Adam(), seed=0,
+                                   precision="float16")
+    model.compile(10)
+    model.train(np.sin(np.linspace(0, 6 * np.pi, 100) +
+                       np.arange(40).reshape(4, 10, 1) / 3), 1,
+                batch_size=16, n_discriminator=1, sinks=[])
+    boundaries, init_values = np.zeros((2, 10, 4)), np.zeros((4, 10))
+    kwargs = {"iters": 2, "pre_interval": True}
+    pred = model.predict(boundaries, init_values, 3, **kwargs)
+    assert pred.dtype == np.float16 and np.all(np.isfinite(pred))
+
+    out_path = str(tmp_path / "rollout.npy")
+    steps = list(model.predict_iter(boundaries, init_values, 3,
+                                    out_path=out_path, **kwargs))
+    assert steps[-1].dtype == np.load(out_path).dtype == np.float16
+    assert np.array_equal(np.stack(steps, -1), pred[..., 1:])
+
+
+def distributed_cae(strategy, x, batch_size):
+    """
+    Train an autoencoder on the toy data, within the strategy if any, and
+    return its weights
+    """
+    from ddganAE.models.distribute import strategy_scope
+
+    with strategy_scope(strategy):
+        initializer = tf.keras.initializers.GlorotUniform(seed=0)
+        cae = CAE(build_dense_encoder(5, initializer, dropout=0),
+                  build_dense_decoder(30, 5, initializer, dropout=0),
+                  tf.keras.optimizers.legacy.SGD(0.1), seed=0)
+        cae.compile((30,))
+
+    cae.train(x, 2, val_data=x, batch_size=batch_size, strategy=strategy,
+              sinks=[])
+
+    return cae.autoencoder.get_weights()
+
+
+def test_distributed_training():
+    """
+    Test that two workers with half the batch each, whose gradients are
+    averaged, train the same as a single process
+    """
+    x = np.random.default_rng(0).uniform(-1, 1, (64, 30)).astype(np.float32)
+
+    batch_size, learning_rate = scale_hyperparameters(16, 0.1, 2, "constant")
+    assert batch_size == 8 and learning_rate == 0.1
+
+    # Every worker takes a disjoint part of every epoch
+    shards = [np.concatenate(list(Sample_batches(x, seed=0).dataset(
+        8, shard=(i, 2)))) for i in range(2)]
+    assert len(shards[0]) == len(shards[1]) == 32
+    assert np.allclose(np.sort(np.concatenate(shards), 0), np.sort(x, 0))
+
+    distributed = launch(distributed_cae, 2, args=(x, batch_size))
+    single = distributed_cae(None, x, 16)
+
+    for w, w_ref in zip(distributed, single):
+        assert np.allclose(w, w_ref, atol=1e-5)
+
+
+def test_gradient_accumulation():
+    """
+    Test that accumulating the gradients over micro-batches, with and
+    without recomputation of the activations, trains the same as full
+    batches
+    """
+    x = np.random.default_rng(0).uniform(-1, 1, (64, 30)).astype(np.float32)
+
+    weights = []
+    for accumulate, recompute in [(1, False), (4, False), (3, True)]:
+        initializer = tf.keras.initializers.GlorotUniform(seed=0)
+        cae = CAE(build_dense_encoder(5, initializer, dropout=0),
+                  build_dense_decoder(30, 5, initializer, dropout=0),
+                  tf.keras.optimizers.legacy.SGD(0.1), seed=0)
+        cae.compile((30,))
+
+        cae.train(x, 2, val_data=x, batch_size=16, compiled=True,
+                  accumulate=accumulate, recompute=recompute, sinks=[])
+        weights.append(cae.autoencoder.get_weights())
+
+    for other in weights[1:]:
+        for w, w_ref in zip(other, weights[0]):
+            assert np.allclose(w, w_ref, atol=1e-5)
+
+    with raises(NotImplementedError):
+        cae.train(x, 1, accumulate=4, sinks=[])
+
+
+def test_training_checkpoint(tmp_path):
+    """
+    Test that training resumed from a checkpoint continues exactly as the
+    uninterrupted training, including the shuffling of the data
+    """
+    x = np.random.default_rng(0).uniform(-1, 1, (64, 30)).astype(np.float32)
+
+    def build():
+        initializer = tf.keras.initializers.GlorotUniform(seed=0)
+        aae = AAE_combined_loss(
+            build_dense_encoder(5, initializer, dropout=0),
+            build_dense_decoder(30, 5, initializer, dropout=0),
+            build_custom_discriminator(5, initializer),
+            tf.keras.optimizers.legacy.Adam(1e-3), seed=0)
+        aae.compile((30,))
+        return aae
+
+    reference = build()
+    reference.train(x, 4, val_data=x, batch_size=16, compiled=True,
+                    n_discriminator=2, sinks=[])
+
+    # Preempted after two epochs, then resumed by a new process
+    checkpoint = Training_checkpoint(tmp_path, scaler={"min": -1})
+    build().train(x, 2, val_data=x, batch_size=16, compiled=True,
+                  n_discriminator=2, checkpoint=checkpoint, sinks=[])
+
+    checkpoint = Training_checkpoint(tmp_path)
+    aae = build()
+    aae.train(x, 4, val_data=x, batch_size=16, compiled=True,
+              n_discriminator=2, checkpoint=checkpoint, resume=True,
+              sinks=[])
+
+    assert checkpoint.scaler == {"min": -1}
+    assert tf.train.latest_checkpoint(tmp_path).endswith("ckpt-4")
+    for network in ["encoder", "decoder", "discriminator"]:
+        for w, w_ref in zip(getattr(aae, network).get_weights(),
+                            getattr(reference, network).get_weights()):
+            assert np.allclose(w, w_ref)
+
+    with raises(RuntimeError):
+        Training_checkpoint(tmp_path).save(1)
+
+
+def test_metric_sinks(tmp_path):
+    """
+    Test that the metrics of every epoch reach the sinks through the
+    background thread, and that errors of the sinks are raised
+    """
+    x = np.random.default_rng(0).uniform(-1, 1, (64, 30)).astype(np.float32)
+
+    initializer = tf.keras.initializers.GlorotUniform(seed=0)
+    cae = CAE(build_dense_encoder(5, initializer, dropout=0),
+              build_dense_decoder(30, 5, initializer, dropout=0),
+              tf.keras.optimizers.legacy.Adam(), seed=0)
+    cae.compile((30,))
+
+    cae.train(x, 2, val_data=x, batch_size=16,
+              sinks=[File_sink(str(tmp_path / "metrics.jsonl")),
+                     File_sink(str(tmp_path / "metrics.csv")),
+                     Offline_wandb_sink(str(tmp_path / "wandb.jsonl"))])
+
+    records = [json.loads(line)
+               for line in open(tmp_path / "metrics.jsonl")]
+    assert [(r["step"], r["split"]) for r in records] == \
+        [(0, "train"), (0, "val"), (1, "train"), (1, "val")]
+    assert len(open(tmp_path / "metrics.csv").readlines()) == 9
+
+    logs = [json.loads(line) for line in open(tmp_path / "wandb.jsonl")]
+    assert [log["epoch"] for log in logs] == [0, 1]
+    assert set(logs[0]) == {"epoch", "train_loss", "train_accuracy",
+                            "valid_loss", "valid_accuracy"}
+    assert logs[1]["valid_loss"] == records[3]["loss"]
+
+    # The autoencoder metrics of the AAE keep their former tags
+    sink = Tensorboard_sink(str(tmp_path / "logs"), AAE_TENSORBOARD_TAGS)
+    sink.write(0, "train", {"loss": 1., "accuracy": 0.5, "g_loss": 2.})
+    sink.close()
+    events = tf.io.gfile.glob(str(tmp_path / "logs" / "train" / "*"))
+    assert {value.tag for event in tf.compat.v1.train.summary_iterator(
+        events[0]) for value in event.summary.value} == \
+        {"loss - ae", "accuracy - ae", "loss - g"}
+
+    class Failing_sink(Metric_sink):
+        def write(self, step, split, metrics):
+            raise OSError("No space left on device")
+
+    sink = Async_sink([Failing_sink()])
+    sink.write(0, "train", {"loss": 1.})
+    with raises(OSError):
+        sink.close()
+
+    with raises(ValueError):
+        File_sink(str(tmp_path / "metrics.txt"))
+
+
+def test_phase_timer(tmp_path):
+    """
+    Test that the phases of the epochs are timed and written to the sinks,
+    and that a trace of the window of steps is recorded
+    """
+    x = np.random.default_rng(0).uniform(-1, 1, (64, 30)).astype(np.float32)
+
+    initializer = tf.keras.initializers.GlorotUniform(seed=0)
+    aae = AAE_combined_loss(build_dense_encoder(5, initializer, dropout=0),
+                            build_dense_decoder(30, 5, initializer,
+                                                dropout=0),
+                            build_custom_discriminator(5, initializer),
+                            tf.keras.optimizers.legacy.Adam(), seed=0)
+    aae.compile((30,))
+
+    timer = Phase_timer(profile_steps=(2, 3),
+                        profile_dir=str(tmp_path / "profile"))
+    aae.train(x, 2, val_data=x, val_batch_size=16, batch_size=16,
+              n_discriminator=2, timer=timer,
+              sinks=[File_sink(str(tmp_path / "metrics.jsonl"))])
+
+    records = [json.loads(line)
+               for line in open(tmp_path / "metrics.jsonl")]
+    timings = [r for r in records if r["split"] == "timing"]
+    assert [r["step"] for r in timings] == [0, 1]
+
+    for r in timings:
+        for phase in ["input", "encoder", "discriminator", "generator",
+                      "train", "validation"]:
+            assert 0 < r["time_" + phase] <= r["time_epoch"]
+        assert r["time_encoder"] + r["time_discriminator"] + \
+            r["time_generator"] < r["time_train"]
+        assert np.isclose(r["samples_per_second"] * r["time_epoch"], 64)
+
+    assert os.listdir(tmp_path / "profile" / "plugins" / "profile")